@@ -6,6 +6,11 @@
 ================================================================================
 """
 import httpx
+import os
+import re
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from openai import OpenAI
 
@@ -17,7 +22,6 @@ from langchain.messages import SystemMessage, HumanMessage
 from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage, AIMessage
 
 from tools.langchain_tools import charger_tools_langchain
-import re
 
 # -----------------------------
 # Whisper
@@ -25,20 +29,164 @@ import re
 custom_http_client = httpx.Client(timeout=30.0, http2=False)
 client_whisper = OpenAI(api_key=OPENAI_API_KEY, http_client=custom_http_client)
 
+# Découpage des longs vocaux (secondes)
+DUREE_SEGMENT_CIBLE = 60
+DUREE_SEGMENT_MIN = 30
+DUREE_SEGMENT_MAX = 90
+SEUIL_SILENCE = "-35dB"
+DUREE_SILENCE_MIN = 0.4
+
+# Pool partagé pour transcrire les segments en parallèle
+_pool_whisper = ThreadPoolExecutor(max_workers=4, thread_name_prefix="whisper")
+
+
 def transcrire_audio(chemin_fichier: str) -> str:
     try:
         with open(chemin_fichier, "rb") as audio_file:
-            transcription = client_whisper.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language="fr",
-            )
+            return transcrire_audio_bytes(audio_file.read(), os.path.basename(chemin_fichier))
+    except Exception as e:
+        print(f"Erreur Whisper : {e}")
+        return ""
+
+
+def transcrire_audio_bytes(contenu: bytes, nom_fichier: str) -> str:
+    """Transcrit un audio déjà en mémoire (aucun fichier sur disque)."""
+    try:
+        transcription = client_whisper.audio.transcriptions.create(
+            model="whisper-1",
+            file=(nom_fichier, contenu),
+            language="fr",
+        )
         return transcription.text
     except Exception as e:
         print(f"Erreur Whisper : {e}")
         return ""
 
 
+def _duree_audio(chemin: str):
+    """Durée en secondes lue dans l'en-tête par ffprobe (rapide), None si inconnue."""
+    proc = subprocess.run(
+        [
+            "ffprobe", "-v", "error", "-show_entries", "format=duration",
+            "-of", "default=noprint_wrappers=1:nokey=1", chemin,
+        ],
+        capture_output=True, text=True, timeout=10,
+    )
+    try:
+        return float(proc.stdout.strip())
+    except ValueError:
+        return None
+
+
+def _analyser_audio(chemin: str):
+    """
+    Passe ffmpeg (silencedetect) sur le fichier.
+    Retourne (durée totale, [(debut_silence, fin_silence), ...]).
+    """
+    proc = subprocess.run(
+        [
+            "ffmpeg", "-hide_banner", "-nostats", "-i", chemin,
+            "-af", f"silencedetect=noise={SEUIL_SILENCE}:d={DUREE_SILENCE_MIN}",
+            "-f", "null", "-",
+        ],
+        capture_output=True, text=True, timeout=60,
+    )
+    sortie = proc.stderr
+
+    duree = None
+    m = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", sortie)
+    if m:
+        duree = int(m.group(1)) * 3600 + int(m.group(2)) * 60 + float(m.group(3))
+
+    debuts = [float(x) for x in re.findall(r"silence_start: (-?\d+(?:\.\d+)?)", sortie)]
+    fins = [float(x) for x in re.findall(r"silence_end: (\d+(?:\.\d+)?)", sortie)]
+    return duree, list(zip(debuts, fins))
+
+
+def _points_de_coupe(duree: float, silences: list) -> list:
+    """
+    Choisit les coupes au milieu des silences, au plus près de DUREE_SEGMENT_CIBLE.
+    Coupe franche à DUREE_SEGMENT_MAX si aucun silence n'est exploitable.
+    """
+    milieux = [(d + f) / 2 for d, f in silences]
+    coupes = []
+    dernier = 0.0
+
+    while duree - dernier > DUREE_SEGMENT_MAX:
+        candidats = [
+            m for m in milieux
+            if dernier + DUREE_SEGMENT_MIN <= m <= dernier + DUREE_SEGMENT_MAX
+        ]
+        if candidats:
+            coupe = min(candidats, key=lambda m: abs(m - (dernier + DUREE_SEGMENT_CIBLE)))
+        else:
+            coupe = dernier + DUREE_SEGMENT_MAX
+        coupes.append(coupe)
+        dernier = coupe
+
+    return coupes
+
+
+def _extraire_segment(chemin: str, debut: float, fin: float) -> bytes:
+    """Encode un segment [debut, fin] en MP3 mono directement vers la mémoire."""
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-ss", f"{debut:.2f}"]
+    if fin is not None:
+        cmd += ["-to", f"{fin:.2f}"]
+    cmd += ["-i", chemin, "-vn", "-ac", "1", "-ar", "16000", "-b:a", "48k", "-f", "mp3", "pipe:1"]
+    proc = subprocess.run(cmd, capture_output=True, timeout=60, check=True)
+    return proc.stdout
+
+
+def transcrire_vocal(contenu: bytes, nom_fichier: str, duree: float = None) -> str:
+    """
+    Transcrit un vocal reçu en mémoire.
+    Les vocaux longs sont découpés sur les silences et les segments
+    sont transcrits en parallèle puis recollés dans l'ordre.
+    `duree` (fournie par Discord pour les messages vocaux) évite toute
+    analyse ffmpeg pour les vocaux courts, de loin les plus fréquents.
+    """
+    if duree is not None and duree <= DUREE_SEGMENT_MAX:
+        return transcrire_audio_bytes(contenu, nom_fichier)
+
+    extension = os.path.splitext(nom_fichier)[1] or ".ogg"
+
+    try:
+        # Dossier de travail unique (ffmpeg a besoin d'un fichier seekable pour certains conteneurs)
+        with tempfile.TemporaryDirectory(prefix="enola_vocal_") as dossier:
+            chemin = os.path.join(dossier, f"source{extension}")
+            with open(chemin, "wb") as f:
+                f.write(contenu)
+
+            # Durée inconnue : ffprobe (en-tête seulement) avant tout décodage complet
+            if duree is None:
+                duree = _duree_audio(chemin)
+                if duree is not None and duree <= DUREE_SEGMENT_MAX:
+                    return transcrire_audio_bytes(contenu, nom_fichier)
+
+            # Vocal long : là seulement on décode tout pour trouver les silences
+            duree_ffmpeg, silences = _analyser_audio(chemin)
+            duree = duree_ffmpeg or duree
+            if not duree or duree <= DUREE_SEGMENT_MAX:
+                return transcrire_audio_bytes(contenu, nom_fichier)
+
+            bornes = [0.0] + _points_de_coupe(duree, silences)
+            segments = [
+                _extraire_segment(chemin, debut, fin)
+                for debut, fin in zip(bornes, bornes[1:] + [None])
+            ]
+    except (FileNotFoundError, subprocess.SubprocessError) as e:
+        # ffmpeg absent ou en échec : on envoie le fichier entier
+        print(f"⚠️ Découpage vocal impossible ({e}), transcription directe.")
+        return transcrire_audio_bytes(contenu, nom_fichier)
+
+    print(f"✂️ Vocal de {duree:.0f}s découpé en {len(segments)} segments.")
+    textes = _pool_whisper.map(
+        lambda item: transcrire_audio_bytes(item[1], f"segment_{item[0]}.mp3"),
+        enumerate(segments),
+    )
+    return " ".join(t.strip() for t in textes if t and t.strip())
+
+
 # -----------------------------
 # LLM + Agents
 # -----------------------------
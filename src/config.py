@@ -10,6 +10,7 @@ from dotenv import load_dotenv
 # 1. Chemins
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CONFIG_DIR = os.path.join(BASE_DIR, "config")
+ASSETS_DIR = os.path.join(BASE_DIR, "assets")
 ENV_PATH = os.path.join(CONFIG_DIR, ".env")
 TOKEN_PATH = os.path.join(CONFIG_DIR, "token.json")
 CREDENTIALS_PATH = os.path.join(CONFIG_DIR, "credentials.json")
@@ -32,8 +33,15 @@ except ValueError:
 
 # APIs Externes
 HUE_BRIDGE_IP = os.getenv("HUE_BRIDGE_IP")
-WIZ_PLUG_IP = os.getenv("WIZ_PLUG_IP")  # <--- NOUVEAU
+WIZ_PLUG_IP = os.getenv("WIZ_PLUG_IP")  # Prise historique, reprise sous le nom "PC"
+WIZ_BROADCAST = os.getenv("WIZ_BROADCAST", "255.255.255.255")
 SPOTIPY_CLIENT_ID = os.getenv("SPOTIPY_CLIENT_ID")
 SPOTIPY_CLIENT_SECRET = os.getenv("SPOTIPY_CLIENT_SECRET")
 SPOTIPY_REDIRECT_URI = os.getenv("SPOTIPY_REDIRECT_URI")
-SCOPES = ["https://www.googleapis.com/auth/calendar"]
\ No newline at end of file
+SPOTIFY_APPAREIL_ALARME = os.getenv("SPOTIFY_APPAREIL_ALARME", "speaker")  # Alias du registre
+SCOPES = ["https://www.googleapis.com/auth/calendar"]
+# Rappels d'agenda envoyés en MP N minutes avant chaque RDV (0 = désactivés)
+try:
+    RAPPEL_AGENDA_MINUTES = int(os.getenv("RAPPEL_AGENDA_MINUTES", "15"))
+except ValueError:
+    RAPPEL_AGENDA_MINUTES = 15
@@ -14,11 +14,22 @@ from datetime import datetime, timedelta
 from discord.ext import tasks
 
 import config
-from brain import traiter_commande_gpt, transcrire_audio
-from tools.spotify import obtenir_lecture_en_cours, commander_spotify_reel
+from brain import traiter_commande_gpt, transcrire_vocal
+from tools.spotify import (
+    obtenir_lecture_en_cours,
+    commander_spotify_reel,
+    preparer_lecture,
+    lancer_lecture_preparee,
+)
+from tools.spotify_library import synchroniser_bibliotheque
+from tools.spotify_session import obtenir_stats_spotify
+from tools.spotify_playback import get_service_lecture, formater_titre
 from tools.scraper import check_new_codes
-from tools.anilist import check_new_episodes
-from tools.system import check_alarmes_actives, get_recap_alarmes
+from tools.anilist_notifier import NotificateurSorties
+from tools.meteo import prechauffer_meteo, rafraichir_previsions
+from tools.calendar_store import synchroniser_agenda, get_miroir_agenda
+from tools.calendar_reminders import PlanificateurRappels
+from tools.system import check_alarmes_actives, get_recap_alarmes, alarme_prevue_a
 
 import subprocess
 import sys
@@ -31,9 +42,24 @@ intents.messages = True
 client = discord.Client(intents=intents)
 dernier_channel_autorise = None
 prochain_recap = None
+planificateur_rappels = None
+notificateur_animes = None
 
 historiques = {}
 
+# Une file (boîte aux lettres) par salon + limite globale d'appels LLM en vol
+MAX_APPELS_LLM = 3
+DELAI_INACTIVITE_SALON = 300  # secondes avant d'arrêter le worker d'un salon inactif
+files_salons = {}  # salon -> (file, tâche du worker) : la référence garde la tâche en vie
+semaphore_llm = asyncio.Semaphore(MAX_APPELS_LLM)
+
+# Alarmes pré-chauffées : minute prévue -> tâche qui tirera la lecture
+alarmes_prechauffees = {}
+VERIFICATION_AVANT_ALARME = 2  # secondes : dernière relecture des alarmes avant de tirer
+
+# Prévisions météo rechargées peu après chaque heure pile
+MINUTE_MAJ_METEO = 5
+
 # Chemin ABSOLU vers le fichier JSON pour éviter les erreurs relatives
 BASE_DIR = os.path.dirname(os.path.abspath(__file__)) # Dossier src/
 PROJECT_ROOT = os.path.dirname(BASE_DIR)              # Dossier racine du projet
@@ -72,6 +98,23 @@ def charger_activites():
     except Exception:
         return FALLBACK_ACTIVITIES
 
+async def _afficher_musique(etat):
+    """Abonné du service de lecture : statut mis à jour dès que le titre change."""
+    titre_spotify = formater_titre(etat)
+    if titre_spotify:
+        await client.change_presence(
+            activity=discord.Activity(
+                type=discord.ActivityType.listening,
+                name=titre_spotify
+            )
+        )
+
+
+def _sur_changement_lecture(etat):
+    # Appelé depuis le thread du poller : on repasse sur la boucle Discord
+    asyncio.run_coroutine_threadsafe(_afficher_musique(etat), client.loop)
+
+
 @tasks.loop(seconds=30)
 async def update_status_loop():
     """
@@ -79,7 +122,7 @@ async def update_status_loop():
     Priorité : Musique Spotify > Activité Random (depuis JSON)
     """
     try:
-        # 1. Check Spotify
+        # 1. Check Spotify (cache du service de lecture, pas d'appel réseau)
         titre_spotify = obtenir_lecture_en_cours()
         
         if titre_spotify:
@@ -127,10 +170,8 @@ async def task_codes():
                 jeu = item['game']
                 code = item['code']
                 
-                # Couleur différente selon le jeu
-                couleur = 0xE67E22 # Orange par défaut (Arknights)
-                if "Strinova" in jeu:
-                    couleur = 0x3498DB # Bleu pour Strinova
+                # Couleur définie par jeu dans le registre des sources
+                couleur = item.get('couleur', 0xE67E22) # Orange par défaut
 
                 embed = discord.Embed(
                     title=f"🎁 Nouveau code {jeu} !",
@@ -140,14 +181,72 @@ async def task_codes():
                 await user.send(embed=embed)
                 print(f"✉️ Code envoyé pour {jeu} : {code}")
        
+@tasks.loop(minutes=30)
+async def task_spotify_bibliotheque():
+    """Garde l'index local des playlists / likes à jour (incrémental)."""
+    await client.loop.run_in_executor(None, synchroniser_bibliotheque)
+
+    # Latences Spotify (endpoints les plus lents) dans les logs, toutes les 30 min
+    stats = sorted(obtenir_stats_spotify().items(), key=lambda x: x[1]["moyenne_ms"], reverse=True)
+    if stats:
+        resume = ", ".join(f"{e} {m['moyenne_ms']} ms ({m['appels']}x, {m['erreurs']} err)" for e, m in stats[:3])
+        print(f"📊 Spotify : {resume}")
+
+
+@tasks.loop(hours=1)
+async def task_previsions():
+    """Recharge les prévisions météo préchargées (ville par défaut + villes récentes)."""
+    await client.loop.run_in_executor(None, rafraichir_previsions)
+
+@task_previsions.before_loop
+async def before_task_previsions():
+    """
+    Premier chargement immédiat, puis calage quelques minutes après l'heure pile
+    (Open-Meteo publie ses mises à jour au fil de l'heure).
+    """
+    await client.wait_until_ready()
+    await client.loop.run_in_executor(None, rafraichir_previsions)
+
+    now = datetime.now()
+    prochaine = (now + timedelta(hours=1)).replace(minute=MINUTE_MAJ_METEO, second=0, microsecond=0)
+    if now.minute < MINUTE_MAJ_METEO:
+        prochaine -= timedelta(hours=1)
+    await asyncio.sleep((prochaine - now).total_seconds())
+
+
 @tasks.loop(minutes=5)
-async def task_animes():
-    global dernier_channel_autorise
+async def task_agenda():
+    """Synchro incrémentale du miroir d'agenda (syncToken : seuls les changements)."""
+    await client.loop.run_in_executor(None, synchroniser_agenda)
+
+
+async def _envoyer_rappel_agenda(evenement):
+    """MP de rappel, appelé par le planificateur N minutes avant le RDV."""
+    user = await client.fetch_user(config.AUTHORIZED_USER_ID)
+    if not user:
+        return
+    debut = datetime.fromtimestamp(evenement["debut"])
+    minutes = max(0, round((evenement["debut"] - time.time()) / 60))
+    await user.send(f"🔔 Rappel : **{evenement['titre']}** à {debut.strftime('%H:%M')} (dans {minutes} min).")
+    print(f"🔔 Rappel agenda envoyé : {evenement['titre']}")
+
 
-    nouveaux = await client.loop.run_in_executor(None, check_new_episodes)
-    if not nouveaux:
+def demarrer_rappels_agenda():
+    """Planifie un réveil par RDV à venir et suit les changements du miroir."""
+    global planificateur_rappels
+    if planificateur_rappels is not None or config.RAPPEL_AGENDA_MINUTES <= 0:
         return
 
+    miroir = get_miroir_agenda()
+    planificateur_rappels = PlanificateurRappels(
+        client.loop, _envoyer_rappel_agenda, config.RAPPEL_AGENDA_MINUTES
+    )
+    planificateur_rappels.charger(miroir.entre(time.time(), float("inf")))
+    miroir.abonner(planificateur_rappels.appliquer_depuis_thread)
+
+
+async def _envoyer_sortie_anime(item):
+    """Embed 'Nouvel épisode', appelé par le notificateur à l'heure de diffusion."""
     # cible: salon connu, sinon DM
     canal = None
     if dernier_channel_autorise:
@@ -162,27 +261,40 @@ async def task_animes():
     if canal is None:
         return
 
-    for item in nouveaux:
-        titre = item["titre"]
-        ep = item["episode"]
-        crunchy = item["crunchy_url"]
-        anilist = item.get("anilist_url")
-        image = item.get("image_url")
-
-        embed = discord.Embed(
-            title=f"Nouvel épisode: {titre}",
-            description=f"Épisode {ep} détecté.",
-            url=anilist or crunchy,
-            color=0x7F8C8D
-        )
-        if image:
-            embed.set_thumbnail(url=image)
+    titre = item["titre"]
+    ep = item["episode"]
+    crunchy = item["crunchy_url"]
+    anilist = item.get("anilist_url")
+    image = item.get("image_url")
+
+    embed = discord.Embed(
+        title=f"Nouvel épisode: {titre}",
+        description=f"Épisode {ep} détecté.",
+        url=anilist or crunchy,
+        color=0x7F8C8D
+    )
+    if image:
+        embed.set_thumbnail(url=image)
+
+    embed.add_field(name="Crunchyroll", value=crunchy, inline=False)
+    if anilist:
+        embed.add_field(name="AniList", value=anilist, inline=False)
 
-        embed.add_field(name="Crunchyroll", value=crunchy, inline=False)
-        if anilist:
-            embed.add_field(name="AniList", value=anilist, inline=False)
+    await canal.send(embed=embed)
 
-        await canal.send(embed=embed)
+
+@tasks.loop(hours=2)
+async def task_animes():
+    """
+    Recharge le planning des sorties (les réveils par épisode font le reste).
+    Toutes les 2 h : un épisode reporté par AniList est replanifié à temps,
+    pour une douzaine de requêtes par jour (contre 288 en polling).
+    """
+    global notificateur_animes
+    if notificateur_animes is None:
+        notificateur_animes = NotificateurSorties(client.loop, _envoyer_sortie_anime)
+        notificateur_animes.demarrer()
+    await notificateur_animes.recharger()
 
 def planifier_prochain_recap():
     """Calcule une heure aléatoire entre 08h00 et 21h00 pour le prochain message"""
@@ -235,21 +347,101 @@ async def task_recap_alarmes():
         print(f"📅 Prochain récap (replanifié) : {prochain_recap.strftime('%d/%m %H:%M')}")
 
 
+async def _alarme_prechauffee(heure_prevue, playlist):
+    """
+    Pré-chauffe la lecture (token, appareil, URI) puis tire pile à l'heure :
+    au moment de sonner, il ne reste qu'un appel start_playback.
+    Retourne False si l'alarme a été supprimée ou modifiée entre-temps
+    (task_alarmes la traitera alors comme une alarme à froid).
+    """
+    commande = await client.loop.run_in_executor(None, lambda: preparer_lecture(
+        recherche=playlist,
+        appareil=config.SPOTIFY_APPAREIL_ALARME
+    ))
+
+    attente = (heure_prevue - datetime.now()).total_seconds() - VERIFICATION_AVANT_ALARME
+    if attente > 0:
+        await asyncio.sleep(attente)
+
+    # L'alarme a pu être supprimée ou changée depuis le pré-chauffage
+    if await client.loop.run_in_executor(None, alarme_prevue_a, heure_prevue) != playlist:
+        print(f"🚫 Alarme {heure_prevue.strftime('%H:%M')} modifiée ou supprimée : pré-chauffage abandonné.")
+        return False
+
+    attente = (heure_prevue - datetime.now()).total_seconds()
+    if attente > 0:
+        await asyncio.sleep(attente)
+
+    print(f"⏰ DRIIING ! Lancement de l'alarme : {playlist}")
+    lancee = False
+    if commande:
+        lancee = await client.loop.run_in_executor(None, lancer_lecture_preparee, commande)
+    if not lancee:
+        # Pré-chauffage raté ou appareil disparu entre-temps : démarrage à froid
+        await _lancer_alarme_a_froid(playlist)
+
+    retard = (datetime.now() - heure_prevue).total_seconds()
+    print(f"⏱️ Alarme {heure_prevue.strftime('%H:%M')} : lecture lancée avec {retard:.2f}s de retard.")
+    return True
+
+
+def _fin_alarme_prechauffee(heure_prevue, tache):
+    """
+    Tâche pré-chauffée terminée. Si elle n'a pas pris l'alarme en charge
+    (annulée, erreur, alarme modifiée), on oublie l'entrée : task_alarmes
+    retombe alors sur le démarrage à froid.
+    """
+    if tache.cancelled():
+        prise_en_charge = False
+    elif tache.exception() is not None:
+        print(f"⚠️ Erreur alarme pré-chauffée {heure_prevue.strftime('%H:%M')} : {tache.exception()}")
+        prise_en_charge = False
+    else:
+        prise_en_charge = tache.result()
+
+    if not prise_en_charge and alarmes_prechauffees.get(heure_prevue) is tache:
+        del alarmes_prechauffees[heure_prevue]
+
+
+async def _lancer_alarme_a_froid(playlist):
+    # On force la lecture sur l'enceinte (alias résolu par le registre d'appareils)
+    await client.loop.run_in_executor(None, lambda: commander_spotify_reel(
+        action="play", 
+        recherche=playlist, 
+        appareil=config.SPOTIFY_APPAREIL_ALARME
+    ))
+
+
 @tasks.loop(seconds=60)
 async def task_alarmes():
-    """Vérifie chaque minute si une alarme doit sonner"""
+    """Vérifie chaque minute si une alarme doit sonner (et pré-chauffe la suivante)"""
+    minute_courante = datetime.now().replace(second=0, microsecond=0)
+
+    # Entrées périmées (tour de boucle sauté) : la tâche a forcément déjà tiré
+    for minute in [m for m in alarmes_prechauffees if m < minute_courante]:
+        del alarmes_prechauffees[minute]
+
+    # 1. Pré-chauffage des alarmes de la minute suivante
+    minute_suivante = minute_courante + timedelta(minutes=1)
+    a_venir = await client.loop.run_in_executor(None, alarme_prevue_a, minute_suivante)
+    if a_venir and minute_suivante not in alarmes_prechauffees:
+        tache = asyncio.create_task(_alarme_prechauffee(minute_suivante, a_venir))
+        tache.add_done_callback(lambda t, m=minute_suivante: _fin_alarme_prechauffee(m, t))
+        alarmes_prechauffees[minute_suivante] = tache
+
+    # 2. Alarmes de cette minute (nettoie aussi les alarmes one-shot)
     # On exécute la vérification dans un thread pour ne pas bloquer le bot
     playlist = await client.loop.run_in_executor(None, check_alarmes_actives)
-    
+
+    # Déjà prise en charge par la tâche pré-chauffée ?
+    if alarmes_prechauffees.pop(minute_courante, None) is not None:
+        return
+
     if playlist:
         print(f"⏰ DRIIING ! Lancement de l'alarme : {playlist}")
-        
-        # On force la lecture sur l'appareil 'Enola_Pi' (ton speaker)
-        await client.loop.run_in_executor(None, lambda: commander_spotify_reel(
-            action="play", 
-            recherche=playlist, 
-            appareil="Enola_Pi"
-        ))
+        await _lancer_alarme_a_froid(playlist)
+        retard = (datetime.now() - minute_courante).total_seconds()
+        print(f"⏱️ Alarme {minute_courante.strftime('%H:%M')} (à froid) : lecture lancée avec {retard:.2f}s de retard.")
 
 @task_alarmes.before_loop
 async def before_task_alarmes():
@@ -271,6 +463,15 @@ async def on_ready():
     print(f"🟢 Enola est connectée : {client.user}")
     print(f"📂 Activités JSON : {ACTIVITES_FILE}")
     
+    # Coordonnées de la ville par défaut résolues dès le démarrage
+    client.loop.run_in_executor(None, prechauffer_meteo)
+
+    # Poller Spotify unique (statut, tools, alarmes)
+    service_lecture = get_service_lecture()
+    if not service_lecture.est_demarre():
+        service_lecture.abonner(_sur_changement_lecture)
+        service_lecture.demarrer()
+
     # Démarrage de la boucle d'activité
     if not update_status_loop.is_running():
         update_status_loop.start()
@@ -289,7 +490,22 @@ async def on_ready():
 
     if not task_animes.is_running():
         task_animes.start()
-        print("✅ Scraper Animes activé.")
+        print("✅ Notifications Animes activées.")
+
+    if not task_spotify_bibliotheque.is_running():
+        task_spotify_bibliotheque.start()
+        print("✅ Index Spotify activé.")
+
+    if not task_agenda.is_running():
+        task_agenda.start()
+        print("✅ Miroir agenda activé.")
+
+    # Rappels d'agenda (depuis le miroir local, un réveil par RDV)
+    demarrer_rappels_agenda()
+
+    if not task_previsions.is_running():
+        task_previsions.start()
+        print("✅ Prévisions météo activées.")
 
     if not task_alarmes.is_running():
         task_alarmes.start()
@@ -299,6 +515,131 @@ async def on_ready():
         planifier_prochain_recap()
         task_recap_alarmes.start()
 
+async def _preparer_contenu(message):
+    """
+    Texte à soumettre à l'agent pour un message (transcrit les vocaux si besoin).
+    Retourne None si rien d'exploitable.
+    """
+    user_content = message.content
+
+    # Gestion des vocaux (tous les audios du message, en parallèle et en mémoire)
+    audios = [
+        a for a in message.attachments
+        if a.content_type and "audio" in a.content_type
+    ]
+    if audios:
+        print(f"🎤 Vocaux reçus : {', '.join(a.filename for a in audios)}")
+
+        try:
+            async with message.channel.typing():
+                contenus = await asyncio.gather(*(a.read() for a in audios))
+                transcriptions = await asyncio.gather(*(
+                    # duration : fournie par Discord pour les messages vocaux (sinon None)
+                    asyncio.to_thread(transcrire_vocal, contenu, a.filename, getattr(a, "duration", None))
+                    for a, contenu in zip(audios, contenus)
+                ))
+        except Exception as e:
+            print(f"⚠️ Erreur vocaux : {e}")
+            transcriptions = []
+
+        # On garde l'ordre des pièces jointes
+        textes = [t.strip() for t in transcriptions if t and t.strip()]
+        if textes:
+            user_content = "\n".join(textes)
+            print(f"📝 Transcription : {user_content}")
+            await message.channel.send(f"*(J'ai entendu : \"{user_content}\")*")
+        else:
+            await message.channel.send("⚠️ Je n'ai rien entendu.")
+            return None
+
+    return user_content or None
+
+
+async def _traiter_tour(channel, textes):
+    """Un tour d'agent pour un ou plusieurs messages regroupés."""
+    user_content = "\n".join(textes)
+    if len(textes) > 1:
+        print(f"📦 {len(textes)} messages regroupés en un seul tour.")
+    print(f"📩 Traitement : {user_content}")
+
+    hist = historiques.get(channel.id, [])
+
+    # Limite globale : les autres salons attendent seulement si trop d'appels sont en vol
+    async with semaphore_llm:
+        async with channel.typing():
+            reponse, new_hist = await asyncio.to_thread(traiter_commande_gpt, user_content, hist)
+
+    historiques[channel.id] = new_hist
+
+    if reponse:
+        if len(reponse) > 2000:
+            for i in range(0, len(reponse), 2000):
+                await channel.send(reponse[i:i+2000])
+        else:
+            await channel.send(reponse)
+
+
+async def _traiter_tour_protege(channel, textes):
+    try:
+        await _traiter_tour(channel, textes)
+    except Exception as e:
+        print(f"⚠️ Erreur traitement salon {channel.id} : {e}")
+
+
+async def _worker_salon(channel, file):
+    """
+    Boîte aux lettres d'un salon : traite les messages dans l'ordre d'arrivée.
+    Tout ce qui arrive pendant un tour est regroupé dans le tour suivant.
+    """
+    while True:
+        try:
+            premiere = await asyncio.wait_for(file.get(), timeout=DELAI_INACTIVITE_SALON)
+        except asyncio.TimeoutError:
+            if file.empty():
+                # Pas d'await entre le test et le retrait : aucun message ne peut se perdre
+                files_salons.pop(channel.id, None)
+                return
+            continue
+
+        lot = [premiere]
+        while not file.empty():
+            lot.append(file.get_nowait())
+
+        en_attente = []
+        for preparation in lot:
+            try:
+                contenu = await preparation
+            except Exception as e:
+                print(f"⚠️ Erreur préparation message : {e}")
+                continue
+
+            if not contenu:
+                continue
+
+            # Un reset coupe le lot : ce qui précède est traité avant l'effacement
+            if contenu.lower() in ["reset", "clear", "oubli"]:
+                if en_attente:
+                    await _traiter_tour_protege(channel, en_attente)
+                    en_attente = []
+                historiques[channel.id] = []
+                await channel.send("🧹 Mémoire effacée.")
+                continue
+
+            en_attente.append(contenu)
+
+        if en_attente:
+            await _traiter_tour_protege(channel, en_attente)
+
+
+def _worker_termine(channel_id, tache):
+    """Done-callback : libère l'entrée du salon (si c'est toujours ce worker)."""
+    entree = files_salons.get(channel_id)
+    if entree is not None and entree[1] is tache:
+        files_salons.pop(channel_id, None)
+    if not tache.cancelled() and tache.exception():
+        print(f"⚠️ Worker du salon {channel_id} arrêté : {tache.exception()}")
+
+
 @client.event
 async def on_message(message):
     global dernier_channel_autorise
@@ -309,55 +650,22 @@ async def on_message(message):
     if message.author.id != config.AUTHORIZED_USER_ID:
         return
 
-    user_content = message.content
     dernier_channel_autorise = message.channel.id
 
-    # Gestion des vocaux
-    if message.attachments:
-        for attachment in message.attachments:
-            if attachment.content_type and "audio" in attachment.content_type:
-                print(f"🎤 Vocal reçu : {attachment.filename}")
-                temp_filename = f"temp_{attachment.filename}"
-                await attachment.save(temp_filename)
-                
-                async with message.channel.typing():
-                    transcription = await asyncio.to_thread(transcrire_audio, temp_filename)
-                
-                if os.path.exists(temp_filename):
-                    os.remove(temp_filename)
-
-                if transcription:
-                    user_content = transcription
-                    print(f"📝 Transcription : {user_content}")
-                    await message.channel.send(f"*(J'ai entendu : \"{user_content}\")*")
-                else:
-                    await message.channel.send("⚠️ Je n'ai rien entendu.")
-                    return
-                break
-
-    if not user_content:
-        return
+    # La préparation (transcription) démarre tout de suite,
+    # mais le worker du salon la consomme dans l'ordre d'arrivée.
+    preparation = asyncio.create_task(_preparer_contenu(message))
 
-    print(f"📩 Traitement : {user_content}")
+    entree = files_salons.get(message.channel.id)
+    if entree is None:
+        file = asyncio.Queue()
+        tache = asyncio.create_task(_worker_salon(message.channel, file))
+        files_salons[message.channel.id] = (file, tache)
+        tache.add_done_callback(lambda t, cid=message.channel.id: _worker_termine(cid, t))
+    else:
+        file = entree[0]
 
-    if user_content.lower() in ["reset", "clear", "oubli"]:
-        historiques[message.channel.id] = []
-        await message.channel.send("🧹 Mémoire effacée.")
-        return
-
-    hist = historiques.get(message.channel.id, [])
-    
-    async with message.channel.typing():
-        reponse, new_hist = await asyncio.to_thread(traiter_commande_gpt, user_content, hist)
-    
-    historiques[message.channel.id] = new_hist
-
-    if reponse:
-        if len(reponse) > 2000:
-            for i in range(0, len(reponse), 2000):
-                await message.channel.send(reponse[i:i+2000])
-        else:
-            await message.channel.send(reponse)
+    file.put_nowait(preparation)
 
 
 
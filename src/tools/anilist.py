@@ -3,52 +3,24 @@
 @fichier      : src/tools/anilist.py
 @description  : Gestion des anime avec Anilist (GraphQL).
                 Permet de chercher, ajouter à une watchlist et vérifier les sorties.
+                Les appels passent par le client partagé (anilist_client.py) :
+                limite de débit, session keep-alive et cache des métadonnées.
+                Watchlist et historique : base SQLite (anime_store.py).
 ================================================================================
 """
-import os
-import json
+import difflib
+import re
 import time
-import requests
 
-# --- CONFIGURATION DES CHEMINS (Infaillible) ---
-# On part de ce fichier : src/tools/anilist.py
-CURRENT_FILE = os.path.abspath(__file__)
-TOOLS_DIR = os.path.dirname(CURRENT_FILE)        # src/tools
-SRC_DIR = os.path.dirname(TOOLS_DIR)             # src
-PROJECT_ROOT = os.path.dirname(SRC_DIR)          # discordEnola (racine)
-ASSETS_DIR = os.path.join(PROJECT_ROOT, "assets")
+from .anilist_client import CHAMPS_MEDIA, get_client_anilist, get_cache_medias
+from .anime_store import get_stock_anime
+from .texte import normaliser_nom
 
-# Fichiers de données
-WATCHLIST_FILE = os.path.join(ASSETS_DIR, "anime_watchlist.json")
-HISTORY_FILE = os.path.join(ASSETS_DIR, "anime_history.json")
-
-ANILIST_API_URL = "https://graphql.anilist.co"
-
-# --- UTILITAIRES FICHIERS ---
-
-def _load_json(filepath):
-    if not os.path.exists(filepath):
-        return []
-    try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            content = f.read().strip()
-            return json.loads(content) if content else []
-    except Exception as e:
-        print(f"⚠️ Erreur lecture JSON {filepath} : {e}")
-        return []
-
-def _save_json(filepath, data):
-    try:
-        # On s'assure que le dossier assets existe
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4)
-        print(f"💾 Sauvegarde réussie : {filepath}") # Debug log
-    except Exception as e:
-        print(f"⚠️ Erreur sauvegarde JSON {filepath} : {e}")
+SEUIL_TITRE = 0.6     # Score minimal (difflib) pour qu'un titre de la watchlist soit candidat
+ECART_TITRE = 0.15    # Avance nécessaire sur le 2e pour trancher sans demander
 
 def get_watchlist():
-    return _load_json(WATCHLIST_FILE)
+    return get_stock_anime().watchlist()
 
 # --- FONCTIONS "REELLES" (Backend) ---
 
@@ -60,22 +32,19 @@ def tool_recherche_anime(query: str) -> str:
     gql = """
     query ($search: String) {
       Media (search: $search, type: ANIME) {
-        id
-        title { romaji }
-        coverImage { large }
-        siteUrl
-        description
+        %s
       }
     }
-    """
+    """ % CHAMPS_MEDIA
     try:
-        resp = requests.post(ANILIST_API_URL, json={'query': gql, 'variables': {'search': query}}, timeout=5)
-        data = resp.json()
+        data = get_client_anilist().requete(gql, {'search': query})
         
-        if not data.get('data') or not data['data'].get('Media'):
+        if not data.get('Media'):
             return "❌ Anime introuvable sur AniList."
 
-        m = data['data']['Media']
+        m = data['Media']
+        # Gardé en cache : l'ajout / le listing / les notifs n'auront pas à le redemander
+        get_cache_medias().enregistrer([m])
         # On retourne un résumé texte brut (URL simple)
         return (
             f"J'ai trouvé : {m['title']['romaji']} (ID: {m['id']})\n"
@@ -90,21 +59,74 @@ def tool_ajouter_anime_confirme(media_id: int, titre: str) -> str:
     """
     Ajoute l'ID à la watchlist (appelé uniquement après confirmation).
     """
-    watchlist = get_watchlist()
-    
     # Conversion en int pour éviter les doublons string/int
     try:
         media_id = int(media_id)
     except:
         return "Erreur : L'ID doit être un nombre."
 
-    if media_id in watchlist:
+    if not get_stock_anime().ajouter(media_id):
         return f"⚠️ {titre} est déjà dans la liste."
     
-    watchlist.append(media_id)
-    _save_json(WATCHLIST_FILE, watchlist)
+    # Titres (romaji, anglais, synonymes) en cache pour la suppression locale
+    try:
+        get_cache_medias().obtenir([media_id])
+    except Exception as e:
+        print(f"⚠️ Métadonnées AniList indisponibles pour {media_id} : {e}")
+    _watchlist_modifiee()
     return f"✅ {titre} a été ajouté aux notifications."
 
+def _cle_titre(titre):
+    """'Frieren: Beyond Journey's End' -> 'frieren beyond journey s end'"""
+    return re.sub(r"\s+", " ", re.sub(r"[^\w]", " ", normaliser_nom(titre))).strip()
+
+def _resoudre_dans_watchlist(query, ids):
+    """
+    Retrouve un anime de la watchlist par son titre (romaji, anglais, synonymes)
+    depuis le cache local. Retourne (media_id, []) si la correspondance est
+    claire, (None, [ids candidats]) sinon.
+    """
+    if str(query).strip().isdigit() and int(query) in ids:
+        return int(query), []
+
+    cible = _cle_titre(query)
+    if not cible:
+        return None, []
+
+    # Index local : titre normalisé -> media_id (seuls les animes suivis).
+    # Cache lu tel quel, même périmé : un titre ne change pas, et la seule
+    # requête autorisée est la recherche de repli de tool_gerer_watchlist.
+    cache = get_cache_medias()
+    index = {}
+    for media_id in ids:
+        m = cache.get(media_id)
+        if not m:
+            continue
+        for titre in [m.get('titre'), m.get('titre_en')] + (m.get('synonymes') or []):
+            if titre:
+                index[_cle_titre(titre)] = media_id
+
+    # 1. Titre exact
+    if cible in index:
+        return index[cible], []
+
+    # 2. Sous-chaîne ("frieren" dans "sousou no frieren")
+    partiels = {mid for titre, mid in index.items() if cible in titre}
+    if len(partiels) == 1:
+        return partiels.pop(), []
+
+    # 3. Approximatif : meilleur score par anime, il faut un gagnant net
+    scores = {}
+    for titre, mid in index.items():
+        score = difflib.SequenceMatcher(None, cible, titre).ratio()
+        scores[mid] = max(score, scores.get(mid, 0))
+    classement = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    proches = [mid for mid, score in classement if score >= SEUIL_TITRE]
+
+    if len(proches) == 1 or (proches and classement[0][1] - classement[1][1] >= ECART_TITRE):
+        return proches[0], []
+    return None, sorted(partiels) or proches
+
 def tool_gerer_watchlist(action: str, query: str = "") -> str:
     """
     Liste ou supprime des animes.
@@ -114,39 +136,37 @@ def tool_gerer_watchlist(action: str, query: str = "") -> str:
     
     if action == "lister":
         if not ids: return "La watchlist est vide."
-        # Récupération des titres en masse
-        gql = """
-        query ($ids: [Int]) {
-          Page { media(id_in: $ids) { title { romaji } } }
-        }
-        """
+        # Titres depuis le cache local (seuls les inconnus / périmés sont demandés à AniList)
         try:
-            resp = requests.post(ANILIST_API_URL, json={'query': gql, 'variables': {'ids': ids}})
-            data = resp.json()
-            if 'errors' in data: return "Erreur API lors du listing."
-            
-            medias = data['data']['Page']['media']
-            titres = [f"- {m['title']['romaji']}" for m in medias]
+            medias = get_cache_medias().obtenir(ids)
+            titres = [f"- {medias[i]['titre'] if i in medias else f'ID {i}'}" for i in ids]
             return "**📺 Watchlist actuelle :**\n" + "\n".join(titres)
         except Exception as e:
             return f"Erreur récupération liste : {e}"
 
     elif action == "supprimer":
-        search_res = tool_recherche_anime(query)
-        if "introuvable" in search_res or "Erreur" in search_res:
-            return "Je ne trouve pas cet anime pour le supprimer."
-        
-        # On refait une petite requête ID rapide
-        gql_search = "query ($s: String) { Media (search: $s, type: ANIME) { id title { romaji } } }"
+        if not ids: return "La watchlist est vide."
         try:
-            r = requests.post(ANILIST_API_URL, json={'query': gql_search, 'variables': {'s': query}})
-            d = r.json()['data']['Media']
-            target_id = d['id']
-            target_title = d['title']['romaji']
+            target_id, candidats = _resoudre_dans_watchlist(query, ids)
+
+            if target_id is None and len(candidats) > 1:
+                noms = ", ".join(get_cache_medias().get(c)['titre'] for c in candidats)
+                return f"Plusieurs animes correspondent : {noms}. Lequel retirer ?"
+
+            if target_id is None:
+                # Rien de clair localement : une seule recherche AniList
+                gql_search = "query ($s: String) { Media (search: $s, type: ANIME) { %s } }" % CHAMPS_MEDIA
+                d = get_client_anilist().requete(gql_search, {'s': query}).get('Media')
+                if not d:
+                    return "Je ne trouve pas cet anime pour le supprimer."
+                get_cache_medias().enregistrer([d])
+                target_id = d['id']
+
+            media = get_cache_medias().get(target_id)
+            target_title = media['titre'] if media else f"ID {target_id}"
             
-            if target_id in ids:
-                ids.remove(target_id)
-                _save_json(WATCHLIST_FILE, ids)
+            if get_stock_anime().retirer(target_id):
+                _watchlist_modifiee()
                 return f"🗑️ {target_title} retiré de la watchlist."
             else:
                 return f"{target_title} n'était pas dans la liste."
@@ -155,78 +175,83 @@ def tool_gerer_watchlist(action: str, query: str = "") -> str:
             
     return "Action inconnue."
 
-# --- CHECK AUTO (Task Loop) ---
+# --- PLANNING DES SORTIES ---
+
+JOURS_PLANIFICATION = 7   # AniList publie les horaires plusieurs jours à l'avance
+RATTRAPAGE = 3600         # Un épisode sorti il y a moins d'1h et pas notifié l'est encore
+
+_abonnes_watchlist = []
+
+def abonner_watchlist(callback):
+    """callback() appelé après chaque ajout / suppression dans la watchlist."""
+    _abonnes_watchlist.append(callback)
+
+def _watchlist_modifiee():
+    for callback in list(_abonnes_watchlist):
+        try:
+            callback()
+        except Exception as e:
+            print(f"⚠️ Erreur abonné watchlist : {e}")
 
-def check_new_episodes():
-    """Vérifie les sorties récentes (-1h à +1h)."""
+def prochaines_diffusions(jours=JOURS_PLANIFICATION):
+    """
+    Épisodes de la watchlist diffusés entre -1h et +`jours`, pas encore notifiés.
+    Toutes les pages sont parcourues (Page plafonne à 50 résultats).
+    """
     watchlist = get_watchlist()
     if not watchlist: return []
 
-    history = _load_json(HISTORY_FILE)
+    stock = get_stock_anime()
+    stock.purger()
     now = int(time.time())
-    
+
     query = """
-    query ($start: Int, $end: Int, $ids: [Int]) {
-      Page {
-        airingSchedules(airingAt_greater: $start, airingAt_lesser: $end, mediaId_in: $ids) {
-          id
+    query ($start: Int, $end: Int, $ids: [Int], $page: Int) {
+      Page(page: $page, perPage: 50) {
+        pageInfo { hasNextPage }
+        airingSchedules(airingAt_greater: $start, airingAt_lesser: $end, mediaId_in: $ids, sort: TIME) {
           episode
           airingAt
-          media {
-            id
-            title { romaji }
-            siteUrl
-            coverImage { large }
-            externalLinks { site url }
-          }
+          mediaId
         }
       }
     }
     """
     variables = {
-        "start": now - 3600, 
-        "end": now + 3600,
-        "ids": watchlist
+        "start": now - RATTRAPAGE,
+        "end": now + jours * 86400,
+        "ids": watchlist,
+        "page": 1,
     }
 
-    new_releases = []
-    try:
-        resp = requests.post(ANILIST_API_URL, json={'query': query, 'variables': variables}, timeout=10)
-        if resp.status_code != 200: return []
-        
-        data = resp.json()
-        if 'errors' in data: return []
-        
-        schedules = data.get('data', {}).get('Page', {}).get('airingSchedules', [])
+    schedules = []
+    client = get_client_anilist()
+    while True:
+        page = client.requete(query, variables).get('Page', {})
+        schedules.extend(page.get('airingSchedules', []))
+        if not page.get('pageInfo', {}).get('hasNextPage'):
+            break
+        variables["page"] += 1
 
-        for item in schedules:
-            unique_id = f"{item['media']['id']}_EP{item['episode']}"
-            
-            if unique_id in history:
-                continue
-            
-            # Si l'heure de sortie est passée (ou imminente à 2 min près)
-            if item['airingAt'] <= now + 120: 
-                crunchy_link = item['media']['siteUrl']
-                for link in item['media']['externalLinks']:
-                    if "Crunchyroll" in link['site']:
-                        crunchy_link = link['url']
-                        break
-                
-                new_releases.append({
-                    "titre": item['media']['title']['romaji'],
-                    "episode": item['episode'],
-                    "crunchy_url": crunchy_link,
-                    "anilist_url": item['media']['siteUrl'],
-                    "image_url": item['media']['coverImage']['large'],
-                    "timestamp": item['airingAt']
-                })
-                history.append(unique_id)
-        
-        if len(history) > 200: history = history[-200:]
-        if new_releases: _save_json(HISTORY_FILE, history)
+    # Titres, images et liens : depuis le cache des médias
+    medias = get_cache_medias().obtenir({item['mediaId'] for item in schedules})
 
-    except Exception as e:
-        print(f"⚠️ Erreur Check Anime : {e}")
+    diffusions = []
+    for item in schedules:
+        media = medias.get(item['mediaId'])
+        if not media or stock.deja_notifie(item['mediaId'], item['episode']):
+            continue
+        diffusions.append({
+            "media_id": item['mediaId'],
+            "titre": media['titre'],
+            "episode": item['episode'],
+            "crunchy_url": media['crunchy_url'] or media['url'],
+            "anilist_url": media['url'],
+            "image_url": media['image'],
+            "timestamp": item['airingAt']
+        })
+    return diffusions
 
-    return new_releases
\ No newline at end of file
+def marquer_notifie(media_id, episode, diffuse_a=None):
+    """Ajoute l'épisode à l'historique. False s'il avait déjà été notifié."""
+    return get_stock_anime().marquer_notifie(media_id, episode, diffuse_a)
@@ -0,0 +1,271 @@
+"""
+================================================================================
+@fichier      : src/tools/anilist_client.py
+@description  : Client AniList (GraphQL) partagé par tout le processus.
+                Seau à jetons calé sur la limite AniList (90 req/min, ajustée
+                par les en-têtes X-RateLimit-*), respect de Retry-After sur 429,
+                session keep-alive avec retries, et cache persistant des
+                métadonnées des anime (titres, image, liens) indexé par id.
+================================================================================
+"""
+
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import ASSETS_DIR
+from .stockage import charger_json, sauver_json_atomique
+
+ANILIST_API_URL = "https://graphql.anilist.co"
+MEDIA_CACHE_FILE = os.path.join(ASSETS_DIR, "anilist_media.json")
+
+LIMITE_PAR_MINUTE = 90
+TIMEOUT = (3, 10)               # (connexion, lecture) en secondes
+TENTATIVES_429 = 3
+RETRY_AFTER_MAX = 60
+TTL_MEDIA = 7 * 24 * 3600       # Métadonnées d'un anime en cours rafraîchies 1x/semaine
+PAR_PAGE = 50                   # Maximum autorisé par AniList pour Page
+
+# Champs gardés en cache pour chaque anime (à inclure dans les requêtes "media { ... }")
+CHAMPS_MEDIA = """
+    id
+    title { romaji english }
+    synonyms
+    coverImage { large }
+    siteUrl
+    status
+    externalLinks { site url }
+"""
+
+
+# ------------------------------------------------------------------------------
+# LIMITEUR
+# ------------------------------------------------------------------------------
+
+
+class _SeauJetons:
+    """
+    Seau à jetons thread-safe : `capacite` requêtes par minute en régime
+    établi. Les en-têtes AniList recalent la limite et les jetons restants,
+    un 429 bloque tout le monde jusqu'à la fin du Retry-After.
+    """
+
+    def __init__(self, capacite=LIMITE_PAR_MINUTE, periode=60.0):
+        self.periode = periode
+        self.capacite = capacite
+        self.jetons = float(capacite)
+        self._maj = time.monotonic()
+        self._bloque_jusqu_a = 0.0
+        self._verrou = threading.Lock()
+
+    def _remplir(self, maintenant):
+        debit = self.capacite / self.periode
+        self.jetons = min(self.capacite, self.jetons + (maintenant - self._maj) * debit)
+        self._maj = maintenant
+
+    def prendre(self):
+        """Bloque jusqu'à ce qu'une requête soit autorisée."""
+        while True:
+            with self._verrou:
+                maintenant = time.monotonic()
+                self._remplir(maintenant)
+                if maintenant < self._bloque_jusqu_a:
+                    attente = self._bloque_jusqu_a - maintenant
+                elif self.jetons >= 1:
+                    self.jetons -= 1
+                    return
+                else:
+                    attente = (1 - self.jetons) * self.periode / self.capacite
+            time.sleep(attente)
+
+    def ajuster(self, limite=None, restant=None):
+        with self._verrou:
+            self._remplir(time.monotonic())
+            if limite and limite != self.capacite:
+                # AniList peut passer en mode dégradé (30 req/min)
+                self.capacite = limite
+                self.jetons = min(self.jetons, limite)
+            if restant is not None:
+                self.jetons = min(self.jetons, restant)
+
+    def bloquer(self, secondes):
+        with self._verrou:
+            self._bloque_jusqu_a = max(self._bloque_jusqu_a, time.monotonic() + secondes)
+            self.jetons = 0.0
+
+
+def _entier(valeur):
+    try:
+        return int(valeur)
+    except (TypeError, ValueError):
+        return None
+
+
+# ------------------------------------------------------------------------------
+# CLIENT
+# ------------------------------------------------------------------------------
+
+
+class ClientAniList:
+    def __init__(self):
+        # Retries réseau / 5xx uniquement : les 429 passent par le seau à jetons
+        retry = Retry(
+            total=2,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(["POST"]),
+            raise_on_status=False,
+        )
+        self._http = requests.Session()
+        self._http.mount("https://", HTTPAdapter(pool_maxsize=4, max_retries=retry))
+        self._seau = _SeauJetons()
+        self.appels = 0
+
+    def requete(self, gql, variables=None):
+        """Exécute une requête GraphQL et retourne `data` (RuntimeError si erreur)."""
+        for _ in range(TENTATIVES_429):
+            self._seau.prendre()
+            resp = self._http.post(
+                ANILIST_API_URL,
+                json={"query": gql, "variables": variables or {}},
+                timeout=TIMEOUT,
+            )
+            self.appels += 1
+
+            self._seau.ajuster(
+                _entier(resp.headers.get("X-RateLimit-Limit")),
+                _entier(resp.headers.get("X-RateLimit-Remaining")),
+            )
+
+            if resp.status_code == 429:
+                delai = min(_entier(resp.headers.get("Retry-After")) or 60, RETRY_AFTER_MAX)
+                print(f"⏳ AniList : limite atteinte, pause de {delai}s.")
+                self._seau.bloquer(delai)
+                continue
+
+            data = resp.json()
+            if data.get("errors") and not data.get("data"):
+                raise RuntimeError(f"AniList : {data['errors'][0].get('message')}")
+            return data.get("data") or {}
+
+        raise RuntimeError("AniList : trop de requêtes (429)")
+
+
+_client = None
+_verrou_client = threading.Lock()
+
+
+def get_client_anilist():
+    global _client
+    if _client is None:
+        with _verrou_client:
+            if _client is None:
+                _client = ClientAniList()
+    return _client
+
+
+# ------------------------------------------------------------------------------
+# CACHE DES MÉDIAS
+# ------------------------------------------------------------------------------
+
+
+def _compacter(m):
+    """Réponse AniList (CHAMPS_MEDIA) -> entrée de cache."""
+    crunchy_url = None
+    for link in m.get("externalLinks") or []:
+        if "Crunchyroll" in (link.get("site") or ""):
+            crunchy_url = link["url"]
+            break
+
+    titres = m.get("title") or {}
+    return {
+        "id": m["id"],
+        "titre": titres.get("romaji") or titres.get("english") or str(m["id"]),
+        "titre_en": titres.get("english"),
+        "synonymes": m.get("synonyms") or [],
+        "image": (m.get("coverImage") or {}).get("large"),
+        "url": m.get("siteUrl"),
+        "crunchy_url": crunchy_url,
+        "statut": m.get("status"),
+        "maj": time.time(),
+    }
+
+
+class CacheMedias:
+    """{id (str): entrée} persisté sur disque, complété à la demande."""
+
+    def __init__(self, chemin=MEDIA_CACHE_FILE):
+        self.chemin = chemin
+        self._verrou = threading.Lock()
+        self._medias = charger_json(chemin, {}) or {}
+
+    def _frais(self, entree):
+        if not entree:
+            return False
+        # Un anime terminé ne change plus
+        if entree.get("statut") in ("FINISHED", "CANCELLED"):
+            return True
+        return time.time() - entree.get("maj", 0) < TTL_MEDIA
+
+    def enregistrer(self, medias):
+        """Ajoute / met à jour des médias reçus d'une requête (search, schedules...)."""
+        medias = [m for m in medias if m and m.get("id")]
+        if not medias:
+            return
+        with self._verrou:
+            for m in medias:
+                self._medias[str(m["id"])] = _compacter(m)
+            copie = dict(self._medias)
+        sauver_json_atomique(self.chemin, copie)
+
+    def get(self, media_id):
+        with self._verrou:
+            return self._medias.get(str(media_id))
+
+    def tous(self):
+        with self._verrou:
+            return list(self._medias.values())
+
+    def obtenir(self, ids, client=None):
+        """
+        {id: entrée} pour les ids demandés : lecture locale, et une seule
+        requête paginée pour les absents / périmés.
+        """
+        ids = [int(i) for i in ids]
+        with self._verrou:
+            a_charger = [i for i in ids if not self._frais(self._medias.get(str(i)))]
+
+        if a_charger:
+            client = client or get_client_anilist()
+            gql = "query ($ids: [Int], $page: Int) { Page(page: $page, perPage: %d) { pageInfo { hasNextPage } media(id_in: $ids) { %s } } }" % (PAR_PAGE, CHAMPS_MEDIA)
+            try:
+                page = 1
+                while True:
+                    data = client.requete(gql, {"ids": a_charger, "page": page})["Page"]
+                    self.enregistrer(data.get("media") or [])
+                    if not data["pageInfo"]["hasNextPage"]:
+                        break
+                    page += 1
+            except Exception as e:
+                # On sert ce qu'on a, même périmé
+                print(f"⚠️ Erreur chargement métadonnées AniList : {e}")
+
+        with self._verrou:
+            return {i: self._medias[str(i)] for i in ids if str(i) in self._medias}
+
+
+_cache = None
+_verrou_cache = threading.Lock()
+
+
+def get_cache_medias():
+    global _cache
+    if _cache is None:
+        with _verrou_cache:
+            if _cache is None:
+                _cache = CacheMedias()
+    return _cache
@@ -0,0 +1,101 @@
+"""
+================================================================================
+@fichier      : src/tools/anilist_notifier.py
+@description  : Notifications de sorties d'épisodes planifiées à l'avance.
+                Le planning AniList de la watchlist est chargé sur plusieurs
+                jours (quelques requêtes par jour au lieu d'une toutes les
+                5 min) et chaque épisode reçoit un réveil asyncio à son heure
+                exacte de diffusion.
+================================================================================
+"""
+
+import asyncio
+import time
+
+from .anilist import abonner_watchlist, marquer_notifie, prochaines_diffusions
+
+DELAI_REGROUPEMENT = 5  # Plusieurs modifs de watchlist d'affilée -> un seul rechargement
+
+
+class NotificateurSorties:
+    """
+    envoyer : coroutine envoyer(diffusion) appelée à l'heure de sortie.
+    recharger() est appelé périodiquement et à chaque changement de watchlist.
+    """
+
+    def __init__(self, loop, envoyer):
+        self.loop = loop
+        self.envoyer = envoyer
+        self._reveils = {}          # (media_id, episode) -> [diffusion, TimerHandle]
+        self._recharge_prevue = None
+        self._verrou = asyncio.Lock()
+
+    def demarrer(self):
+        abonner_watchlist(self._sur_watchlist_modifiee)
+
+    # --- Chargement du planning ---
+
+    async def recharger(self):
+        """Recharge le planning et (re)planifie un réveil par épisode."""
+        async with self._verrou:
+            try:
+                diffusions = await self.loop.run_in_executor(None, prochaines_diffusions)
+            except Exception as e:
+                print(f"⚠️ Erreur planning AniList : {e}")
+                return
+
+            vues = set()
+            for d in diffusions:
+                cle = (d["media_id"], d["episode"])
+                vues.add(cle)
+                self._planifier(cle, d)
+
+            # Épisodes retirés du planning (anime supprimé de la watchlist, report...)
+            for cle in [c for c in self._reveils if c not in vues]:
+                self._annuler(cle)
+
+            print(f"📺 {len(self._reveils)} sortie(s) d'épisode planifiée(s).")
+
+    def _planifier(self, cle, diffusion):
+        deja = self._reveils.get(cle)
+        if deja and deja[0]["timestamp"] == diffusion["timestamp"]:
+            deja[0] = diffusion
+            return
+        self._annuler(cle)
+
+        delai = max(0.0, diffusion["timestamp"] - time.time())
+        handle = self.loop.call_at(self.loop.time() + delai, self._sonner, cle)
+        self._reveils[cle] = [diffusion, handle]
+
+    def _annuler(self, cle):
+        deja = self._reveils.pop(cle, None)
+        if deja:
+            deja[1].cancel()
+
+    def _sur_watchlist_modifiee(self):
+        # Appelé depuis le thread du tool : on repasse dans la boucle
+        self.loop.call_soon_threadsafe(self._programmer_recharge)
+
+    def _programmer_recharge(self):
+        if self._recharge_prevue:
+            self._recharge_prevue.cancel()
+        self._recharge_prevue = self.loop.call_later(
+            DELAI_REGROUPEMENT, lambda: asyncio.ensure_future(self.recharger(), loop=self.loop)
+        )
+
+    # --- Réveil ---
+
+    def _sonner(self, cle):
+        deja = self._reveils.pop(cle, None)
+        if deja:
+            asyncio.ensure_future(self._notifier(deja[0]), loop=self.loop)
+
+    async def _notifier(self, diffusion):
+        try:
+            nouveau = await self.loop.run_in_executor(
+                None, marquer_notifie, diffusion["media_id"], diffusion["episode"], diffusion["timestamp"]
+            )
+            if nouveau:
+                await self.envoyer(diffusion)
+        except Exception as e:
+            print(f"⚠️ Erreur notification anime : {e}")
@@ -0,0 +1,197 @@
+"""
+================================================================================
+@fichier      : src/tools/anime_store.py
+@description  : Watchlist et historique des notifications anime.
+                Persistance SQLite (transactions atomiques, une ligne écrite
+                par changement) et index en mémoire (sets) pour les tests
+                d'appartenance. L'historique est dédoublonné par
+                (anime, épisode) et expire selon la date de diffusion.
+                Les écritures d'un autre process (bot / API) sont détectées
+                via PRAGMA data_version et rechargent l'index.
+                Reprend automatiquement les anciens fichiers JSON.
+================================================================================
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from config import ASSETS_DIR
+from .stockage import charger_json
+
+DB_FILE = os.path.join(ASSETS_DIR, "anime.db")
+
+# Anciens fichiers (migrés une seule fois)
+WATCHLIST_FILE = os.path.join(ASSETS_DIR, "anime_watchlist.json")
+HISTORY_FILE = os.path.join(ASSETS_DIR, "anime_history.json")
+
+RETENTION_HISTORIQUE = 30 * 24 * 3600   # Un épisode diffusé il y a +30 jours ne peut plus être re-notifié
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watchlist (
+    media_id INTEGER PRIMARY KEY,
+    ajoute_a REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS historique (
+    media_id  INTEGER NOT NULL,
+    episode   INTEGER NOT NULL,
+    diffuse_a REAL NOT NULL,
+    notifie_a REAL NOT NULL,
+    PRIMARY KEY (media_id, episode)
+);
+CREATE INDEX IF NOT EXISTS idx_historique_diffuse_a ON historique (diffuse_a);
+CREATE TABLE IF NOT EXISTS meta (
+    cle    TEXT PRIMARY KEY,
+    valeur TEXT
+);
+"""
+
+
+class StockAnime:
+    def __init__(self, chemin=DB_FILE):
+        if chemin != ":memory:":
+            os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        self._verrou = threading.Lock()
+        self._conn = sqlite3.connect(chemin, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+        self._migrer_json()
+
+        # Index mémoire : relu seulement quand un autre process a écrit dans la base
+        self._version = None
+        self._watchlist = {}    # dict ordonné = set qui garde l'ordre d'ajout
+        self._historique = set()
+        with self._verrou:
+            self._synchroniser()
+
+    def _synchroniser(self):
+        """
+        Recharge l'index si la base a été modifiée par une autre connexion
+        (data_version ne bouge pas pour nos propres commits). Appelé sous le verrou.
+        """
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._version:
+            return
+        self._version = version
+        lignes = self._conn.execute("SELECT media_id FROM watchlist ORDER BY ajoute_a").fetchall()
+        self._watchlist = {m: None for (m,) in lignes}
+        self._historique = set(self._conn.execute("SELECT media_id, episode FROM historique").fetchall())
+
+    # --- Watchlist ---
+
+    def watchlist(self):
+        with self._verrou:
+            self._synchroniser()
+            return list(self._watchlist)
+
+    def est_suivi(self, media_id):
+        with self._verrou:
+            self._synchroniser()
+            return int(media_id) in self._watchlist
+
+    def ajouter(self, media_id):
+        """True si ajouté, False si déjà présent."""
+        media_id = int(media_id)
+        with self._verrou:
+            self._synchroniser()
+            if media_id in self._watchlist:
+                return False
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO watchlist (media_id, ajoute_a) VALUES (?, ?)",
+                    (media_id, time.time()),
+                )
+            self._watchlist[media_id] = None
+            return True
+
+    def retirer(self, media_id):
+        """True si retiré, False s'il n'était pas suivi."""
+        media_id = int(media_id)
+        with self._verrou:
+            self._synchroniser()
+            if media_id not in self._watchlist:
+                return False
+            with self._conn:
+                self._conn.execute("DELETE FROM watchlist WHERE media_id = ?", (media_id,))
+            del self._watchlist[media_id]
+            return True
+
+    # --- Historique ---
+
+    def deja_notifie(self, media_id, episode):
+        with self._verrou:
+            self._synchroniser()
+            return (int(media_id), int(episode)) in self._historique
+
+    def marquer_notifie(self, media_id, episode, diffuse_a=None):
+        """True si l'épisode n'avait pas encore été notifié."""
+        cle = (int(media_id), int(episode))
+        maintenant = time.time()
+        with self._verrou:
+            self._synchroniser()
+            if cle in self._historique:
+                return False
+            with self._conn:
+                curseur = self._conn.execute(
+                    "INSERT OR IGNORE INTO historique VALUES (?, ?, ?, ?)",
+                    (cle[0], cle[1], diffuse_a or maintenant, maintenant),
+                )
+            self._historique.add(cle)
+            # 0 ligne insérée : l'autre process l'a notifié entre-temps
+            return curseur.rowcount == 1
+
+    def purger(self, maintenant=None):
+        """Oublie les épisodes diffusés depuis plus de RETENTION_HISTORIQUE."""
+        limite = (maintenant or time.time()) - RETENTION_HISTORIQUE
+        with self._verrou:
+            with self._conn:
+                anciens = self._conn.execute(
+                    "SELECT media_id, episode FROM historique WHERE diffuse_a < ?", (limite,)
+                ).fetchall()
+                self._conn.execute("DELETE FROM historique WHERE diffuse_a < ?", (limite,))
+            self._historique.difference_update(anciens)
+            return len(anciens)
+
+    # --- Migration ---
+
+    def _migrer_json(self):
+        fait = self._conn.execute("SELECT valeur FROM meta WHERE cle = 'migration_json'").fetchone()
+        if fait:
+            return
+
+        ids = charger_json(WATCHLIST_FILE, []) or []
+        historique = charger_json(HISTORY_FILE, []) or []
+        maintenant = time.time()
+
+        lignes_historique = []
+        for unique_id in historique:
+            # Ancien format : "12345_EP7" (date de diffusion inconnue -> maintenant)
+            m = re.fullmatch(r"(\d+)_EP(\d+)", str(unique_id))
+            if m:
+                lignes_historique.append((int(m.group(1)), int(m.group(2)), maintenant, maintenant))
+
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO watchlist (media_id, ajoute_a) VALUES (?, ?)",
+                [(int(i), maintenant + n * 1e-6) for n, i in enumerate(ids)],
+            )
+            self._conn.executemany("INSERT OR IGNORE INTO historique VALUES (?, ?, ?, ?)", lignes_historique)
+            self._conn.execute("INSERT INTO meta VALUES ('migration_json', ?)", (str(maintenant),))
+
+        if ids or lignes_historique:
+            print(f"📦 Anime : {len(ids)} suivi(s) et {len(lignes_historique)} notification(s) repris du JSON.")
+
+
+_stock = None
+_verrou_stock = threading.Lock()
+
+
+def get_stock_anime():
+    global _stock
+    if _stock is None:
+        with _verrou_stock:
+            if _stock is None:
+                _stock = StockAnime()
+    return _stock
@@ -3,18 +3,16 @@
 @fichier      : src/tools/calendar.py
 @description  : Gestion de Google Agenda.
                 Permet d'ajouter des événements et de consulter le planning
-                via l'API Google Calendar v3. Gère l'authentification OAuth2.
+                via l'API Google Calendar v3. Gère l'authentification OAuth2
+                à travers une session partagée (voir calendar_session.py).
+                Les lectures sont servies par le miroir local (calendar_store.py).
 ================================================================================
 """
 
-import os
 from datetime import datetime, timedelta
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-
-from config import TOKEN_PATH, SCOPES
+from .calendar_session import get_session_agenda
+from .calendar_store import get_miroir_agenda, synchroniser_si_perime
 
 
 # ------------------------------------------------------------------------------
@@ -24,34 +22,10 @@ from config import TOKEN_PATH, SCOPES
 
 def get_calendar_service():
     """
-    Crée et retourne un objet service authentifié pour l'API Google Calendar.
-    Gère le rafraîchissement automatique du token s'il a expiré.
+    Retourne la session Agenda partagée (service construit une seule fois,
+    token gardé en mémoire et rafraîchi avant expiration). None si pas de token.
     """
-    creds = None
-
-    # 1. Chargement du token existant
-    if os.path.exists(TOKEN_PATH):
-        creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
-
-    # 2. Vérification de la validité
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                # Rafraîchissement du token
-                creds.refresh(Request())
-                # Sauvegarde du nouveau token
-                with open(TOKEN_PATH, "w") as token:
-                    token.write(creds.to_json())
-            except Exception as e:
-                print(f"⚠️ Erreur refresh token Google: {e}")
-                return None
-        else:
-            # Token manquant ou invalide sans refresh possible
-            print(f"⚠️ Token Google absent ou invalide dans {TOKEN_PATH}.")
-            print("👉 Tu dois générer un token.json (comme pour Spotify).")
-            return None
-
-    return build("calendar", "v3", credentials=creds)
+    return get_session_agenda()
 
 
 # ------------------------------------------------------------------------------
@@ -59,6 +33,45 @@ def get_calendar_service():
 # ------------------------------------------------------------------------------
 
 
+def _preparer_evenement(titre, date_str, now):
+    """
+    Valide la date et construit le corps de l'événement (1h par défaut).
+    Retourne (event, start_dt, None) ou (None, None, message d'erreur).
+    """
+    # --- Conversion de la date (ISO) ---
+    try:
+        start_dt = datetime.fromisoformat(date_str)
+    except ValueError:
+        return None, None, "Je n'ai pas compris la date donnée par le système."
+
+    # --- Correction intelligente de l'année ---
+    # Si l'IA donne une date passée (ex: 2023), on tente de corriger pour l'année en cours
+    if start_dt.year < now.year:
+        print(
+            f"⚠️ Date reçue dans le passé ({start_dt.year}). Correction vers {now.year}..."
+        )
+        try:
+            start_dt = start_dt.replace(year=now.year)
+        except ValueError:
+            # Gestion du 29 fév si on change d'année
+            start_dt = start_dt.replace(year=now.year, day=28)
+
+    # Garde-fou final : on ne crée pas d'événement dans le passé
+    if start_dt < now:
+        print("⚠️ Date finale toujours dans le passé -> refus.")
+        return None, None, "ERREUR_DATE_PASSEE: la date calculée est dans le passé"
+
+    # Durée par défaut de 1h
+    end_dt = start_dt + timedelta(hours=1)
+
+    event = {
+        "summary": titre,
+        "start": {"dateTime": start_dt.isoformat(), "timeZone": "Europe/Paris"},
+        "end": {"dateTime": end_dt.isoformat(), "timeZone": "Europe/Paris"},
+    }
+    return event, start_dt, None
+
+
 def ajouter_agenda_reel(titre: str, date_str: str) -> str:
     """
     Ajoute un événement dans l'agenda principal.
@@ -71,40 +84,13 @@ def ajouter_agenda_reel(titre: str, date_str: str) -> str:
         if not service:
             return "Je n'ai pas accès à ton agenda Google (Token manquant)."
 
-        # --- Conversion de la date (ISO) ---
-        try:
-            start_dt = datetime.fromisoformat(date_str)
-        except ValueError:
-            return "Je n'ai pas compris la date donnée par le système."
+        event, start_dt, erreur = _preparer_evenement(titre, date_str, datetime.now())
+        if erreur:
+            return erreur
 
-        # --- Correction intelligente de l'année ---
-        now = datetime.now()
-        # Si l'IA donne une date passée (ex: 2023), on tente de corriger pour l'année en cours
-        if start_dt.year < now.year:
-            print(
-                f"⚠️ Date reçue dans le passé ({start_dt.year}). Correction vers {now.year}..."
-            )
-            try:
-                start_dt = start_dt.replace(year=now.year)
-            except ValueError:
-                # Gestion du 29 fév si on change d'année
-                start_dt = start_dt.replace(year=now.year, day=28)
-
-        # Garde-fou final : on ne crée pas d'événement dans le passé
-        if start_dt < now:
-            print("⚠️ Date finale toujours dans le passé -> refus.")
-            return "ERREUR_DATE_PASSEE: la date calculée est dans le passé"
-
-        # Durée par défaut de 1h
-        end_dt = start_dt + timedelta(hours=1)
-
-        event = {
-            "summary": titre,
-            "start": {"dateTime": start_dt.isoformat(), "timeZone": "Europe/Paris"},
-            "end": {"dateTime": end_dt.isoformat(), "timeZone": "Europe/Paris"},
-        }
-
-        service.events().insert(calendarId="primary", body=event).execute()
+        cree = service.executer(service.events().insert(calendarId="primary", body=event))
+        # Visible tout de suite dans le miroir local (la prochaine synchro confirmera)
+        get_miroir_agenda().integrer(cree)
 
         # Formatage de la date pour la réponse orale (ex: "le 12 mars à 14 heures")
         date_orale = start_dt.strftime("le %d %B à %H heures")
@@ -115,54 +101,107 @@ def ajouter_agenda_reel(titre: str, date_str: str) -> str:
         return "J'ai eu un souci technique avec l'agenda."
 
 
-def consulter_agenda_reel(date_cible_str: str) -> str:
+def ajouter_agenda_multiple_reel(evenements: list) -> str:
     """
-    Récupère les événements de la journée spécifiée.
+    Ajoute plusieurs événements d'un coup (ex: sport lundi, mercredi, vendredi).
+    Les dates sont validées avant tout envoi, puis les créations partent
+    dans une seule requête HTTP batch. Le résultat est détaillé par événement.
     """
-    print(f"📅 Agenda : Consultation pour {date_cible_str}")
+    print(f"📅 Agenda : Demande d'ajout groupé de {len(evenements)} événement(s)")
 
     try:
         service = get_calendar_service()
         if not service:
-            return "Je n'ai pas accès à ton agenda."
+            return "Je n'ai pas accès à ton agenda Google (Token manquant)."
 
         now = datetime.now()
+        lignes = [None] * len(evenements)   # Résultat par événement, dans l'ordre demandé
+        a_creer = []  # (index, titre, start_dt, event)
 
-        if not date_cible_str:
-            date_cible = now
-        else:
-            try:
-                date_cible = datetime.fromisoformat(date_cible_str)
-            except ValueError:
-                date_cible = now
-
-            # Correction année si nécessaire
-            if date_cible.year < now.year:
-                date_cible = date_cible.replace(year=now.year)
-
-        # Définition de la plage de recherche (Toute la journée UTC)
-        time_min = (
-            date_cible.replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
-            + "Z"
-        )
-        time_max = (
-            date_cible.replace(hour=23, minute=59, second=59, microsecond=0).isoformat()
-            + "Z"
-        )
+        # 1. Validation locale de toutes les dates
+        for i, e in enumerate(evenements):
+            titre = e["titre"] if isinstance(e, dict) else e.titre
+            date_str = e["date_str"] if isinstance(e, dict) else e.date_str
 
-        events_result = (
-            service.events()
-            .list(
-                calendarId="primary",
-                timeMin=time_min,
-                timeMax=time_max,
-                singleEvents=True,
-                orderBy="startTime",
-            )
-            .execute()
-        )
+            event, start_dt, erreur = _preparer_evenement(titre, date_str, now)
+            if erreur:
+                lignes[i] = f"❌ '{titre}' ({date_str}) : {erreur}"
+            else:
+                a_creer.append((i, titre, start_dt, event))
+
+        # 2. Un seul aller-retour HTTP pour toutes les créations
+        resultats = []
+        if a_creer:
+            resultats = service.executer_lot([
+                service.events().insert(calendarId="primary", body=event)
+                for _, _, _, event in a_creer
+            ])
+
+        miroir = get_miroir_agenda()
+        ajoutes = 0
+        for (i, titre, start_dt, _), (cree, erreur) in zip(a_creer, resultats):
+            date_orale = start_dt.strftime("le %d %B à %H heures")
+            if erreur is not None:
+                print(f"❌ Erreur Agenda ({titre}) : {erreur}")
+                lignes[i] = f"❌ '{titre}' {date_orale} : échec de la création"
+                continue
+            miroir.integrer(cree)
+            ajoutes += 1
+            lignes[i] = f"✅ '{titre}' {date_orale}"
+
+        return f"{ajoutes}/{len(evenements)} événement(s) ajouté(s).\n" + "\n".join(lignes)
+
+    except Exception as e:
+        print(f"❌ Erreur Agenda : {e}")
+        return "J'ai eu un souci technique avec l'agenda."
+
+
+def _date_demandee(date_str, now):
+    """ISO -> datetime (maintenant si vide / illisible), année corrigée si passée."""
+    if not date_str:
+        return now
+    try:
+        date_cible = datetime.fromisoformat(date_str)
+    except ValueError:
+        return now
+
+    # Correction année si nécessaire
+    if date_cible.year < now.year:
+        date_cible = date_cible.replace(year=now.year)
+    return date_cible
 
-        events = events_result.get("items", [])
+
+def _miroir(service):
+    """Miroir local, resynchronisé (incrémental) s'il date de plus d'une minute."""
+    return synchroniser_si_perime(service)
+
+
+def consulter_agenda_reel(date_cible_str: str, date_fin_str: str = None) -> str:
+    """
+    Récupère les événements de la journée spécifiée
+    (ou de toute la plage jusqu'à date_fin_str incluse), depuis le miroir local.
+    """
+    print(f"📅 Agenda : Consultation pour {date_cible_str} -> {date_fin_str or date_cible_str}")
+
+    try:
+        service = get_calendar_service()
+        if not service:
+            return "Je n'ai pas accès à ton agenda."
+
+        now = datetime.now()
+        premier_jour = _date_demandee(date_cible_str, now).replace(hour=0, minute=0, second=0, microsecond=0)
+        dernier_jour = premier_jour
+        if date_fin_str:
+            dernier_jour = max(premier_jour, _date_demandee(date_fin_str, now).replace(
+                hour=0, minute=0, second=0, microsecond=0
+            ))
+
+        # Plage en heure locale : minuit du premier jour -> minuit après le dernier
+        debut = premier_jour.timestamp()
+        fin = (dernier_jour + timedelta(days=1)).timestamp()
+        plusieurs_jours = dernier_jour > premier_jour
+
+        events = _miroir(service).entre(debut, fin)
 
         if not events:
             return f"Rien de prévu pour le moment."
@@ -170,17 +209,66 @@ def consulter_agenda_reel(date_cible_str: str) -> str:
         reponse = "Voici le programme : "
         for event in events:
             # Gestion date vs datetime (journée entière vs heure précise)
-            start = event["start"].get("dateTime", event["start"].get("date"))
-
-            if "T" in start:
-                heure = start.split("T")[1][:5]  # Récupère HH:MM
-            else:
+            debut_evt = datetime.fromtimestamp(event["debut"])
+            if event["journee"]:
                 heure = "Toute la journée"
+            else:
+                heure = debut_evt.strftime("%H:%M")
 
-            reponse += f"{event['summary']} à {heure}. "
+            if plusieurs_jours:
+                reponse += f"{debut_evt.strftime('%d/%m')} : {event['titre']} à {heure}. "
+            else:
+                reponse += f"{event['titre']} à {heure}. "
 
         return reponse
 
     except Exception as e:
         print(f"❌ Erreur Lecture Agenda : {e}")
         return "Impossible de lire l'agenda pour l'instant."
+
+
+def prochain_rdv_reel() -> str:
+    """Prochain rendez-vous (hors journées entières), depuis le miroir local."""
+    try:
+        service = get_calendar_service()
+        if not service:
+            return "Je n'ai pas accès à ton agenda."
+
+        event = _miroir(service).prochain()
+        if not event:
+            return "Aucun rendez-vous à venir."
+
+        debut = datetime.fromtimestamp(event["debut"])
+        return f"Prochain rendez-vous : {event['titre']} le {debut.strftime('%d/%m à %H:%M')}."
+
+    except Exception as e:
+        print(f"❌ Erreur Lecture Agenda : {e}")
+        return "Impossible de lire l'agenda pour l'instant."
+
+
+def verifier_disponibilite_reel(debut_str: str, fin_str: str = None) -> str:
+    """Libre ou occupé sur un créneau (1h par défaut), depuis le miroir local."""
+    try:
+        service = get_calendar_service()
+        if not service:
+            return "Je n'ai pas accès à ton agenda."
+
+        try:
+            debut = datetime.fromisoformat(debut_str)
+            fin = datetime.fromisoformat(fin_str) if fin_str else debut + timedelta(hours=1)
+        except ValueError:
+            return "Je n'ai pas compris le créneau demandé."
+
+        occupations = _miroir(service).occupations(debut.timestamp(), fin.timestamp())
+        if not occupations:
+            return f"Tu es libre de {debut.strftime('%H:%M')} à {fin.strftime('%H:%M')} le {debut.strftime('%d/%m')}."
+
+        creneaux = ", ".join(
+            f"{datetime.fromtimestamp(d).strftime('%H:%M')}-{datetime.fromtimestamp(f).strftime('%H:%M')}"
+            for d, f in occupations
+        )
+        return f"Tu es occupé(e) sur ce créneau : {creneaux}."
+
+    except Exception as e:
+        print(f"❌ Erreur Lecture Agenda : {e}")
+        return "Impossible de lire l'agenda pour l'instant."
@@ -0,0 +1,104 @@
+"""
+================================================================================
+@fichier      : src/tools/calendar_reminders.py
+@description  : Rappels proactifs des rendez-vous de l'agenda.
+                Un seul réveil asyncio par événement à venir (N minutes avant),
+                alimenté par le miroir local : un RDV déplacé est replanifié,
+                un RDV supprimé voit son réveil annulé. Aucun polling de l'API.
+================================================================================
+"""
+
+import asyncio
+import time
+
+
+class PlanificateurRappels:
+    """
+    envoyer : coroutine envoyer(evenement) appelée à l'heure du rappel.
+    Toutes les méthodes s'exécutent dans la boucle asyncio, sauf
+    appliquer_depuis_thread() (abonné du miroir, appelé depuis un thread).
+    """
+
+    def __init__(self, loop, envoyer, minutes_avant):
+        self.loop = loop
+        self.envoyer = envoyer
+        self.avance = minutes_avant * 60
+        self._reveils = {}      # id -> [événement, TimerHandle]
+        self._envoyes = set()   # (id, debut) déjà rappelés, purgé une fois le RDV commencé
+
+    # --- Planification ---
+
+    def _a_rappeler(self, evenement, maintenant):
+        """
+        Rappel encore à venir ? Un rappel dont l'heure est passée n'est jamais
+        envoyé en retard (ex: après un redémarrage, il a pu déjà partir).
+        """
+        return not evenement["journee"] and evenement["debut"] - self.avance > maintenant
+
+    def _purger_envoyes(self, maintenant):
+        self._envoyes = {(eid, debut) for eid, debut in self._envoyes if debut > maintenant}
+
+    def charger(self, evenements):
+        """Planifie tous les RDV à venir (démarrage / rechargement)."""
+        self._purger_envoyes(time.time())
+        for e in evenements:
+            self.planifier(e)
+        print(f"🔔 {len(self._reveils)} rappel(s) d'agenda planifié(s).")
+
+    def planifier(self, evenement):
+        eid = evenement["id"]
+        debut = evenement["debut"]
+
+        deja = self._reveils.get(eid)
+        if deja and deja[0]["debut"] == debut:
+            # Même horaire (ex: titre modifié) : on garde le réveil, on met à jour le contenu
+            deja[0] = evenement
+            return
+        self.annuler(eid)
+
+        # Journées entières, rappel déjà dû ou déjà envoyé : rien à faire
+        maintenant = time.time()
+        if not self._a_rappeler(evenement, maintenant) or (eid, debut) in self._envoyes:
+            return
+
+        delai = max(0.0, debut - self.avance - maintenant)
+        handle = self.loop.call_at(self.loop.time() + delai, self._sonner, eid)
+        self._reveils[eid] = [evenement, handle]
+
+    def annuler(self, eid):
+        deja = self._reveils.pop(eid, None)
+        if deja:
+            deja[1].cancel()
+
+    def appliquer(self, changes):
+        """changes = {id: événement ou None si supprimé} (publiés par le miroir)."""
+        self._purger_envoyes(time.time())
+        for eid, evenement in changes.items():
+            if evenement is None:
+                self.annuler(eid)
+            else:
+                self.planifier(evenement)
+
+    def appliquer_depuis_thread(self, changes):
+        """Abonné du miroir : la synchro tourne dans un thread, on repasse dans la boucle."""
+        self.loop.call_soon_threadsafe(self.appliquer, changes)
+
+    # --- Réveil ---
+
+    def _sonner(self, eid):
+        deja = self._reveils.pop(eid, None)
+        if not deja:
+            return
+        evenement = deja[0]
+        self._envoyes.add((eid, evenement["debut"]))
+        asyncio.ensure_future(self._envoyer(evenement), loop=self.loop)
+
+    async def _envoyer(self, evenement):
+        try:
+            await self.envoyer(evenement)
+        except Exception as e:
+            print(f"⚠️ Erreur rappel agenda : {e}")
+
+    def prochains(self, n=5):
+        """Aperçu des prochains rappels [(heure du RDV, titre)] (debug)."""
+        return sorted((e["debut"], e["titre"]) for e, _ in self._reveils.values())[:n]
@@ -0,0 +1,276 @@
+"""
+================================================================================
+@fichier      : src/tools/calendar_store.py
+@description  : Miroir local de l'agenda Google principal.
+                Synchronisé par syncToken (seuls les changements transitent,
+                resynchro complète si Google répond 410), persisté sur disque
+                et indexé par intervalles : plages, disponibilités et
+                "prochain rendez-vous" se calculent sans appel réseau.
+================================================================================
+"""
+
+import bisect
+import os
+import threading
+import time
+from datetime import datetime
+
+from config import ASSETS_DIR
+from .stockage import charger_json, sauver_json_atomique
+
+MIROIR_FILE = os.path.join(ASSETS_DIR, "calendar_mirror.json")
+
+TAILLE_PAGE = 250
+RETENTION_PASSE = 7 * 24 * 3600     # On oublie les événements terminés depuis plus de 7 jours
+DELAI_SYNC_A_LA_DEMANDE = 60        # Une requête de l'agent resynchronise au plus 1x/min
+
+
+def _vers_epoch(moment):
+    """{"dateTime": ...} ou {"date": ...} (journée entière, minuit local) -> epoch."""
+    if "dateTime" in moment:
+        return datetime.fromisoformat(moment["dateTime"].replace("Z", "+00:00")).timestamp()
+    return datetime.fromisoformat(moment["date"]).timestamp()
+
+
+def _compacter(event):
+    """Réduit un événement Google à ce dont on a besoin localement."""
+    return {
+        "id": event["id"],
+        "titre": event.get("summary", "(sans titre)"),
+        "debut": _vers_epoch(event["start"]),
+        "fin": _vers_epoch(event["end"]),
+        "journee": "date" in event["start"],
+    }
+
+
+def _est_gone(erreur):
+    """HttpError 410 : syncToken expiré, il faut repartir de zéro."""
+    return getattr(getattr(erreur, "resp", None), "status", None) == 410
+
+
+class MiroirAgenda:
+    """
+    evenements : {id: {"id", "titre", "debut", "fin", "journee"}} (epochs)
+    Index : liste triée de (debut, id) + durée max, pour les requêtes par plage.
+    """
+
+    def __init__(self, chemin=MIROIR_FILE):
+        self.chemin = chemin
+        self._verrou = threading.Lock()
+        self._verrou_sync = threading.Lock()
+        self._abonnes = []
+
+        data = (charger_json(chemin, {}) or {}) if chemin else {}
+        self.evenements = data.get("evenements", {})
+        self.sync_token = data.get("sync_token")
+        self.dernier_sync = 0.0
+
+        self._index = []
+        self._debuts = []
+        self._duree_max = 0.0
+        self._reindexer()
+
+    # --- Abonnements ---
+
+    def abonner(self, callback):
+        """callback(changes) avec changes = {id: événement ou None si supprimé}."""
+        self._abonnes.append(callback)
+
+    def _publier(self, changes):
+        for callback in list(self._abonnes):
+            try:
+                callback(changes)
+            except Exception as e:
+                print(f"⚠️ Erreur abonné miroir agenda : {e}")
+
+    # --- Synchronisation ---
+
+    def synchroniser(self, session):
+        """Applique les changements depuis le dernier syncToken (ou tout, au premier passage)."""
+        with self._verrou_sync:
+            debut = time.perf_counter()
+            complet = self.sync_token is None
+            try:
+                items, token = self._lister(session, self.sync_token)
+            except Exception as e:
+                if not _est_gone(e):
+                    raise
+                print("🔄 syncToken agenda expiré : resynchronisation complète.")
+                complet = True
+                items, token = self._lister(session, None)
+
+            changes = self._appliquer(items, complet)
+            self.sync_token = token
+            self.dernier_sync = time.time()
+            self._sauver()
+
+            duree = (time.perf_counter() - debut) * 1000
+            if complet or changes:
+                print(
+                    f"📅 Miroir agenda : {len(changes)} changement(s), "
+                    f"{len(self.evenements)} événements, en {duree:.0f} ms."
+                )
+
+        if changes:
+            self._publier(changes)
+        return changes
+
+    def _lister(self, session, sync_token):
+        items = []
+        page_token = None
+        while True:
+            params = {"calendarId": "primary", "singleEvents": True, "maxResults": TAILLE_PAGE}
+            if sync_token:
+                params["syncToken"] = sync_token
+            if page_token:
+                params["pageToken"] = page_token
+
+            page = session.executer(session.events().list(**params))
+            items.extend(page.get("items", []))
+
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return items, page.get("nextSyncToken")
+
+    def _appliquer(self, items, complet):
+        limite = time.time() - RETENTION_PASSE
+        changes = {}
+
+        with self._verrou:
+            if complet:
+                anciens = self.evenements
+                nouveaux = {}
+                for event in items:
+                    if event.get("status") == "cancelled" or "start" not in event:
+                        continue
+                    e = _compacter(event)
+                    if e["fin"] >= limite:
+                        nouveaux[e["id"]] = e
+                for eid in set(anciens) | set(nouveaux):
+                    if anciens.get(eid) != nouveaux.get(eid):
+                        changes[eid] = nouveaux.get(eid)
+                self.evenements = nouveaux
+            else:
+                for event in items:
+                    eid = event["id"]
+                    if event.get("status") == "cancelled" or "start" not in event:
+                        if self.evenements.pop(eid, None) is not None:
+                            changes[eid] = None
+                        continue
+                    e = _compacter(event)
+                    if self.evenements.get(eid) != e:
+                        self.evenements[eid] = e
+                        changes[eid] = e
+
+                # Ménage des événements passés
+                for eid in [eid for eid, e in self.evenements.items() if e["fin"] < limite]:
+                    del self.evenements[eid]
+
+            self._reindexer()
+        return changes
+
+    def integrer(self, event):
+        """Ajoute tout de suite un événement créé par Enola (la synchro confirmera)."""
+        e = _compacter(event)
+        with self._verrou:
+            self.evenements[e["id"]] = e
+            self._reindexer()
+        self._publier({e["id"]: e})
+
+    # --- Requêtes locales ---
+
+    def entre(self, debut, fin):
+        """Événements qui chevauchent [debut, fin[ (epochs), triés par début."""
+        with self._verrou:
+            # Un événement qui chevauche commence au plus tôt duree_max avant `debut`
+            i = bisect.bisect_left(self._debuts, debut - self._duree_max)
+            j = bisect.bisect_left(self._debuts, fin)
+            resultats = []
+            for _, eid in self._index[i:j]:
+                e = self.evenements[eid]
+                if e["fin"] > debut:
+                    resultats.append(dict(e))
+            return resultats
+
+    def est_libre(self, debut, fin):
+        """Aucun rendez-vous horaire sur la plage (les journées entières ne bloquent pas)."""
+        return not self.occupations(debut, fin)
+
+    def occupations(self, debut, fin):
+        """Créneaux occupés fusionnés [(debut, fin)] dans la plage (hors journées entières)."""
+        creneaux = []
+        for e in self.entre(debut, fin):
+            if e["journee"]:
+                continue
+            d, f = max(e["debut"], debut), min(e["fin"], fin)
+            if creneaux and d <= creneaux[-1][1]:
+                creneaux[-1] = (creneaux[-1][0], max(creneaux[-1][1], f))
+            else:
+                creneaux.append((d, f))
+        return creneaux
+
+    def prochain(self, apres=None):
+        """Premier événement (non journée entière) qui commence après `apres`."""
+        apres = time.time() if apres is None else apres
+        with self._verrou:
+            i = bisect.bisect_right(self._debuts, apres)
+            for _, eid in self._index[i:]:
+                e = self.evenements[eid]
+                if not e["journee"]:
+                    return dict(e)
+        return None
+
+    # --- Interne ---
+
+    def _reindexer(self):
+        self._index = sorted((e["debut"], eid) for eid, e in self.evenements.items())
+        self._debuts = [d for d, _ in self._index]
+        self._duree_max = max((e["fin"] - e["debut"] for e in self.evenements.values()), default=0.0)
+
+    def _sauver(self):
+        if not self.chemin:
+            return
+        with self._verrou:
+            data = {"sync_token": self.sync_token, "evenements": dict(self.evenements)}
+        sauver_json_atomique(self.chemin, data)
+
+
+_miroir = None
+_verrou_miroir = threading.Lock()
+
+
+def get_miroir_agenda():
+    """Miroir du processus, chargé depuis le disque au premier appel."""
+    global _miroir
+    if _miroir is None:
+        with _verrou_miroir:
+            if _miroir is None:
+                _miroir = MiroirAgenda()
+    return _miroir
+
+
+def synchroniser_agenda(session=None):
+    """Synchronisation incrémentale (tâche de fond). Retourne les changements."""
+    if session is None:
+        from .calendar_session import get_session_agenda
+        session = get_session_agenda()
+    if not session:
+        return {}
+    try:
+        return get_miroir_agenda().synchroniser(session)
+    except Exception as e:
+        print(f"⚠️ Erreur synchro agenda : {e}")
+        return {}
+
+
+def synchroniser_si_perime(session):
+    """Synchro légère avant une réponse de l'agent, limitée dans le temps."""
+    miroir = get_miroir_agenda()
+    if time.time() - miroir.dernier_sync < DELAI_SYNC_A_LA_DEMANDE:
+        return miroir
+    try:
+        miroir.synchroniser(session)
+    except Exception as e:
+        # Réseau en panne : on répond quand même avec ce qu'on a
+        print(f"⚠️ Erreur synchro agenda : {e}")
+    return miroir
@@ -0,0 +1,139 @@
+"""
+================================================================================
+@fichier      : src/tools/codes_store.py
+@description  : Mémoire des codes cadeaux déjà vus.
+                Index en mémoire (dict id -> date de première apparition) pour
+                un test d'appartenance en temps constant, persistance en
+                journal JSONL où l'on ne fait qu'ajouter des lignes. Seuls
+                les codes jamais vus y sont écrits : le journal ne contient
+                aucun doublon et n'a pas besoin de compactage périodique ;
+                il n'est réécrit que pour réparer une ligne tronquée.
+                Reprend l'ancien codes_memory.json.
+================================================================================
+"""
+
+import json
+import os
+import threading
+import time
+
+from config import ASSETS_DIR
+from .stockage import charger_json
+
+JOURNAL_FILE = os.path.join(ASSETS_DIR, "codes_seen.jsonl")
+
+# Ancien fichier (liste JSON réécrite en entier à chaque code, migré une seule fois)
+MEMORY_FILE = os.path.join(ASSETS_DIR, "codes_memory.json")
+
+
+class MemoireCodes:
+    def __init__(self, chemin=JOURNAL_FILE):
+        self.chemin = chemin
+        self._verrou = threading.Lock()
+        self._vus = {}          # id -> timestamp de première apparition
+        self._abimee = False    # Ligne illisible trouvée au chargement
+
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        if os.path.exists(chemin):
+            self._relire()
+        else:
+            self._migrer_json()
+
+        # Une ligne tronquée doit disparaître avant le prochain ajout (sinon les deux fusionnent)
+        if self._abimee:
+            self.reecrire()
+
+    # --- Consultation ---
+
+    def __contains__(self, id_unique):
+        return id_unique in self._vus
+
+    def __len__(self):
+        return len(self._vus)
+
+    def vu_le(self, id_unique):
+        """Timestamp de première apparition, None si jamais vu."""
+        return self._vus.get(id_unique)
+
+    # --- Écriture ---
+
+    def enregistrer(self, ids):
+        """
+        Ajoute les ids inconnus au journal (une seule écriture).
+        Retourne la liste des ids qui étaient nouveaux, dans l'ordre.
+        """
+        maintenant = time.time()
+        with self._verrou:
+            nouveaux = [i for i in dict.fromkeys(ids) if i not in self._vus]
+            if not nouveaux:
+                return []
+
+            lignes = "".join(
+                json.dumps({"id": i, "vu_a": maintenant}, ensure_ascii=False) + "\n" for i in nouveaux
+            )
+            try:
+                with open(self.chemin, "a", encoding="utf-8") as f:
+                    f.write(lignes)
+                    f.flush()
+                    os.fsync(f.fileno())
+            except Exception as e:
+                # On garde l'info en mémoire : au pire le code sera re-signalé après redémarrage
+                print(f"⚠️ Erreur écriture mémoire codes : {e}")
+
+            for i in nouveaux:
+                self._vus[i] = maintenant
+            return nouveaux
+
+    def reecrire(self):
+        """Réécrit le journal avec une ligne par code (fichier temporaire + rename)."""
+        with self._verrou:
+            temp_path = self.chemin + ".tmp"
+            try:
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    for id_unique, vu_a in self._vus.items():
+                        f.write(json.dumps({"id": id_unique, "vu_a": vu_a}, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.chemin)
+            except Exception as e:
+                print(f"⚠️ Erreur réécriture mémoire codes : {e}")
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+    # --- Chargement ---
+
+    def _relire(self):
+        try:
+            with open(self.chemin, "r", encoding="utf-8") as f:
+                for ligne in f:
+                    try:
+                        entree = json.loads(ligne)
+                        self._vus.setdefault(entree["id"], entree.get("vu_a", 0))
+                    except (ValueError, KeyError, TypeError):
+                        # Ligne tronquée (coupure pendant une écriture) : ignorée, puis effacée
+                        self._abimee = True
+        except Exception as e:
+            print(f"⚠️ Erreur lecture mémoire codes : {e}")
+
+    def _migrer_json(self):
+        anciens = charger_json(MEMORY_FILE, []) or []
+        # Date de première apparition inconnue : on prend la date de migration
+        maintenant = time.time()
+        for id_unique in anciens:
+            self._vus.setdefault(str(id_unique), maintenant)
+        self.reecrire()
+        if self._vus:
+            print(f"📦 Codes : {len(self._vus)} code(s) repris de codes_memory.json.")
+
+
+_memoire = None
+_verrou_memoire = threading.Lock()
+
+
+def get_memoire_codes():
+    global _memoire
+    if _memoire is None:
+        with _verrou_memoire:
+            if _memoire is None:
+                _memoire = MemoireCodes()
+    return _memoire
@@ -5,11 +5,20 @@
                 Permet de contrôler les lumières (allumer, éteindre, couleur,
                 luminosité) en détectant automatiquement s'il s'agit d'un
                 groupe ou d'une ampoule unique.
+                Commandes groupées (plusieurs cibles, groupe 0) et scènes
+                du pont appliquées en une seule requête.
+                Miroir local de l'état des lampes : seuls les attributs qui
+                changent sont envoyés, les questions d'état sont locales.
 ================================================================================
 """
 
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from phue import Bridge
 from config import HUE_BRIDGE_IP, HUE_CONFIG_PATH
+from .texte import normaliser_nom
 
 # ------------------------------------------------------------------------------
 # CONSTANTES (Palette de couleurs)
@@ -26,6 +35,13 @@ COULEURS_HUE = {
     "blanc": [0.3227, 0.3290],
 }
 
+# Cibles qui désignent toute la maison (groupe 0 du pont)
+MOTS_TOUT = {"tout", "toutes", "partout", "maison", "toute la maison", "tout le monde"}
+
+# Rafraîchissement de l'index (noms -> ids) et du miroir d'état en arrière-plan
+INTERVALLE_RAFRAICHISSEMENT = 30   # secondes (un seul GET sur le réseau local)
+DELAI_MIN_REINDEX = 10     # Cible inconnue : on ne relit pas le pont plus souvent
+
 # ------------------------------------------------------------------------------
 # GESTION DE LA CONNEXION
 # ------------------------------------------------------------------------------
@@ -45,88 +61,487 @@ def get_hue_bridge():
         return None
 
 
+# Attributs suivis dans le miroir local
+ATTRIBUTS_MIROIR = ("on", "bri", "xy")
+
+
+def _valeurs_egales(actuelle, voulue):
+    if actuelle is None:
+        return False
+    if isinstance(voulue, (list, tuple)):
+        # Le pont arrondit les coordonnées xy à 4 décimales
+        return len(actuelle) == len(voulue) and all(
+            abs(a - b) < 0.0015 for a, b in zip(actuelle, voulue)
+        )
+    return actuelle == voulue
+
+
+def _verifier_reponse(reponse):
+    """phue renvoie la liste brute du pont : on remonte la première erreur."""
+    for bloc in reponse or []:
+        items = bloc if isinstance(bloc, list) else [bloc]
+        for item in items:
+            if isinstance(item, dict) and "error" in item:
+                return item["error"].get("description", "erreur inconnue")
+    return None
+
+
+class _Limiteur:
+    """Espace les commandes pour rester sous le débit accepté par le pont."""
+
+    def __init__(self, par_seconde):
+        self.intervalle = 1.0 / par_seconde
+        self._prochain = 0.0
+        self._verrou = threading.Lock()
+
+    def attendre(self):
+        with self._verrou:
+            maintenant = time.monotonic()
+            creneau = max(maintenant, self._prochain)
+            self._prochain = creneau + self.intervalle
+        if creneau > maintenant:
+            time.sleep(creneau - maintenant)
+
+
+# Limites du pont Hue : ~10 commandes/s sur /lights, ~1/s sur /groups
+_limiteur_lumieres = _Limiteur(10)
+_limiteur_groupes = _Limiteur(1)
+
+
+class SessionHue:
+    """
+    Connexion persistante au pont + index nom normalisé -> id
+    pour les groupes (pièces) et les lumières.
+    Une commande = un seul PUT vers le pont.
+    """
+
+    def __init__(self, bridge):
+        self.bridge = bridge
+        self._verrou = threading.Lock()
+        self._groupes = {}    # nom normalisé -> (id, nom affiché)
+        self._lumieres = {}
+        self._membres = {}    # id groupe -> {ids lumières}
+        self._toutes = set()  # ids de toutes les lumières
+        self._scenes = {}     # nom normalisé -> [(id scène, id groupe, nom affiché)]
+        self._etats = {}      # id lumière -> {"on", "bri", "xy", "reachable"} (miroir du pont)
+        self._maj = 0.0
+        self._thread = None
+
+    # --- Index ---
+
+    def rafraichir(self):
+        """Relit tout le pont en un seul GET et reconstruit l'index."""
+        api = self.bridge.get_api()
+
+        groupes = {
+            normaliser_nom(g["name"]): (int(gid), g["name"])
+            for gid, g in (api.get("groups") or {}).items()
+        }
+        lumieres = {
+            normaliser_nom(l["name"]): (int(lid), l["name"])
+            for lid, l in (api.get("lights") or {}).items()
+        }
+        membres = {
+            int(gid): {int(lid) for lid in g.get("lights", [])}
+            for gid, g in (api.get("groups") or {}).items()
+        }
+        scenes = {}
+        for sid, sc in (api.get("scenes") or {}).items():
+            groupe = int(sc["group"]) if sc.get("group") else 0
+            scenes.setdefault(normaliser_nom(sc["name"]), []).append((sid, groupe, sc["name"]))
+
+        etats = {
+            int(lid): {k: l.get("state", {}).get(k) for k in ATTRIBUTS_MIROIR}
+            for lid, l in (api.get("lights") or {}).items()
+        }
+
+        with self._verrou:
+            self._groupes = groupes
+            self._lumieres = lumieres
+            self._membres = membres
+            self._toutes = {lid for lid, _ in lumieres.values()}
+            self._scenes = scenes
+            self._etats = etats
+            self._maj = time.time()
+        return api
+
+    def rafraichir_en_fond(self, delai=1.0):
+        """Relecture différée (ex: après une scène dont on ne connaît pas l'effet)."""
+        def _tache():
+            time.sleep(delai)
+            try:
+                self.rafraichir()
+            except Exception as e:
+                print(f"⚠️ Erreur rafraîchissement Hue : {e}")
+
+        threading.Thread(target=_tache, daemon=True).start()
+
+    # --- Miroir d'état ---
+
+    def _ids_lumieres(self, type_cible, cid):
+        if type_cible == "light":
+            return {cid}
+        return set(self._toutes) if cid == 0 else set(self._membres.get(cid, set()))
+
+    def difference(self, type_cible, cid, etat):
+        """
+        Ne garde que les attributs qui changent réellement au moins une lampe.
+        Une lampe absente du miroir est considérée comme inconnue -> on envoie.
+        """
+        with self._verrou:
+            ids = self._ids_lumieres(type_cible, cid)
+            etats = [self._etats.get(lid) for lid in ids]
+
+        a_envoyer = {}
+        for attr, valeur in etat.items():
+            if attr not in ATTRIBUTS_MIROIR:
+                continue
+            if not etats or any(
+                e is None or not _valeurs_egales(e.get(attr), valeur) for e in etats
+            ):
+                a_envoyer[attr] = valeur
+
+        # Attributs sans équivalent dans le miroir (scène...) : toujours envoyés
+        autres = {k: v for k, v in etat.items() if k not in ATTRIBUTS_MIROIR and k != "transitiontime"}
+        a_envoyer.update(autres)
+
+        if a_envoyer and "transitiontime" in etat:
+            a_envoyer["transitiontime"] = etat["transitiontime"]
+        return a_envoyer
+
+    def _appliquer_au_miroir(self, type_cible, cid, etat):
+        with self._verrou:
+            for lid in self._ids_lumieres(type_cible, cid):
+                miroir = self._etats.setdefault(lid, {})
+                for attr in ATTRIBUTS_MIROIR:
+                    if attr in etat:
+                        miroir[attr] = etat[attr]
+
+    def etat_local(self, type_cible, cid):
+        """Résumé depuis le miroir (aucun appel réseau) : (allumées, total, bri moyenne %)."""
+        with self._verrou:
+            etats = [self._etats.get(lid) or {} for lid in self._ids_lumieres(type_cible, cid)]
+
+        allumees = [e for e in etats if e.get("on")]
+        bris = [e["bri"] for e in allumees if e.get("bri") is not None]
+        bri_pct = round(sum(bris) / len(bris) / 2.54) if bris else None
+        return len(allumees), len(etats), bri_pct
+
+    def _boucle(self):
+        while True:
+            time.sleep(INTERVALLE_RAFRAICHISSEMENT)
+            try:
+                self.rafraichir()
+            except Exception as e:
+                print(f"⚠️ Erreur rafraîchissement Hue : {e}")
+
+    def demarrer(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._boucle, name="hue-index", daemon=True)
+            self._thread.start()
+
+    def resoudre(self, cible):
+        """
+        Retourne (type, id, nom) pour une cible, ou None.
+        Groupes prioritaires, correspondance exacte puis partielle.
+        """
+        trouve = self._chercher(normaliser_nom(cible))
+        if trouve or time.time() - self._maj < DELAI_MIN_REINDEX:
+            return trouve
+
+        # Lampe ou pièce ajoutée récemment ?
+        self.rafraichir()
+        return self._chercher(normaliser_nom(cible))
+
+    def _chercher(self, c):
+        if not c:
+            return None
+        with self._verrou:
+            if c in self._groupes:
+                return ("group",) + self._groupes[c]
+            if c in self._lumieres:
+                return ("light",) + self._lumieres[c]
+            for index, type_cible in ((self._groupes, "group"), (self._lumieres, "light")):
+                for nom, (cid, affiche) in index.items():
+                    if c in nom:
+                        return (type_cible, cid, affiche)
+        return None
+
+    def resoudre_scene(self, nom_scene, groupe=None):
+        """(id scène, id groupe, nom) ; si le nom existe dans plusieurs pièces, `groupe` tranche."""
+        candidats = self._scenes.get(normaliser_nom(nom_scene))
+        if not candidats:
+            c = normaliser_nom(nom_scene)
+            candidats = next((v for nom, v in self._scenes.items() if c and c in nom), None)
+        if not candidats:
+            return None
+        if groupe is not None:
+            for candidat in candidats:
+                if candidat[1] == groupe:
+                    return candidat
+        return candidats[0]
+
+    def regrouper(self, cibles_resolues):
+        """
+        Réduit une liste de cibles au plus petit nombre de requêtes :
+        - toutes les lumières couvertes -> groupe 0 (un seul PUT) ;
+        - une lumière déjà couverte par un groupe ciblé est retirée.
+        Retourne (ids groupes, ids lumières).
+        """
+        groupes = {cid for t, cid, _ in cibles_resolues if t == "group"}
+        lumieres = {cid for t, cid, _ in cibles_resolues if t == "light"}
+
+        with self._verrou:
+            couvertes = set()
+            for gid in groupes:
+                couvertes |= self._toutes if gid == 0 else self._membres.get(gid, set())
+            toutes = self._toutes
+
+        if 0 in groupes or (toutes and toutes <= couvertes | lumieres):
+            return {0}, set()
+
+        return groupes, lumieres - couvertes
+
+    # --- Commandes ---
+
+    def envoyer(self, type_cible, cid, etat):
+        """
+        Un seul PUT (ids numériques : phue ne fait aucune recherche par nom),
+        limité aux attributs qui diffèrent du miroir. Retourne None si rien à faire.
+        """
+        a_envoyer = self.difference(type_cible, cid, etat)
+        if not a_envoyer:
+            return None
+
+        if type_cible == "group":
+            _limiteur_groupes.attendre()
+            reponse = self.bridge.set_group(cid, a_envoyer)
+        else:
+            _limiteur_lumieres.attendre()
+            reponse = self.bridge.set_light(cid, a_envoyer)
+
+        if "scene" in a_envoyer:
+            # Effet d'une scène inconnu localement : on relira le pont
+            self.rafraichir_en_fond()
+        elif not _verifier_reponse(reponse):
+            self._appliquer_au_miroir(type_cible, cid, a_envoyer)
+        return reponse
+
+
+_session = None
+_verrou_session = threading.Lock()
+
+
+def get_session_hue():
+    """Session Hue du processus, créée et indexée au premier appel."""
+    global _session
+    if _session is None:
+        with _verrou_session:
+            if _session is None:
+                bridge = get_hue_bridge()
+                if not bridge:
+                    return None
+                session = SessionHue(bridge)
+                try:
+                    session.rafraichir()
+                except Exception as e:
+                    print(f"⚠️ Pont Hue injoignable : {e}")
+                    return None
+                session.demarrer()
+                _session = session
+    return _session
+
+
 # ------------------------------------------------------------------------------
 # FONCTIONS MÉTIER
 # ------------------------------------------------------------------------------
 
 
+def _pourcentage_vers_bri(valeur):
+    # Hue gère la luminosité de 0 à 254
+    # On convertit le % utilisateur (0-100) en byte (0-254)
+    if valeur is None or valeur == "":
+        return 254  # Max par défaut
+    bri = int(int(valeur) * 2.54)
+    # Bornage de sécurité
+    return max(0, min(254, bri))
+
+
 def commander_lumiere_reel(action: str, cible: str, valeur: str = None) -> str:
     """
     Exécute une action sur une lumière ou un groupe Hue.
 
     Args:
-        action (str): "allumer", "eteindre", "couleur", "luminosite"
+        action (str): "allumer", "eteindre", "couleur", "luminosite", "scene", "statut"
         cible (str): Le nom de la lampe ou de la pièce (ex: "Salon", "Cuisine")
-        valeur (str): Paramètre optionnel (ex: "rouge" pour couleur, "50" pour luminosité)
+        valeur (str): Paramètre optionnel (ex: "rouge" pour couleur, "50" pour luminosité,
+                      nom de la scène)
     """
-    bridge = get_hue_bridge()
-    if not bridge:
+    session = get_session_hue()
+    if not session:
         return "Pont Hue injoignable."
 
     try:
-        target_id = None
-        target_type = None
-
-        # 1. Recherche dans les GROUPES (prioritaire)
-        groups = bridge.get_group()
-        for gid, ginfo in groups.items():
-            if cible.lower() in ginfo["name"].lower():
-                target_id = int(gid)
-                target_type = "group"
-                break
-
-        # 2. Si pas trouvé, recherche dans les LUMIÈRES individuelles
-        if not target_id:
-            lights = bridge.get_light_objects("name")
-            for lname in lights:
-                if cible.lower() in lname.lower():
-                    target_id = lname  # Pour phue, l'ID peut être le nom
-                    target_type = "light"
-                    break
-
-        if not target_id:
+        if action == "scene":
+            return _appliquer_scene(session, valeur, cible)
+
+        # 1. Résolution locale (index groupes puis lumières)
+        if normaliser_nom(cible) in MOTS_TOUT:
+            trouve = ("group", 0, "La maison")
+        else:
+            trouve = session.resoudre(cible)
+        if not trouve:
             return f"Lumière ou pièce '{cible}' introuvable."
 
-        # 3. Exécution de l'action
+        target_type, target_id, nom_cible = trouve
+
+        if action == "statut":
+            return _decrire_etat(session, target_type, target_id, nom_cible)
+
+        # 2. Construction de l'état à envoyer
 
         if action == "allumer":
-            if target_type == "group":
-                bridge.set_group(target_id, "on", True)
-            else:
-                bridge.set_light(target_id, "on", True)
+            etat = {"on": True}
 
         elif action == "eteindre":
-            if target_type == "group":
-                bridge.set_group(target_id, "on", False)
-            else:
-                bridge.set_light(target_id, "on", False)
+            etat = {"on": False}
 
         elif action == "couleur":
-            xy = COULEURS_HUE.get(valeur.lower())
-            if xy:
-                if target_type == "group":
-                    bridge.set_group(target_id, "xy", xy)
-                else:
-                    bridge.set_light(target_id, "xy", xy)
-            else:
+            xy = COULEURS_HUE.get((valeur or "").lower())
+            if not xy:
                 return f"Couleur '{valeur}' inconnue."
+            etat = {"xy": xy}
 
         elif action == "luminosite":
-            # Hue gère la luminosité de 0 à 254
-            # On convertit le % utilisateur (0-100) en byte (0-254)
-            if valeur:
-                bri = int(int(valeur) * 2.54)
-                # Bornage de sécurité
-                bri = max(0, min(254, bri))
-            else:
-                bri = 254  # Max par défaut
-
-            if target_type == "group":
-                bridge.set_group(target_id, "bri", bri)
-            else:
-                bridge.set_light(target_id, "bri", bri)
+            etat = {"bri": _pourcentage_vers_bri(valeur)}
+
+        else:
+            return f"Action '{action}' inconnue."
 
+        # 3. Au plus un PUT vers le pont (rien si l'état est déjà le bon)
+        reponse = session.envoyer(target_type, target_id, etat)
+        if reponse is None:
+            return "C'est déjà le cas."
+        erreur = _verifier_reponse(reponse)
+        if erreur:
+            return f"Erreur Hue: {erreur}"
         return "Fait."
 
     except Exception as e:
         return f"Erreur Hue: {e}"
+
+
+def _decrire_etat(session, type_cible, cid, nom):
+    """Répond depuis le miroir local, sans interroger le pont."""
+    allumees, total, bri_pct = session.etat_local(type_cible, cid)
+    if total == 0:
+        return f"{nom} : état inconnu."
+    if allumees == 0:
+        return f"{nom} : éteint."
+
+    luminosite = f", {bri_pct}%" if bri_pct is not None else ""
+    if type_cible == "light":
+        return f"{nom} : allumée{luminosite}."
+    return f"{nom} : allumé ({allumees}/{total} lampes{luminosite})."
+
+
+def _appliquer_scene(session, nom_scene, cible=None):
+    """Rappelle une scène du pont en une seule requête."""
+    if not nom_scene:
+        return "Quelle scène ?"
+
+    groupe = None
+    if cible:
+        trouve = session.resoudre(cible)
+        if trouve and trouve[0] == "group":
+            groupe = trouve[1]
+
+    scene = session.resoudre_scene(nom_scene, groupe)
+    if not scene:
+        return f"Scène '{nom_scene}' introuvable."
+
+    scene_id, groupe_scene, nom = scene
+    erreur = _verifier_reponse(session.envoyer("group", groupe_scene, {"scene": scene_id}))
+    if erreur:
+        return f"Erreur Hue: {erreur}"
+    return f"Scène '{nom}' appliquée."
+
+
+def commander_lumieres_multiples(
+    cibles: list,
+    allumer: bool = None,
+    luminosite: int = None,
+    couleur: str = None,
+    transition: float = None,
+) -> str:
+    """
+    Applique plusieurs attributs à plusieurs cibles en une fois.
+
+    Args:
+        cibles (list): Pièces / lampes, ou "tout" pour toute la maison
+        allumer (bool): True / False (None = inchangé)
+        luminosite (int): 0-100 %
+        couleur (str): Nom de couleur (voir COULEURS_HUE)
+        transition (float): Durée de la transition en secondes
+    """
+    session = get_session_hue()
+    if not session:
+        return "Pont Hue injoignable."
+
+    # 1. État commun à envoyer
+    etat = {}
+    if allumer is not None:
+        etat["on"] = bool(allumer)
+    if luminosite is not None:
+        etat["bri"] = _pourcentage_vers_bri(luminosite)
+    if couleur:
+        xy = COULEURS_HUE.get(couleur.lower())
+        if not xy:
+            return f"Couleur '{couleur}' inconnue."
+        etat["xy"] = xy
+    if not etat:
+        return "Rien à changer."
+    if allumer is None and ("bri" in etat or "xy" in etat):
+        # Le pont refuse bri/xy sur une lampe éteinte
+        etat["on"] = True
+    if transition is not None:
+        # Le pont compte en dixièmes de seconde
+        etat["transitiontime"] = max(0, int(round(float(transition) * 10)))
+
+    # 2. Résolution locale de toutes les cibles
+    resolues, introuvables = [], []
+    for cible in cibles or []:
+        if normaliser_nom(cible) in MOTS_TOUT:
+            resolues.append(("group", 0, "Tout"))
+            continue
+        trouve = session.resoudre(cible)
+        if trouve:
+            resolues.append(trouve)
+        else:
+            introuvables.append(cible)
+
+    if not resolues:
+        return f"Aucune cible trouvée ({', '.join(introuvables) or 'vide'})."
+
+    # 3. Le moins de requêtes possible, lumières isolées en parallèle
+    groupes, lumieres = session.regrouper(resolues)
+    envois = [("group", gid) for gid in sorted(groupes)] + [("light", lid) for lid in sorted(lumieres)]
+
+    def _envoyer(envoi):
+        try:
+            reponse = session.envoyer(envoi[0], envoi[1], dict(etat))
+            return envoi, reponse is not None, _verifier_reponse(reponse)
+        except Exception as e:
+            return envoi, True, str(e)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        resultats = list(pool.map(_envoyer, envois))
+
+    erreurs = [f"{t} {cid}: {err}" for (t, cid), _, err in resultats if err]
+    nb_envoyees = sum(1 for _, envoye, _ in resultats if envoye)
+    reponse = f"Fait ({nb_envoyees} requête(s))." if nb_envoyees else "C'est déjà le cas."
+    if erreurs:
+        reponse = f"Partiellement fait. Erreurs : {'; '.join(erreurs)}."
+    if introuvables:
+        reponse += f" Introuvable : {', '.join(introuvables)}."
+    return reponse
@@ -8,12 +8,18 @@
 # --- CORRECTION IMPORT ---
 from langchain_core.tools import StructuredTool
 from pydantic import BaseModel, Field
-from typing import Optional, Literal
+from typing import Optional, Literal, List
 
 # Imports des fonctions réelles
 from .spotify import commander_spotify_reel
-from .hue import commander_lumiere_reel
-from .calendar import ajouter_agenda_reel, consulter_agenda_reel
+from .hue import commander_lumiere_reel, commander_lumieres_multiples
+from .calendar import (
+    ajouter_agenda_reel,
+    ajouter_agenda_multiple_reel,
+    consulter_agenda_reel,
+    prochain_rdv_reel,
+    verifier_disponibilite_reel,
+)
 from .meteo import obtenir_meteo_reel
 from .system import controle_media_reel, creer_alarme_reel, get_recap_alarmes
 from .wiz import commander_prise_reel
@@ -22,28 +28,46 @@ from .anilist import tool_recherche_anime, tool_ajouter_anime_confirme, tool_ger
 # --- SCHÉMAS D'ENTRÉE (Pydantic) ---
 
 class SpotifyInput(BaseModel):
-    action: Literal["play", "pause", "next", "previous"] = Field(description="Action à effectuer")
-    recherche: Optional[str] = Field(default=None, description="Titre, artiste ou 'Titres Likés'")
+    action: Literal["play", "pause", "next", "previous", "statut", "alias"] = Field(description="Action à effectuer ('statut' = ce qui joue, 'alias' = nommer un appareil)")
+    recherche: Optional[str] = Field(default=None, description="Titre, artiste ou 'Titres Likés' (pour 'alias' : le surnom à donner)")
     appareil: Optional[str] = Field(default=None, description="Nom de l'appareil cible")
     position: Optional[int] = Field(default=None, description="Numéro de piste (si playlist)")
 
 class HueInput(BaseModel):
-    action: Literal["allumer", "eteindre", "couleur", "luminosite"] = Field(description="Action lumière")
+    action: Literal["allumer", "eteindre", "couleur", "luminosite", "scene", "statut"] = Field(description="Action lumière ('statut' = est-ce allumé ?)")
     cible: str = Field(description="Nom de la lampe ou pièce (ex: Salon)")
-    valeur: Optional[str] = Field(default=None, description="Couleur (rouge, bleu...) ou luminosité (0-100)")
+    valeur: Optional[str] = Field(default=None, description="Couleur (rouge, bleu...), luminosité (0-100) ou nom de scène")
+
+class HueMultiInput(BaseModel):
+    cibles: List[str] = Field(description="Pièces ou lampes (ex: ['Salon', 'Cuisine']), ou ['tout']")
+    allumer: Optional[bool] = Field(default=None, description="True pour allumer, False pour éteindre")
+    luminosite: Optional[int] = Field(default=None, description="Luminosité 0-100")
+    couleur: Optional[str] = Field(default=None, description="Couleur (rouge, bleu...)")
+    transition: Optional[float] = Field(default=None, description="Durée de transition en secondes")
 
 class WizInput(BaseModel):
-    action: Literal["allumer", "eteindre", "statut"] = Field(description="Action prise connectée")
+    action: Literal["allumer", "eteindre", "statut", "lister", "decouvrir", "renommer"] = Field(description="Action appareil WiZ")
+    appareil: Optional[str] = Field(default="PC", description="Nom de la prise / ampoule WiZ")
+    nouveau_nom: Optional[str] = Field(default=None, description="Nouveau nom (action 'renommer')")
 
 class AgendaAjoutInput(BaseModel):
     titre: str = Field(description="Titre de l'événement")
     date_str: str = Field(description="Date ISO (YYYY-MM-DDTHH:MM:SS)")
 
+class AgendaLotInput(BaseModel):
+    evenements: List[AgendaAjoutInput] = Field(description="Événements à ajouter (titre + date ISO chacun)")
+
 class AgendaConsultInput(BaseModel):
     date_cible_str: str = Field(description="Date cible ISO ou 'aujourd'hui'")
+    date_fin_str: Optional[str] = Field(default=None, description="Dernier jour ISO inclus pour une plage (ex: toute la semaine)")
+
+class AgendaDispoInput(BaseModel):
+    debut_str: str = Field(description="Début du créneau ISO (YYYY-MM-DDTHH:MM:SS)")
+    fin_str: Optional[str] = Field(default=None, description="Fin du créneau ISO (1h par défaut)")
 
 class MeteoInput(BaseModel):
     ville: str = Field(description="Nom de la ville")
+    moment: Optional[str] = Field(default=None, description="Date ISO (YYYY-MM-DD) ou date+heure ISO (YYYY-MM-DDTHH:MM) pour une prévision, vide = maintenant")
 
 class MediaInput(BaseModel):
     action: Literal["volume_monter", "volume_baisser", "mute"] = Field(description="Action volume système")
@@ -71,19 +95,25 @@ def charger_tools_langchain():
         StructuredTool.from_function(
             func=commander_spotify_reel,
             name="commander_spotify",
-            description="Pilote la musique Spotify.",
+            description="Pilote la musique Spotify ou dit ce qui joue.",
             args_schema=SpotifyInput
         ),
         StructuredTool.from_function(
             func=commander_lumiere_reel,
             name="commander_lumiere",
-            description="Pilote les lumières Hue.",
+            description="Pilote les lumières Hue (une cible, ou une scène).",
             args_schema=HueInput
         ),
+        StructuredTool.from_function(
+            func=commander_lumieres_multiples,
+            name="commander_lumieres_multiples",
+            description="Pilote plusieurs pièces/lampes Hue d'un coup (ou toute la maison).",
+            args_schema=HueMultiInput
+        ),
         StructuredTool.from_function(
             func=commander_prise_reel,
             name="commander_prise",
-            description="Pilote la prise connectée WiZ (PC).",
+            description="Pilote les prises et ampoules WiZ (par nom, 'PC' par défaut).",
             args_schema=WizInput
         ),
         StructuredTool.from_function(
@@ -92,16 +122,33 @@ def charger_tools_langchain():
             description="Ajoute un RDV à l'agenda.",
             args_schema=AgendaAjoutInput
         ),
+        StructuredTool.from_function(
+            func=ajouter_agenda_multiple_reel,
+            name="ajouter_agenda_multiple",
+            description="Ajoute plusieurs RDV d'un coup (ex: récurrence sur plusieurs jours).",
+            args_schema=AgendaLotInput
+        ),
         StructuredTool.from_function(
             func=consulter_agenda_reel,
             name="consulter_agenda",
-            description="Lit l'agenda.",
+            description="Lit l'agenda (un jour ou une plage de jours).",
             args_schema=AgendaConsultInput
         ),
+        StructuredTool.from_function(
+            func=verifier_disponibilite_reel,
+            name="verifier_disponibilite",
+            description="Dit si l'utilisateur est libre sur un créneau.",
+            args_schema=AgendaDispoInput
+        ),
+        StructuredTool.from_function(
+            func=prochain_rdv_reel,
+            name="prochain_rdv",
+            description="Donne le prochain rendez-vous de l'agenda."
+        ),
         StructuredTool.from_function(
             func=obtenir_meteo_reel,
             name="obtenir_meteo",
-            description="Donne la météo.",
+            description="Donne la météo actuelle ou prévue (température, pluie, vent) sur 7 jours.",
             args_schema=MeteoInput
         ),
         StructuredTool.from_function(
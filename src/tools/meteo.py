@@ -4,37 +4,299 @@
 @description  : Récupération des données météorologiques.
                 Utilise l'API Open-Meteo (gratuite, sans clé) pour obtenir
                 les coordonnées GPS d'une ville puis sa température actuelle.
+                Les coordonnées sont gardées en cache sur disque et les appels
+                passent par une session HTTP poolée avec timeouts.
+                Prévisions horaires / journalières préchargées en tâche de
+                fond pour répondre localement ("pluie à 18h ?", "demain ?").
 ================================================================================
 """
 
+import calendar
+import math
+import os
+import threading
+import time
+from array import array
+from datetime import date, datetime
+
 import requests
-from config import MA_VILLE
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import ASSETS_DIR, MA_VILLE
+from .stockage import charger_json, sauver_json_atomique
+from .texte import normaliser_nom
+
+URL_GEOCODAGE = "https://geocoding-api.open-meteo.com/v1/search"
+URL_PREVISIONS = "https://api.open-meteo.com/v1/forecast"
+
+GEOCACHE_FILE = os.path.join(ASSETS_DIR, "meteo_geocache.json")
+
+TIMEOUT = (3, 5)             # (connexion, lecture) en secondes
+TTL_METEO_ACTUELLE = 600     # Open-Meteo ne rafraîchit "current" que toutes les 15 min
+
+
+def _creer_session():
+    retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(429, 500, 502, 503, 504))
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_maxsize=4, max_retries=retry))
+    return session
+
+
+_session = _creer_session()
+_verrou = threading.Lock()
+_geocache = charger_json(GEOCACHE_FILE, {}) or {}   # nom normalisé -> {"lat", "lon", "nom"}
+_meteo_actuelle = {}                                 # (lat, lon) -> (horodatage, température)
+
+
+def geocoder(ville: str):
+    """
+    Coordonnées d'une ville : cache disque (insensible casse/accents),
+    sinon un appel au géocodage d'Open-Meteo. None si ville inconnue.
+    """
+    cle = normaliser_nom(ville)
+    if not cle:
+        return None
+
+    with _verrou:
+        if cle in _geocache:
+            return _geocache[cle]
+
+    res = _session.get(
+        URL_GEOCODAGE,
+        params={"name": ville, "count": 1, "language": "fr", "format": "json"},
+        timeout=TIMEOUT,
+    ).json()
+
+    if not res.get("results"):
+        return None
+
+    r = res["results"][0]
+    coords = {"lat": r["latitude"], "lon": r["longitude"], "nom": r.get("name", ville)}
+
+    with _verrou:
+        _geocache[cle] = coords
+        copie = dict(_geocache)
+    sauver_json_atomique(GEOCACHE_FILE, copie, indent=4)
+    return coords
+
+
+def prechauffer_meteo():
+    """À appeler au démarrage : résout la ville par défaut une fois pour toutes."""
+    try:
+        if geocoder(MA_VILLE):
+            print(f"🌤️ Coordonnées de {MA_VILLE} en cache.")
+    except Exception as e:
+        print(f"⚠️ Géocodage de {MA_VILLE} impossible : {e}")
+
+
+def _temperature_actuelle(lat, lon):
+    cle = (lat, lon)
+    with _verrou:
+        en_cache = _meteo_actuelle.get(cle)
+    if en_cache and time.time() - en_cache[0] < TTL_METEO_ACTUELLE:
+        return en_cache[1]
+
+    weather = _session.get(
+        URL_PREVISIONS,
+        params={"latitude": lat, "longitude": lon, "current": "temperature_2m"},
+        timeout=TIMEOUT,
+    ).json()
+    temp = weather["current"]["temperature_2m"]
+
+    with _verrou:
+        _meteo_actuelle[cle] = (time.time(), temp)
+    return temp
+
+
+# ------------------------------------------------------------------------------
+# PRÉVISIONS PRÉCHARGÉES (horaires + journalières)
+# ------------------------------------------------------------------------------
+
+VARIABLES_HORAIRES = ("temperature_2m", "precipitation", "precipitation_probability", "wind_speed_10m")
+VARIABLES_JOURNALIERES = ("temperature_2m_min", "temperature_2m_max", "precipitation_sum", "wind_speed_10m_max")
+JOURS_PREVISION = 7
+RETENTION_VILLE = 3 * 24 * 3600   # Une ville demandée reste préchargée 3 jours
+TTL_PREVISION = 2 * 3600          # Au-delà, on considère la prévision périmée
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _tableau(valeurs):
+    """Liste JSON -> array compact de floats (None -> NaN)."""
+    return array("f", (math.nan if v is None else v for v in valeurs))
+
 
+class Prevision:
+    """Prévision d'une ville stockée en tableaux compacts, indexés par l'heure / le jour."""
 
-def obtenir_meteo_reel(ville: str) -> str:
+    __slots__ = ("debut", "decalage", "horaires", "jour0", "journalieres", "recue_a")
+
+    def __init__(self, data):
+        hourly = data["hourly"]
+        daily = data["daily"]
+        decalage = data.get("utc_offset_seconds", 0)
+
+        self.decalage = decalage        # Décalage UTC de la ville (secondes)
+        self.debut = hourly["time"][0]  # epoch de la première heure
+        self.horaires = {v: _tableau(hourly.get(v, [])) for v in VARIABLES_HORAIRES}
+        # Les jours sont repérés par leur ordinal (date locale de la ville)
+        self.jour0 = _EPOCH_ORDINAL + (daily["time"][0] + decalage) // 86400
+        self.journalieres = {v: _tableau(daily.get(v, [])) for v in VARIABLES_JOURNALIERES}
+        self.recue_a = time.time()
+
+    def a_l_heure(self, horodatage):
+        """Valeurs horaires à l'instant donné (epoch), ou None hors horizon."""
+        i = int((horodatage - self.debut) // 3600)
+        t = self.horaires["temperature_2m"]
+        if i < 0 or i >= len(t):
+            return None
+        return {v: tab[i] for v, tab in self.horaires.items() if i < len(tab)}
+
+    def horodatage_local(self, instant):
+        """datetime sans fuseau = heure locale de la ville -> epoch."""
+        if instant.tzinfo is not None:
+            return instant.timestamp()
+        return calendar.timegm(instant.timetuple()) - self.decalage
+
+    def au_jour(self, jour):
+        i = jour.toordinal() - self.jour0
+        t = self.journalieres["temperature_2m_max"]
+        if i < 0 or i >= len(t):
+            return None
+        return {v: tab[i] for v, tab in self.journalieres.items() if i < len(tab)}
+
+
+_previsions = {}        # nom normalisé -> Prevision
+_villes_recentes = {}   # nom normalisé -> dernier accès (epoch)
+
+
+def _telecharger_previsions(cles):
+    """Un seul appel Open-Meteo pour plusieurs villes (coordonnées multiples)."""
+    coords = [_geocache[c] for c in cles]
+    data = _session.get(
+        URL_PREVISIONS,
+        params={
+            "latitude": ",".join(str(c["lat"]) for c in coords),
+            "longitude": ",".join(str(c["lon"]) for c in coords),
+            "hourly": ",".join(VARIABLES_HORAIRES),
+            "daily": ",".join(VARIABLES_JOURNALIERES),
+            "timezone": "auto",
+            "timeformat": "unixtime",
+            "forecast_days": JOURS_PREVISION,
+        },
+        timeout=TIMEOUT,
+    ).json()
+
+    # Une seule ville -> objet, plusieurs -> liste
+    if isinstance(data, dict):
+        data = [data]
+
+    with _verrou:
+        for cle, d in zip(cles, data):
+            _previsions[cle] = Prevision(d)
+
+
+def rafraichir_previsions():
+    """
+    Tâche de fond : recharge la ville par défaut + les villes demandées récemment.
+    Lancée juste après les mises à jour horaires d'Open-Meteo.
+    """
+    maintenant = time.time()
+    try:
+        geocoder(MA_VILLE)
+    except Exception as e:
+        print(f"⚠️ Géocodage de {MA_VILLE} impossible : {e}")
+
+    with _verrou:
+        for cle, vu in list(_villes_recentes.items()):
+            if maintenant - vu > RETENTION_VILLE:
+                del _villes_recentes[cle]
+                _previsions.pop(cle, None)
+        cles = {c for c in _villes_recentes if c in _geocache}
+        defaut = normaliser_nom(MA_VILLE)
+        if defaut in _geocache:
+            cles.add(defaut)
+
+    if not cles:
+        return
+    try:
+        _telecharger_previsions(sorted(cles))
+        print(f"🌦️ Prévisions rechargées ({len(cles)} ville(s)).")
+    except Exception as e:
+        print(f"⚠️ Erreur rechargement prévisions : {e}")
+
+
+def _prevision(ville):
+    """Prévision locale ; téléchargée à la demande si la ville n'est pas encore préchargée."""
+    cle = normaliser_nom(ville)
+    with _verrou:
+        _villes_recentes[cle] = time.time()
+        prevision = _previsions.get(cle)
+
+    if prevision is None or time.time() - prevision.recue_a > TTL_PREVISION:
+        _telecharger_previsions([cle])
+        with _verrou:
+            prevision = _previsions.get(cle)
+    return prevision
+
+
+def _fmt(valeur, unite, decimales=1):
+    if valeur is None or math.isnan(valeur):
+        return "?"
+    return f"{valeur:.{decimales}f}{unite}"
+
+
+def _repondre_prevision(ville, moment):
+    prevision = _prevision(ville)
+
+    # "2025-03-12" -> journée, "2025-03-12T18:00" -> heure précise
+    if "T" not in moment and " " not in moment.strip():
+        jour = date.fromisoformat(moment)
+        v = prevision.au_jour(jour)
+        if v is None:
+            return f"Pas de prévision pour le {jour.strftime('%d/%m')} (horizon {JOURS_PREVISION} jours)."
+        return (
+            f"Le {jour.strftime('%d/%m')} à {ville} : "
+            f"{_fmt(v['temperature_2m_min'], '°C')} à {_fmt(v['temperature_2m_max'], '°C')}, "
+            f"pluie {_fmt(v['precipitation_sum'], ' mm')}, "
+            f"vent max {_fmt(v['wind_speed_10m_max'], ' km/h', 0)}."
+        )
+
+    instant = datetime.fromisoformat(moment)
+    v = prevision.a_l_heure(prevision.horodatage_local(instant))
+    if v is None:
+        return f"Pas de prévision pour le {instant.strftime('%d/%m à %Hh')} (horizon {JOURS_PREVISION} jours)."
+    return (
+        f"Le {instant.strftime('%d/%m à %Hh')} à {ville} : {_fmt(v['temperature_2m'], '°C')}, "
+        f"pluie {_fmt(v['precipitation'], ' mm')} ({_fmt(v['precipitation_probability'], '%', 0)}), "
+        f"vent {_fmt(v['wind_speed_10m'], ' km/h', 0)}."
+    )
+
+
+def obtenir_meteo_reel(ville: str, moment: str = None) -> str:
     """
     Récupère la température actuelle pour une ville donnée via Open-Meteo.
     Utilise la ville par défaut définie dans la config si aucune ville n'est fournie.
+    Avec `moment` (date ISO ou date+heure ISO), répond depuis les prévisions préchargées.
     """
     if not ville:
         ville = MA_VILLE
 
     try:
-        # 1. Étape de Géocodage : Trouver Latitude/Longitude depuis le nom
-        url_geo = f"https://geocoding-api.open-meteo.com/v1/search?name={ville}&count=1&language=fr&format=json"
-        res = requests.get(url_geo).json()
-
-        if not res.get("results"):
+        # 1. Étape de Géocodage : cache local, sinon Open-Meteo
+        coords = geocoder(ville)
+        if not coords:
             return "Ville inconnue."
 
-        lat = res["results"][0]["latitude"]
-        lon = res["results"][0]["longitude"]
-
-        # 2. Étape Météo : Récupérer la température avec les coordonnées
-        url_weather = f"https://api.open-meteo.com/v1/forecast?latitude={lat}&longitude={lon}&current=temperature_2m"
-        weather = requests.get(url_weather).json()
+        if moment:
+            try:
+                return _repondre_prevision(ville, moment)
+            except ValueError:
+                return "Je n'ai pas compris la date demandée."
 
-        temp = weather["current"]["temperature_2m"]
+        # 2. Étape Météo : température (cache court, sinon un seul appel)
+        temp = _temperature_actuelle(coords["lat"], coords["lon"])
 
         return f"Il fait {temp}°C à {ville}."
 
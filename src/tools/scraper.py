@@ -1,109 +1,257 @@
+"""
+================================================================================
+@fichier      : src/tools/scraper.py
+@description  : Veille des codes cadeaux (Arknights: Endfield, Strinova...).
+                Registre déclaratif des sources, téléchargements parallèles en
+                GET conditionnel, parsing restreint aux balises utiles (lxml +
+                SoupStrainer). `python -m tools.scraper` lance un benchmark.
+================================================================================
+"""
 import os
-import json
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import ASSETS_DIR
+from .codes_store import get_memoire_codes
+from .stockage import charger_json, sauver_json_atomique
 
 # --- Configuration ---
 URL_ARKNIGHTS = "https://endfield.gg/arknights-endfield-codes/"
 URL_STRINOVA = "https://www.pcgamesn.com/strinova/codes"
 
-# Fichier mémoire
-MEMORY_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../assets/codes_memory.json"))
+# Validateurs HTTP + empreinte des pages déjà parsées
+PAGES_CACHE_FILE = os.path.join(ASSETS_DIR, "scraper_pages.json")
 
-def _charger_memoire():
-    """Charge le JSON (liste de strings)."""
-    if not os.path.exists(MEMORY_FILE):
-        return []
-    try:
-        with open(MEMORY_FILE, "r") as f:
-            content = f.read().strip()
-            return json.loads(content) if content else []
-    except Exception as e:
-        print(f"⚠️ Erreur lecture mémoire : {e}")
-        return []
+# --- Téléchargement (session poolée + GET conditionnel) ---
 
-def _sauvegarder_memoire(codes_connus):
-    try:
-        os.makedirs(os.path.dirname(MEMORY_FILE), exist_ok=True)
-        with open(MEMORY_FILE, "w") as f:
-            json.dump(codes_connus, f, indent=4)
-    except Exception as e:
-        print(f"⚠️ Erreur sauvegarde mémoire : {e}")
+def _creer_session():
+    retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+    session = requests.Session()
+    session.headers.update({'User-Agent': 'Mozilla/5.0'})
+    session.mount("https://", HTTPAdapter(pool_maxsize=4, max_retries=retry))
+    return session
+
+_session = _creer_session()
+_verrou_cache = threading.Lock()
+# url -> {"etag", "last_modified", "hash", "codes"} : si la page n'a pas changé, on ne re-parse pas
+_cache_pages = charger_json(PAGES_CACHE_FILE, {}) or {}
+_stats = {}   # source -> dernières mesures (fetch/parse en ms, statut)
 
-def scrape_arknights():
-    """Scraper spécifique pour Arknights Endfield (Tableaux)"""
+def _scraper(source, url, parser):
+    """
+    Télécharge la page (If-None-Match / If-Modified-Since) et ne la parse que
+    si elle a changé (304 ou contenu identique -> codes déjà connus).
+    """
+    with _verrou_cache:
+        connu = dict(_cache_pages.get(url, {}))
+
+    headers = {}
+    if connu.get("etag"):
+        headers["If-None-Match"] = connu["etag"]
+    if connu.get("last_modified"):
+        headers["If-Modified-Since"] = connu["last_modified"]
+
+    mesure = {"fetch_ms": 0.0, "parse_ms": 0.0, "statut": "erreur"}
+    _stats[source] = mesure
     codes = []
     try:
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(URL_ARKNIGHTS, headers=headers, timeout=10)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            for row in soup.find_all('tr'):
-                cols = row.find_all('td')
-                if cols:
-                    raw_text = cols[0].get_text(" ", strip=True)
-                    potential_code = raw_text.split(" ")[0].replace(":", "").strip()
-                    if potential_code.isupper() and len(potential_code) > 3 and "CODE" not in potential_code:
-                        codes.append(potential_code)
+        debut = time.perf_counter()
+        response = _session.get(url, headers=headers, timeout=10)
+        mesure["fetch_ms"] = round((time.perf_counter() - debut) * 1000, 1)
+
+        if response.status_code == 304 and "codes" in connu:
+            mesure["statut"] = "304"
+            return connu["codes"]
+        if response.status_code != 200:
+            mesure["statut"] = str(response.status_code)
+            return []
+
+        empreinte = hashlib.sha256(response.content).hexdigest()
+        if empreinte == connu.get("hash") and "codes" in connu:
+            mesure["statut"] = "inchangé"
+            codes = connu["codes"]
+        else:
+            debut = time.perf_counter()
+            codes = list(set(parser(response.text)))
+            mesure["parse_ms"] = round((time.perf_counter() - debut) * 1000, 1)
+            mesure["statut"] = "200"
+
+        with _verrou_cache:
+            _cache_pages[url] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "hash": empreinte,
+                "codes": codes,
+            }
     except Exception as e:
-        print(f"⚠️ Erreur Arknights : {e}")
-    return list(set(codes))
+        print(f"⚠️ Erreur {source} : {e}")
+    return codes
+
+def obtenir_stats_scrapers():
+    """Dernières mesures par source : {source: {fetch_ms, parse_ms, statut}}."""
+    return {source: dict(m) for source, m in _stats.items()}
+
+# --- Sources de codes (registre déclaratif) ---
+# Ajouter un jeu = ajouter une entrée ici.
+#   balises    : seules ces balises (et leur contenu) sont construites par le parseur
+#   selecteur  : sélecteur CSS des éléments candidats dans ce sous-arbre
+#   cible      : (optionnel) on ne garde que le premier descendant correspondant
+#   separateur : séparateur passé à get_text() entre les morceaux de texte
+#   regex      : extraction du code dans le texte de l'élément (groupe 1)
+#   majuscules : le code doit être en majuscules (str.isupper)
+#   exclure    : mots qui disqualifient un candidat
+SOURCES_CODES = [
+    {
+        "cle": "ARKNIGHTS",
+        "jeu": "Arknights: Endfield",
+        "url": URL_ARKNIGHTS,
+        "balises": ("tr",),
+        "selecteur": "tr",
+        "cible": "td",              # Premier <td> de chaque ligne
+        "separateur": " ",
+        "regex": r"^([^\s:]{4,})",  # Premier mot, sans le ":" final
+        "majuscules": True,
+        "exclure": ("CODE",),
+        "couleur": 0xE67E22,  # Orange
+    },
+    {
+        "cle": "STRINOVA",
+        "jeu": "Strinova",
+        "url": URL_STRINOVA,
+        "balises": ("li",),
+        "selecteur": "li",
+        "cible": "strong",          # Premier <strong> de chaque puce
+        "separateur": "",
+        "regex": r"^(\S{4,})$",      # Un seul mot (minuscules acceptées)
+        "majuscules": False,
+        "exclure": ("Code", "Reward"),
+        "couleur": 0x3498DB,  # Bleu
+    },
+]
+
+# lxml (C) si disponible, sinon le parseur pur Python
+try:
+    import lxml  # noqa: F401
+    PARSEUR = "lxml"
+except ImportError:
+    PARSEUR = "html.parser"
 
-def scrape_strinova():
-    """Scraper spécifique pour Strinova (Listes à puces PCGamesN)"""
+_regex_compilees = {}
+
+def extraire_codes(source, html):
+    """Parse uniquement les sous-arbres utiles de la page et applique la regex de la source."""
+    regex = _regex_compilees.get(source["cle"])
+    if regex is None:
+        regex = _regex_compilees[source["cle"]] = re.compile(source["regex"])
+
+    soup = BeautifulSoup(html, PARSEUR, parse_only=SoupStrainer(list(source["balises"])))
     codes = []
-    try:
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(URL_STRINOVA, headers=headers, timeout=10)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # PCGamesN met souvent les codes en gras (strong) dans des listes (li)
-            # On cherche tous les <li> qui contiennent un <strong>
-            for li in soup.find_all('li'):
-                strong = li.find('strong')
-                if strong:
-                    text = strong.get_text(strip=True)
-                    # Filtres Strinova (accepte Minuscules/Majuscules, pas d'espaces)
-                    if (len(text) > 3 
-                        and " " not in text 
-                        and "Code" not in text 
-                        and "Reward" not in text):
-                        codes.append(text)
-    except Exception as e:
-        print(f"⚠️ Erreur Strinova : {e}")
-    return list(set(codes))
+    for element in soup.select(source["selecteur"]):
+        if source.get("cible"):
+            element = element.select_one(source["cible"])
+            if element is None:
+                continue
+        m = regex.search(element.get_text(source.get("separateur", ""), strip=True))
+        if not m:
+            continue
+        code = m.group(1)
+        if source.get("majuscules") and not code.isupper():
+            continue
+        if any(mot in code for mot in source["exclure"]):
+            continue
+        codes.append(code)
+    return codes
+
+def scraper_source(source):
+    """Codes actuellement publiés pour une source du registre."""
+    return _scraper(source["jeu"], source["url"], lambda html: extraire_codes(source, html))
 
 def check_new_codes():
     """
-    Vérifie TOUS les jeux.
-    Retourne une liste de dictionnaires : [{'game': 'NomJeu', 'code': 'XYZ'}, ...]
+    Vérifie TOUS les jeux du registre.
+    Retourne une liste de dictionnaires : [{'game': 'NomJeu', 'code': 'XYZ', 'couleur': 0x...}, ...]
     """
     nouveaux_trouvailles = []
-    memoire_actuelle = _charger_memoire()
-    
-    # 1. ARKNIGHTS
-    codes_ark = scrape_arknights()
-    for code in codes_ark:
-        id_unique = f"ARKNIGHTS_{code}" # Préfixe pour unicité
-        if id_unique not in memoire_actuelle:
-            nouveaux_trouvailles.append({"game": "Arknights: Endfield", "code": code})
-            memoire_actuelle.append(id_unique)
-
-    # 2. STRINOVA
-    codes_stri = scrape_strinova()
-    for code in codes_stri:
-        id_unique = f"STRINOVA_{code}"
-        if id_unique not in memoire_actuelle:
-            nouveaux_trouvailles.append({"game": "Strinova", "code": code})
-            memoire_actuelle.append(id_unique)
-
-    # Sauvegarde si on a trouvé des trucs
-    if nouveaux_trouvailles:
-        _sauvegarder_memoire(memoire_actuelle)
-        
+    memoire = get_memoire_codes()
+
+    # Tous les sites sont interrogés en parallèle
+    with ThreadPoolExecutor(max_workers=len(SOURCES_CODES)) as pool:
+        resultats = list(pool.map(scraper_source, SOURCES_CODES))
+
+    with _verrou_cache:
+        copie = dict(_cache_pages)
+    sauver_json_atomique(PAGES_CACHE_FILE, copie)
+    for source, m in obtenir_stats_scrapers().items():
+        print(f"🔎 {source} : {m['statut']} (fetch {m['fetch_ms']} ms, parse {m['parse_ms']} ms)")
+
+    for source, codes in zip(SOURCES_CODES, resultats):
+        ids = [f"{source['cle']}_{code}" for code in codes] # Préfixe pour unicité
+        # Seuls les codes jamais vus sont ajoutés au journal (une ligne chacun)
+        for id_unique in memoire.enregistrer(ids):
+            code = id_unique[len(source['cle']) + 1:]
+            nouveaux_trouvailles.append({"game": source["jeu"], "code": code, "couleur": source["couleur"]})
+
     return nouveaux_trouvailles
 
+# --- Benchmark (page synthétique) ---
+
+def _ancien_parser_arknights(html):
+    """Ancienne méthode, gardée pour comparaison : arbre complet html.parser."""
+    codes = []
+    soup = BeautifulSoup(html, 'html.parser')
+    for row in soup.find_all('tr'):
+        cols = row.find_all('td')
+        if cols:
+            raw_text = cols[0].get_text(" ", strip=True)
+            potential_code = raw_text.split(" ")[0].replace(":", "").strip()
+            if potential_code.isupper() and len(potential_code) > 3 and "CODE" not in potential_code:
+                codes.append(potential_code)
+    return codes
+
+def _page_synthetique(nb_paragraphes=3000, nb_codes=40):
+    """Page type 'guide de codes' : beaucoup de contenu, un petit tableau de codes."""
+    morceaux = ["<html><head><title>Codes</title>"]
+    morceaux += [f"<script>var x{i} = {i};</script>" for i in range(50)]
+    morceaux.append("</head><body><nav><ul>")
+    morceaux += [f"<li><a href='/p{i}'>Lien {i}</a></li>" for i in range(200)]
+    morceaux.append("</ul></nav><article>")
+    for i in range(nb_paragraphes):
+        morceaux.append(f"<div class='bloc'><p>Paragraphe {i} <b>gras</b> <a href='#'>lien</a> texte de remplissage.</p></div>")
+    morceaux.append("<table><tr><th>Code</th><th>Récompense</th></tr>")
+    morceaux += [f"<tr><td>ENDFIELD{i:03d}: actif</td><td>Orundum x{i}</td></tr>" for i in range(nb_codes)]
+    morceaux.append("</table></article></body></html>")
+    return "".join(morceaux)
+
+def _mesurer(fonction, html, repetitions=5):
+    """(résultat, durée moyenne en ms, pic mémoire en Mo) ; tracemalloc à part car il fausse les temps."""
+    import tracemalloc
+    debut = time.perf_counter()
+    for _ in range(repetitions):
+        resultat = fonction(html)
+    duree = (time.perf_counter() - debut) * 1000 / repetitions
+
+    tracemalloc.start()
+    fonction(html)
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultat, duree, pic / 1024 / 1024
+
 if __name__ == "__main__":
-    print("🔍 Test multi-jeux...")
-    print(check_new_codes())
\ No newline at end of file
+    html = _page_synthetique()
+    print(f"📄 Page synthétique : {len(html) / 1024:.0f} Ko, parseur rapide = {PARSEUR}")
+
+    ancien, t_ancien, m_ancien = _mesurer(_ancien_parser_arknights, html)
+    nouveau, t_nouveau, m_nouveau = _mesurer(lambda h: extraire_codes(SOURCES_CODES[0], h), html)
+    assert sorted(ancien) == sorted(nouveau), "Les deux méthodes doivent trouver les mêmes codes"
+
+    print(f"Ancien (html.parser, arbre complet) : {t_ancien:.1f} ms, pic mémoire {m_ancien:.1f} Mo")
+    print(f"Nouveau ({PARSEUR} + SoupStrainer)     : {t_nouveau:.1f} ms, pic mémoire {m_nouveau:.1f} Mo")
+    print(f"{len(nouveau)} codes trouvés, x{t_ancien / t_nouveau:.1f} plus rapide")
\ No newline at end of file
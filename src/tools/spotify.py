@@ -5,97 +5,13 @@
 ================================================================================
 """
 
-import difflib
 import spotipy
-from spotipy.oauth2 import SpotifyOAuth
-
-from config import (
-    SPOTIPY_CLIENT_ID,
-    SPOTIPY_CLIENT_SECRET,
-    SPOTIPY_REDIRECT_URI,
-    SPOTIFY_CACHE_PATH,
-)
-
-# ------------------------------------------------------------------------------
-# AUTHENTIFICATION & CONNEXION
-# ------------------------------------------------------------------------------
-
-
-def get_spotify_client():
-    """
-    Crée et retourne un client Spotify authentifié.
-    Utilise le cache pour éviter de se re-loguer à chaque fois.
-    """
-    if not SPOTIPY_CLIENT_ID:
-        # On évite le spam de logs si pas configuré
-        return None
-
-    try:
-        scope_list = (
-            "user-read-playback-state "
-            "user-modify-playback-state "
-            "user-library-read "
-            "playlist-read-private"
-        )
-
-        auth_manager = SpotifyOAuth(
-            client_id=SPOTIPY_CLIENT_ID,
-            client_secret=SPOTIPY_CLIENT_SECRET,
-            redirect_uri=SPOTIPY_REDIRECT_URI,
-            scope=scope_list,
-            cache_path=SPOTIFY_CACHE_PATH,
-            open_browser=False,
-        )
-
-        return spotipy.Spotify(auth_manager=auth_manager)
-
-    except Exception:
-        return None
-
-
-# ------------------------------------------------------------------------------
-# FONCTIONS UTILITAIRES INTERNES
-# ------------------------------------------------------------------------------
-
-
-def _trouver_device_id(sp, nom_appareil=None):
-    """
-    Cherche l'ID d'un appareil Spotify.
-    """
-    try:
-        devices = sp.devices()
-        active_devices = devices.get("devices", [])
-    except Exception:
-        return None
-
-    if not active_devices:
-        return None
-
-    # A. Recherche par nom (si fourni)
-    if nom_appareil:
-        # 1. Correspondance exacte (partielle)
-        for d in active_devices:
-            if nom_appareil.lower() in d["name"].lower():
-                return d["id"]
-
-        # 2. Correspondance approximative (Fuzzy Matching)
-        device_dict = {d["name"]: d["id"] for d in active_devices}
-        matches = difflib.get_close_matches(
-            nom_appareil, list(device_dict.keys()), n=1, cutoff=0.4
-        )
-        if matches:
-            print(f"✅ Appareil deviné : {matches[0]}")
-            return device_dict[matches[0]]
-
-        return None
-
-    # B. Fallback : Appareil actif ou premier de la liste
-    currently_playing = next((d for d in active_devices if d["is_active"]), None)
-    if currently_playing:
-        return currently_playing["id"]
-
-    return active_devices[0]["id"]
 
+# La session (token en mémoire, pool HTTP, stats) vit dans spotify_session
+from .spotify_session import get_spotify_client
+from .spotify_library import get_bibliotheque, synchroniser_en_fond_si_perime
+from .spotify_devices import get_registre_appareils
+from .spotify_playback import get_service_lecture, formater_titre
 
 # ------------------------------------------------------------------------------
 # FONCTIONS PRINCIPALES
@@ -105,26 +21,26 @@ def obtenir_lecture_en_cours():
     """
     Récupère le titre et l'artiste en cours de lecture pour le statut Discord.
     Retourne une string formatée ou None.
+    Lu dans le cache du service de lecture (aucun appel réseau si le poller tourne).
     """
-    sp = get_spotify_client()
-    if not sp:
-        return None
-    
-    try:
-        current = sp.current_playback()
-        if current and current.get('is_playing') and current.get('item'):
-            track = current['item']
-            # On gère le cas des pubs ou podcasts qui n'ont pas forcément d'artiste
-            if 'artists' in track and track['artists']:
-                artist = track['artists'][0]['name']
-                title = track['name']
-                return f"{title} ({artist})"
-            else:
-                return track['name']
-    except Exception:
-        pass
-    
-    return None
+    return formater_titre(get_service_lecture().etat())
+
+
+def _decrire_lecture():
+    """Réponse à "qu'est-ce qui joue ?" depuis le cache du service de lecture."""
+    etat = get_service_lecture().etat()
+    if not etat:
+        return "Rien en lecture."
+
+    def _mmss(ms):
+        secondes = int(ms // 1000)
+        return f"{secondes // 60}:{secondes % 60:02d}"
+
+    titre = formater_titre(etat) or etat["titre"]
+    statut = "▶️" if etat["is_playing"] else "⏸️"
+    progression = f"{_mmss(etat['position_ms'])} / {_mmss(etat['duration_ms'])}"
+    appareil = f" sur {etat['appareil']}" if etat["appareil"] else ""
+    return f"{statut} {titre} — {progression}{appareil}"
 
 
 def commander_spotify_reel(action, recherche=None, appareil=None, position=None):
@@ -135,13 +51,20 @@ def commander_spotify_reel(action, recherche=None, appareil=None, position=None)
     if not sp:
         return "Spotify non configuré."
 
+    if action == "statut":
+        return _decrire_lecture()
+
+    if action == "alias":
+        return _definir_alias(sp, recherche, appareil)
+
     print(
         f"🎵 Spotify: {action} (Rech: {recherche} | Dev: {appareil} | Pos: {position})"
     )
 
     try:
-        # 1. Résolution de l'appareil cible
-        target_device_id = _trouver_device_id(sp, appareil)
+        # 1. Résolution de l'appareil cible (registre en cache)
+        registre = get_registre_appareils()
+        target_device_id = registre.resoudre(sp, appareil)
 
         if not target_device_id:
             if appareil:
@@ -159,22 +82,18 @@ def commander_spotify_reel(action, recherche=None, appareil=None, position=None)
                 pass
 
         # 3. Exécution de l'action
-        if action == "play":
-            return _gerer_lecture(sp, target_device_id, recherche, offset_idx)
-
-        elif action == "pause":
-            sp.pause_playback(device_id=target_device_id)
-            return "Pause."
-
-        elif action == "next":
-            sp.next_track(device_id=target_device_id)
-            return "Suivant."
-
-        elif action == "previous":
-            sp.previous_track(device_id=target_device_id)
-            return "Précédent."
-
-        return "Action inconnue."
+        try:
+            return _executer_action(sp, action, target_device_id, recherche, offset_idx)
+        except spotipy.SpotifyException as e:
+            if e.http_status != 404:
+                raise
+            # Id mémorisé périmé (appareil redémarré) : on relit la liste et on réessaie une fois
+            print("🔄 Appareil Spotify introuvable, rafraîchissement du registre...")
+            registre.rafraichir(sp)
+            target_device_id = registre.resoudre(sp, appareil)
+            if not target_device_id:
+                raise
+            return _executer_action(sp, action, target_device_id, recherche, offset_idx)
 
     except spotipy.SpotifyException as e:
         print(f"⚠️ Erreur Spotify API: {e}")
@@ -188,73 +107,98 @@ def commander_spotify_reel(action, recherche=None, appareil=None, position=None)
 
 
 
-def _gerer_lecture(sp, device_id, recherche, offset_idx):
+def _definir_alias(sp, alias, appareil):
+    """Ex: alias 'salon' -> appareil 'Enola_Pi' (nom vérifié sur la liste Spotify)."""
+    if not alias or not appareil:
+        return "Il faut un alias et le nom de l'appareil."
+    registre = get_registre_appareils()
+    try:
+        registre.rafraichir(sp)
+    except Exception as e:
+        print(f"⚠️ Liste des appareils indisponible, noms connus utilisés : {e}")
+    nom = registre.definir_alias(alias, appareil)
+    if not nom:
+        return f"Je ne trouve pas l'appareil '{appareil}'."
+    return f"'{alias}' désigne maintenant l'appareil '{nom}'."
+
+
+def _executer_action(sp, action, device_id, recherche, offset_idx):
+    resultat = _executer_action_brute(sp, action, device_id, recherche, offset_idx)
+    # L'état de lecture vient de changer : le poller relit tout de suite
+    get_service_lecture().invalider()
+    return resultat
+
+
+def _executer_action_brute(sp, action, device_id, recherche, offset_idx):
+    if action == "play":
+        return _gerer_lecture(sp, device_id, recherche, offset_idx)
+
+    elif action == "pause":
+        sp.pause_playback(device_id=device_id)
+        return "Pause."
+
+    elif action == "next":
+        sp.next_track(device_id=device_id)
+        return "Suivant."
+
+    elif action == "previous":
+        sp.previous_track(device_id=device_id)
+        return "Précédent."
+
+    return "Action inconnue."
+
+
+def _resoudre_lecture(sp, device_id, recherche, offset_idx):
     """
-    Logique interne pour l'action 'play'.
+    Transforme une demande 'play' en commande prête à tirer.
+    Retourne {"kwargs": ... pour start_playback, "message": ..., "shuffle_off": bool},
+    ou {"kwargs": None, "message": ...} si rien à lancer.
     """
     if offset_idx > 0 and not recherche:
         recherche = "Titres Likés"
 
     if not recherche:
-        sp.start_playback(device_id=device_id)
-        return "Lecture."
+        return {"kwargs": {"device_id": device_id}, "message": "Lecture.", "shuffle_off": False}
 
     recherche_low = recherche.lower()
 
+    # Index local : on ne synchronise en direct que la toute première fois
+    bib = get_bibliotheque()
+    if bib.est_vide():
+        try:
+            bib.synchroniser(sp)
+        except Exception as e:
+            print(f"⚠️ Erreur synchro index Spotify : {e}")
+
     # --- A. MODE : TITRES LIKÉS ---
     mots_likes = ["titres likés", "titres likes", "mes likes", "coups de cœur", "favoris", "ma musique"]
 
     if any(m in recherche_low for m in mots_likes):
-        try:
-            limit_fetch = 50
-            if offset_idx > 40:
-                limit_fetch = offset_idx + 10
-
-            results = sp.current_user_saved_tracks(limit=limit_fetch)
-            uris = [item["track"]["uri"] for item in results["items"]]
-
-            if not uris:
-                return "Bibliothèque vide."
-
-            try:
-                sp.shuffle(state=False, device_id=device_id)
-            except:
-                pass
+        uris_to_play = bib.uris_likes(offset_idx)
+        if not uris_to_play:
+            return {"kwargs": None, "message": "Bibliothèque vide."}
 
-            safe_offset = offset_idx if offset_idx < len(uris) else 0
-            uris_to_play = uris[safe_offset:]
-
-            sp.start_playback(device_id=device_id, uris=uris_to_play)
-            return f"Titres likés lancés."
-
-        except Exception as e:
-            print(f"Erreur Likes: {e}")
-            return "Erreur lors du lancement des likes."
+        return {
+            "kwargs": {"device_id": device_id, "uris": uris_to_play},
+            "message": "Titres likés lancés.",
+            "shuffle_off": True,
+        }
 
     # --- B. MODE : PLAYLISTS ---
-    try:
-        user_playlists = sp.current_user_playlists(limit=50)
-        playlist_dict = {p["name"]: p["uri"] for p in user_playlists["items"]}
+    trouve = bib.trouver_playlist(recherche)
+    if not trouve:
+        # Playlist peut-être créée depuis la dernière synchro : l'index se met à jour
+        # derrière, cette demande-ci part en recherche globale
+        synchroniser_en_fond_si_perime(sp)
 
-        matches = difflib.get_close_matches(
-            recherche, list(playlist_dict.keys()), n=1, cutoff=0.6
-        )
-
-        if matches:
-            best_match = matches[0]
-            try:
-                sp.shuffle(state=False, device_id=device_id)
-            except:
-                pass
+    if trouve:
+        best_match, uri = trouve
 
-            kwargs = {"device_id": device_id, "context_uri": playlist_dict[best_match]}
-            if offset_idx > 0:
-                kwargs["offset"] = {"position": offset_idx}
+        kwargs = {"device_id": device_id, "context_uri": uri}
+        if offset_idx > 0:
+            kwargs["offset"] = {"position": offset_idx}
 
-            sp.start_playback(**kwargs)
-            return f"Playlist '{best_match}' lancée."
-    except Exception:
-        pass
+        return {"kwargs": kwargs, "message": f"Playlist '{best_match}' lancée.", "shuffle_off": True}
 
     # --- C. MODE : RECHERCHE GLOBALE ---
     results = sp.search(q=recherche, limit=1, type="track,artist,album")
@@ -262,13 +206,101 @@ def _gerer_lecture(sp, device_id, recherche, offset_idx):
     if results["tracks"]["items"]:
         uri = results["tracks"]["items"][0]["uri"]
         nom = results["tracks"]["items"][0]["name"]
-        sp.start_playback(device_id=device_id, uris=[uri])
-        return f"Titre '{nom}' lancé."
+        return {"kwargs": {"device_id": device_id, "uris": [uri]}, "message": f"Titre '{nom}' lancé.", "shuffle_off": False}
 
     elif results["artists"]["items"]:
         uri = results["artists"]["items"][0]["uri"]
         nom = results["artists"]["items"][0]["name"]
-        sp.start_playback(device_id=device_id, context_uri=uri)
-        return f"Artiste '{nom}' lancé."
+        return {"kwargs": {"device_id": device_id, "context_uri": uri}, "message": f"Artiste '{nom}' lancé.", "shuffle_off": False}
+
+    return {"kwargs": None, "message": f"Rien trouvé pour {recherche}."}
+
+
+def _tirer(sp, commande):
+    """
+    Le seul appel réseau du chemin critique : start_playback.
+    Playlists / likes : l'aléatoire est coupé AVANT, sinon la lecture ne
+    démarrerait pas sur `offset` ; on s'en passe si le cache le dit déjà coupé.
+    """
+    if commande.get("shuffle_off") and get_service_lecture().aleatoire_en_cache() is not False:
+        try:
+            sp.shuffle(state=False, device_id=commande["kwargs"]["device_id"])
+        except Exception as e:
+            print(f"⚠️ Impossible de couper l'aléatoire : {e}")
+    sp.start_playback(**commande["kwargs"])
+    return commande["message"]
+
+
+def _gerer_lecture(sp, device_id, recherche, offset_idx):
+    """
+    Logique interne pour l'action 'play'.
+    """
+    commande = _resoudre_lecture(sp, device_id, recherche, offset_idx)
+    if not commande["kwargs"]:
+        return commande["message"]
+    return _tirer(sp, commande)
+
 
-    return f"Rien trouvé pour {recherche}."
\ No newline at end of file
+# ------------------------------------------------------------------------------
+# ALARMES : PRÉ-CHAUFFAGE
+# ------------------------------------------------------------------------------
+
+MARGE_TOKEN_ALARME = 600  # Le token doit rester valide bien après l'heure de l'alarme
+
+
+def preparer_lecture(recherche=None, appareil=None):
+    """
+    Fait tout le travail lent avant l'heure : token, appareil, URI.
+    Retourne une commande prête à tirer (ou None si impossible).
+    """
+    sp = get_spotify_client()
+    if not sp:
+        return None
+
+    try:
+        sp.rafraichir_token(marge=MARGE_TOKEN_ALARME)
+
+        registre = get_registre_appareils()
+        try:
+            registre.rafraichir(sp)
+        except Exception as e:
+            print(f"⚠️ Liste des appareils indisponible, ids connus utilisés : {e}")
+
+        device_id = registre.resoudre(sp, appareil)
+        if not device_id:
+            print(f"⚠️ Pré-chauffage : appareil '{appareil}' introuvable.")
+            return None
+
+        commande = _resoudre_lecture(sp, device_id, recherche, 0)
+        if not commande["kwargs"]:
+            print(f"⚠️ Pré-chauffage : {commande['message']}")
+            return None
+
+        print(f"🔥 Lecture pré-chauffée : {commande['message']}")
+        return commande
+
+    except Exception as e:
+        print(f"⚠️ Erreur pré-chauffage Spotify : {e}")
+        return None
+
+
+def lancer_lecture_preparee(commande):
+    """
+    Tire une commande préparée : un unique appel start_playback.
+    Retourne True si la lecture est lancée, False sinon (appareil disparu,
+    403...) : l'appelant doit alors relancer à froid.
+    """
+    sp = get_spotify_client()
+    if not sp:
+        return False
+
+    try:
+        print(f"▶️ {_tirer(sp, commande)}")
+        get_service_lecture().invalider()
+        return True
+    except spotipy.SpotifyException as e:
+        print(f"⚠️ Erreur Spotify API (lecture pré-chauffée): {e}")
+        return False
+    except Exception as e:
+        print(f"⚠️ Erreur lecture pré-chauffée : {e}")
+        return False
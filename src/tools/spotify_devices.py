@@ -0,0 +1,216 @@
+"""
+================================================================================
+@fichier      : src/tools/spotify_devices.py
+@description  : Registre des appareils Spotify Connect.
+                Liste des appareils en cache (TTL court, rafraîchie en
+                arrière-plan), alias utilisateur ("speaker" -> Enola_Pi) et
+                derniers identifiants connus, pour lancer la lecture même quand
+                sp.devices() est lent.
+================================================================================
+"""
+
+import difflib
+import os
+import threading
+import time
+
+from config import ASSETS_DIR
+from .stockage import charger_json, sauver_json_atomique
+
+REGISTRE_FILE = os.path.join(ASSETS_DIR, "spotify_devices.json")
+
+TTL_DEVICES = 20  # secondes
+
+# Alias par défaut (complétés / surchargés par le fichier registre)
+ALIAS_PAR_DEFAUT = {
+    "speaker": "Enola_Pi",
+    "enceinte": "Enola_Pi",
+    "pi": "Enola_Pi",
+}
+
+
+def _chercher_exact(noms_ids, cible):
+    """Nom identique (insensible à la casse) dans {nom: id}, sinon None."""
+    cible_low = cible.lower()
+    for nom, device_id in noms_ids.items():
+        if nom.lower() == cible_low:
+            return device_id
+    return None
+
+
+def _chercher(noms_ids, cible):
+    """
+    Cherche un appareil par nom dans {nom: id}.
+    Exact, puis partiel, puis approximatif (Fuzzy Matching).
+    """
+    if not noms_ids:
+        return None
+
+    device_id = _chercher_exact(noms_ids, cible)
+    if device_id:
+        return device_id
+
+    cible_low = cible.lower()
+    for nom, device_id in noms_ids.items():
+        if cible_low in nom.lower():
+            return device_id
+
+    matches = difflib.get_close_matches(cible, list(noms_ids.keys()), n=1, cutoff=0.4)
+    if matches:
+        print(f"✅ Appareil deviné : {matches[0]}")
+        return noms_ids[matches[0]]
+
+    return None
+
+
+class RegistreAppareils:
+    """
+    alias  : {alias (minuscule): nom de l'appareil}
+    connus : {nom de l'appareil: dernier id vu}
+    """
+
+    def __init__(self, chemin=REGISTRE_FILE):
+        self.chemin = chemin
+        self._verrou = threading.Lock()
+        self._refresh_en_cours = False
+
+        data = charger_json(chemin, {}) or {}
+        self.alias = dict(ALIAS_PAR_DEFAUT)
+        self.alias.update({k.lower(): v for k, v in data.get("alias", {}).items()})
+        self.connus = data.get("connus", {})
+
+        self._devices = []
+        self._maj = 0.0
+
+    # --- Cache ---
+
+    def est_frais(self):
+        return bool(self._maj) and time.time() - self._maj < TTL_DEVICES
+
+    def rafraichir(self, sp):
+        """Appel sp.devices() bloquant ; met à jour le cache et les ids connus."""
+        devices = sp.devices().get("devices", [])
+
+        with self._verrou:
+            self._devices = devices
+            self._maj = time.time()
+
+            nouveaux = {d["name"]: d["id"] for d in devices if d.get("id")}
+            change = any(self.connus.get(nom) != did for nom, did in nouveaux.items())
+            self.connus.update(nouveaux)
+
+        if change:
+            self._sauver()
+        return devices
+
+    def rafraichir_en_fond(self, sp):
+        """Rafraîchit sans bloquer l'appelant (un seul refresh à la fois)."""
+        with self._verrou:
+            if self._refresh_en_cours:
+                return
+            self._refresh_en_cours = True
+
+        def _tache():
+            try:
+                self.rafraichir(sp)
+            except Exception as e:
+                print(f"⚠️ Erreur refresh appareils Spotify : {e}")
+            finally:
+                self._refresh_en_cours = False
+
+        threading.Thread(target=_tache, daemon=True).start()
+
+    def invalider(self):
+        self._maj = 0.0
+
+    # --- Résolution ---
+
+    def resoudre(self, sp, nom_appareil=None):
+        """Retourne l'id de l'appareil cible (ou None)."""
+        if not nom_appareil:
+            return self._appareil_par_defaut(sp)
+
+        cible = self.alias.get(nom_appareil.lower().strip(), nom_appareil)
+
+        # 1. Cache récent
+        if self.est_frais():
+            device_id = _chercher(self._noms_ids(), cible)
+            if device_id:
+                return device_id
+
+        # 2. Dernier id connu : on tire tout de suite, le cache se met à jour derrière.
+        #    Nom exact (ou alias) uniquement : deviner parmi des appareils peut-être
+        #    disparus ferait jouer la musique sur le mauvais.
+        device_id = _chercher_exact(self.connus, cible)
+        if device_id:
+            if not self.est_frais():
+                self.rafraichir_en_fond(sp)
+            return device_id
+
+        # 3. Appareil jamais vu (ou nom approximatif) : il faut interroger Spotify
+        try:
+            self.rafraichir(sp)
+        except Exception:
+            return None
+        return _chercher(self._noms_ids(), cible)
+
+    def _appareil_par_defaut(self, sp):
+        """Appareil actif ou premier de la liste (nécessite une liste fraîche)."""
+        if not self.est_frais():
+            try:
+                self.rafraichir(sp)
+            except Exception:
+                return None
+
+        devices = self._devices
+        if not devices:
+            return None
+
+        currently_playing = next((d for d in devices if d.get("is_active")), None)
+        if currently_playing:
+            return currently_playing["id"]
+        return devices[0]["id"]
+
+    # --- Alias ---
+
+    def definir_alias(self, alias, nom_appareil):
+        """
+        Associe un alias au nom réel d'un appareil (liste récente ou ids connus).
+        Retourne ce nom, ou None si l'appareil est inconnu.
+        """
+        with self._verrou:
+            noms = {n: n for n in list(self._noms_ids()) + list(self.connus)}
+        nom = _chercher(noms, nom_appareil)
+        if not nom:
+            return None
+        with self._verrou:
+            self.alias[alias.lower().strip()] = nom
+        self._sauver()
+        return nom
+
+    # --- Interne ---
+
+    def _noms_ids(self):
+        return {d["name"]: d["id"] for d in self._devices if d.get("id")}
+
+    def _sauver(self):
+        with self._verrou:
+            # On ne persiste que les alias utilisateur (les défauts restent dans le code)
+            alias_perso = {
+                k: v for k, v in self.alias.items() if ALIAS_PAR_DEFAUT.get(k) != v
+            }
+            data = {"alias": alias_perso, "connus": dict(self.connus)}
+        sauver_json_atomique(self.chemin, data, indent=4)
+
+
+_registre = None
+_verrou_registre = threading.Lock()
+
+
+def get_registre_appareils():
+    global _registre
+    if _registre is None:
+        with _verrou_registre:
+            if _registre is None:
+                _registre = RegistreAppareils()
+    return _registre
@@ -0,0 +1,236 @@
+"""
+================================================================================
+@fichier      : src/tools/spotify_library.py
+@description  : Index local de la bibliothèque Spotify (playlists + titres likés).
+                Synchronisé en arrière-plan (pagination complète, diff par
+                snapshot_id pour les playlists, incrémental par added_at pour
+                les likes) et persisté sur disque : une demande de lecture se
+                résout localement, sans appel réseau.
+================================================================================
+"""
+
+import difflib
+import os
+import threading
+import time
+
+from config import ASSETS_DIR
+from .spotify_session import get_spotify_client
+from .stockage import charger_json, sauver_json_atomique
+
+INDEX_FILE = os.path.join(ASSETS_DIR, "spotify_library.json")
+
+TAILLE_PAGE = 50
+DELAI_SYNC_COMPLETE_LIKES = 24 * 3600   # Resynchro complète des likes 1x/jour
+DELAI_MIN_SYNC_A_LA_DEMANDE = 300       # Pas plus d'une synchro "de secours" / 5 min
+
+
+class BibliothequeSpotify:
+    """
+    playlists : {id: {"name", "uri", "snapshot_id", "total"}}
+    likes     : [{"uri", "added_at"}], du plus récent au plus ancien
+    """
+
+    def __init__(self, chemin=INDEX_FILE):
+        self.chemin = chemin
+        self._verrou_sync = threading.Lock()
+
+        data = charger_json(chemin, {}) or {}
+        self.playlists = data.get("playlists", {})
+        self.likes = data.get("likes", [])
+        self.dernier_sync = data.get("dernier_sync", 0)
+        self.dernier_sync_complet_likes = data.get("dernier_sync_complet_likes", 0)
+
+        self._uri_par_nom = {}
+        self._reindexer()
+
+    # --- Lecture (locale, instantanée) ---
+
+    def est_vide(self):
+        return not self.playlists and not self.likes
+
+    def trouver_playlist(self, recherche, cutoff=0.6):
+        """Retourne (nom, uri) de la playlist la plus proche, ou None."""
+        noms = list(self._uri_par_nom.keys())
+        matches = difflib.get_close_matches(recherche, noms, n=1, cutoff=cutoff)
+        if not matches:
+            return None
+        return matches[0], self._uri_par_nom[matches[0]]
+
+    def uris_likes(self, offset=0, nombre=TAILLE_PAGE):
+        """Fenêtre de titres likés à partir de `offset` (0 si hors limites)."""
+        if offset >= len(self.likes):
+            offset = 0
+        return [l["uri"] for l in self.likes[offset:offset + nombre]]
+
+    # --- Synchronisation ---
+
+    def synchroniser(self, sp):
+        """Met l'index à jour. Retourne True si quelque chose a changé."""
+        with self._verrou_sync:
+            debut = time.perf_counter()
+            modif_playlists = self._sync_playlists(sp)
+            modif_likes = self._sync_likes(sp)
+            self.dernier_sync = time.time()
+
+            if modif_playlists or modif_likes:
+                self._reindexer()
+            self._sauver()
+
+            duree = (time.perf_counter() - debut) * 1000
+            print(
+                f"🎼 Index Spotify synchronisé ({len(self.playlists)} playlists, "
+                f"{len(self.likes)} likes) en {duree:.0f} ms."
+            )
+            return modif_playlists or modif_likes
+
+    def _sync_playlists(self, sp):
+        vues = {}
+        offset = 0
+        while True:
+            page = sp.current_user_playlists(limit=TAILLE_PAGE, offset=offset)
+            for p in page.get("items", []):
+                if p:
+                    vues[p["id"]] = p
+            if not page.get("next"):
+                break
+            offset += TAILLE_PAGE
+
+        nouvelles = {}
+        changements = 0
+        for pid, p in vues.items():
+            ancienne = self.playlists.get(pid)
+            # Même snapshot = playlist inchangée, on garde l'entrée telle quelle
+            if ancienne and ancienne.get("snapshot_id") == p.get("snapshot_id"):
+                nouvelles[pid] = ancienne
+                continue
+            changements += 1
+            nouvelles[pid] = {
+                "name": p["name"],
+                "uri": p["uri"],
+                "snapshot_id": p.get("snapshot_id"),
+                "total": (p.get("tracks") or {}).get("total", 0),
+            }
+
+        supprimees = len(set(self.playlists) - set(vues))
+        self.playlists = nouvelles
+        return bool(changements or supprimees)
+
+    def _sync_likes(self, sp, complet=None):
+        if complet is None:
+            complet = (
+                not self.likes
+                or time.time() - self.dernier_sync_complet_likes > DELAI_SYNC_COMPLETE_LIKES
+            )
+
+        connus = {(l["uri"], l["added_at"]) for l in self.likes}
+        nouveaux = []
+        total = 0
+        offset = 0
+
+        while True:
+            page = sp.current_user_saved_tracks(limit=TAILLE_PAGE, offset=offset)
+            total = page.get("total", 0)
+            deja_vu = False
+
+            for item in page.get("items", []):
+                track = item.get("track") or {}
+                if not track.get("uri"):
+                    continue
+                entree = (track["uri"], item["added_at"])
+                # Les likes arrivent du plus récent au plus ancien :
+                # le premier déjà connu marque la fin des nouveautés.
+                if not complet and entree in connus:
+                    deja_vu = True
+                    break
+                nouveaux.append({"uri": entree[0], "added_at": entree[1]})
+
+            if deja_vu or not page.get("next"):
+                break
+            offset += TAILLE_PAGE
+
+        if complet:
+            modif = nouveaux != self.likes
+            self.likes = nouveaux
+            self.dernier_sync_complet_likes = time.time()
+            return modif
+
+        if not nouveaux:
+            if len(self.likes) != total:
+                # Des titres ont été retirés : seule une synchro complète le voit
+                return self._sync_likes(sp, complet=True)
+            return False
+
+        uris_nouveaux = {n["uri"] for n in nouveaux}
+        fusion = nouveaux + [l for l in self.likes if l["uri"] not in uris_nouveaux]
+        if len(fusion) != total:
+            return self._sync_likes(sp, complet=True)
+
+        self.likes = fusion
+        return True
+
+    # --- Interne ---
+
+    def _reindexer(self):
+        self._uri_par_nom = {p["name"]: p["uri"] for p in self.playlists.values()}
+
+    def _sauver(self):
+        sauver_json_atomique(self.chemin, {
+            "playlists": self.playlists,
+            "likes": self.likes,
+            "dernier_sync": self.dernier_sync,
+            "dernier_sync_complet_likes": self.dernier_sync_complet_likes,
+        })
+
+
+_bibliotheque = None
+_verrou_bibliotheque = threading.Lock()
+
+
+def get_bibliotheque():
+    """Index du processus, chargé depuis le disque au premier appel."""
+    global _bibliotheque
+    if _bibliotheque is None:
+        with _verrou_bibliotheque:
+            if _bibliotheque is None:
+                _bibliotheque = BibliothequeSpotify()
+    return _bibliotheque
+
+
+def synchroniser_bibliotheque():
+    """Synchronisation complète (appelée par la tâche de fond)."""
+    sp = get_spotify_client()
+    if not sp:
+        return False
+    try:
+        return get_bibliotheque().synchroniser(sp)
+    except Exception as e:
+        print(f"⚠️ Erreur synchro index Spotify : {e}")
+        return False
+
+
+_sync_en_cours = threading.Event()
+
+
+def synchroniser_en_fond_si_perime(sp):
+    """
+    Synchro de secours (playlist introuvable), limitée dans le temps et lancée
+    en arrière-plan : la demande en cours se résout avec l'index tel quel.
+    """
+    bib = get_bibliotheque()
+    if time.time() - bib.dernier_sync < DELAI_MIN_SYNC_A_LA_DEMANDE:
+        return
+    with _verrou_bibliotheque:
+        if _sync_en_cours.is_set():
+            return
+        _sync_en_cours.set()
+
+    def _tache():
+        try:
+            bib.synchroniser(sp)
+        except Exception as e:
+            print(f"⚠️ Erreur synchro index Spotify : {e}")
+        finally:
+            _sync_en_cours.clear()
+
+    threading.Thread(target=_tache, daemon=True).start()
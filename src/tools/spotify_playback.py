@@ -0,0 +1,201 @@
+"""
+================================================================================
+@fichier      : src/tools/spotify_playback.py
+@description  : Service unique d'état de lecture Spotify.
+                Un seul poller adaptatif interroge current_playback, garde le
+                résultat en cache (progression + durée), extrapole la position
+                entre deux relevés et publie les changements aux abonnés
+                (statut Discord, tools de l'agent, alarmes).
+================================================================================
+"""
+
+import threading
+import time
+
+from .spotify_session import get_spotify_client
+
+DELAI_MIN = 3           # Jamais plus d'un relevé toutes les 3 s
+DELAI_LECTURE = 30      # En lecture, si la fin du titre est loin
+DELAI_PAUSE = 30
+DELAI_INACTIF = 60      # Rien en lecture / Spotify injoignable
+DELAI_APRES_COMMANDE = 1.0  # Laisse Spotify appliquer la commande avant relecture
+MARGE_FIN_TITRE = 1.5   # On relit juste après la fin estimée du titre
+
+
+def _extraire_etat(current):
+    """Réduit la réponse current_playback à ce dont on a besoin."""
+    if not current or not current.get("item"):
+        return None
+
+    track = current["item"]
+    artistes = track.get("artists") or []
+    device = current.get("device") or {}
+
+    return {
+        "titre": track.get("name"),
+        "artiste": artistes[0]["name"] if artistes else None,
+        "uri": track.get("uri"),
+        "is_playing": bool(current.get("is_playing")),
+        "progress_ms": current.get("progress_ms") or 0,
+        "duration_ms": track.get("duration_ms") or 0,
+        "appareil": device.get("name"),
+        "device_id": device.get("id"),
+        "aleatoire": current.get("shuffle_state"),
+        "releve_a": time.monotonic(),
+    }
+
+
+def _cle(etat):
+    if not etat:
+        return None
+    return (etat["uri"], etat["is_playing"], etat["device_id"])
+
+
+class ServiceLecture:
+    def __init__(self):
+        self._etat = None
+        self._dernier_releve = 0.0
+        self._abonnes = []
+        self._verrou = threading.Lock()
+        self._reveil = threading.Event()
+        self._thread = None
+
+    # --- Abonnements ---
+
+    def abonner(self, callback):
+        """callback(etat) est appelé (depuis le thread du poller) à chaque changement."""
+        with self._verrou:
+            self._abonnes.append(callback)
+
+    def _publier(self, etat):
+        with self._verrou:
+            abonnes = list(self._abonnes)
+        for callback in abonnes:
+            try:
+                callback(etat)
+            except Exception as e:
+                print(f"⚠️ Erreur abonné lecture Spotify : {e}")
+
+    # --- Relevés ---
+
+    def rafraichir(self):
+        """Un appel current_playback ; publie si le titre / l'état / l'appareil change."""
+        sp = get_spotify_client()
+        if not sp:
+            return None
+
+        nouvel_etat = _extraire_etat(sp.current_playback())
+
+        with self._verrou:
+            ancien = self._etat
+            self._etat = nouvel_etat
+            self._dernier_releve = time.monotonic()
+
+        if _cle(ancien) != _cle(nouvel_etat):
+            self._publier(self.etat())
+        return nouvel_etat
+
+    def invalider(self):
+        """À appeler après une commande : le poller relit l'état très vite."""
+        self._reveil.set()
+
+    # --- Lecture du cache ---
+
+    def position_ms(self, etat=None):
+        """Position extrapolée localement depuis le dernier relevé."""
+        etat = etat or self._etat
+        if not etat:
+            return 0
+        position = etat["progress_ms"]
+        if etat["is_playing"]:
+            position += (time.monotonic() - etat["releve_a"]) * 1000
+        return int(min(position, etat["duration_ms"] or position))
+
+    def secondes_restantes(self):
+        """Temps avant la fin du titre en cours (None si rien ne joue)."""
+        etat = self._etat
+        if not etat or not etat["is_playing"] or not etat["duration_ms"]:
+            return None
+        return max(0.0, (etat["duration_ms"] - self.position_ms(etat)) / 1000)
+
+    def aleatoire_en_cache(self):
+        """Mode aléatoire d'après le dernier relevé (True/False), None si inconnu. Sans appel réseau."""
+        etat = self._etat
+        return etat.get("aleatoire") if etat else None
+
+    def etat(self):
+        """
+        Copie de l'état courant, position extrapolée.
+        Sans poller actif (ex: process API), on relit si le cache est trop vieux.
+        """
+        if not self.est_demarre() and time.monotonic() - self._dernier_releve > DELAI_MIN:
+            try:
+                self.rafraichir()
+            except Exception as e:
+                print(f"⚠️ Erreur lecture état Spotify : {e}")
+
+        etat = self._etat
+        if not etat:
+            return None
+        copie = dict(etat)
+        copie["position_ms"] = self.position_ms(etat)
+        return copie
+
+    # --- Poller adaptatif ---
+
+    def _prochain_delai(self):
+        etat = self._etat
+        if not etat:
+            return DELAI_INACTIF
+        if not etat["is_playing"]:
+            return DELAI_PAUSE
+
+        restant = self.secondes_restantes()
+        if restant is None:
+            return DELAI_LECTURE
+        # On se cale sur le changement de titre plutôt que de poller en boucle
+        return max(DELAI_MIN, min(DELAI_LECTURE, restant + MARGE_FIN_TITRE))
+
+    def _boucle(self):
+        while True:
+            try:
+                self.rafraichir()
+                delai = self._prochain_delai()
+            except Exception as e:
+                print(f"⚠️ Erreur poller Spotify : {e}")
+                delai = DELAI_INACTIF
+
+            if self._reveil.wait(timeout=delai):
+                self._reveil.clear()
+                time.sleep(DELAI_APRES_COMMANDE)
+
+    def est_demarre(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def demarrer(self):
+        if self.est_demarre():
+            return
+        self._thread = threading.Thread(target=self._boucle, name="spotify-lecture", daemon=True)
+        self._thread.start()
+
+
+_service = None
+_verrou_service = threading.Lock()
+
+
+def get_service_lecture():
+    global _service
+    if _service is None:
+        with _verrou_service:
+            if _service is None:
+                _service = ServiceLecture()
+    return _service
+
+
+def formater_titre(etat):
+    """'Titre (Artiste)' ou None si rien ne joue."""
+    if not etat or not etat["is_playing"]:
+        return None
+    if etat["artiste"]:
+        return f"{etat['titre']} ({etat['artiste']})"
+    return etat["titre"]
@@ -0,0 +1,252 @@
+"""
+================================================================================
+@fichier      : src/tools/spotify_session.py
+@description  : Session Spotify unique pour tout le processus.
+                Token gardé en mémoire et rafraîchi avant son expiration,
+                pool de connexions HTTP keep-alive, retries qui respectent
+                Retry-After (429) et statistiques de latence par endpoint.
+================================================================================
+"""
+
+import json
+import os
+import threading
+import time
+
+import requests
+import spotipy
+from requests.adapters import HTTPAdapter
+from spotipy.cache_handler import CacheHandler
+from spotipy.oauth2 import SpotifyOAuth
+from urllib3.util.retry import Retry
+
+from config import (
+    SPOTIPY_CLIENT_ID,
+    SPOTIPY_CLIENT_SECRET,
+    SPOTIPY_REDIRECT_URI,
+    SPOTIFY_CACHE_PATH,
+)
+
+SCOPES_SPOTIFY = (
+    "user-read-playback-state "
+    "user-modify-playback-state "
+    "user-library-read "
+    "playlist-read-private"
+)
+
+MARGE_REFRESH = 300     # On rafraîchit le token 5 min avant expiration
+TIMEOUT_REQUETES = 5    # Secondes par requête HTTP
+RETRY_AFTER_MAX = 30    # On n'attend jamais plus longtemps sur un 429
+
+
+# ------------------------------------------------------------------------------
+# COMPOSANTS INTERNES
+# ------------------------------------------------------------------------------
+
+
+class _CacheTokenMemoire(CacheHandler):
+    """
+    Token gardé en mémoire : le fichier n'est lu qu'une fois au démarrage
+    et réécrit uniquement quand Spotify délivre un nouveau token.
+    """
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self._token = None
+        self._verrou = threading.Lock()
+
+        if os.path.exists(chemin):
+            try:
+                with open(chemin, "r") as f:
+                    self._token = json.load(f)
+            except Exception as e:
+                print(f"⚠️ Cache token Spotify illisible : {e}")
+
+    def get_cached_token(self):
+        return self._token
+
+    def save_token_to_cache(self, token_info):
+        with self._verrou:
+            self._token = token_info
+            try:
+                with open(self.chemin, "w") as f:
+                    json.dump(token_info, f)
+            except Exception as e:
+                print(f"⚠️ Sauvegarde token Spotify impossible : {e}")
+
+
+class _RetrySpotify(Retry):
+    """Retry urllib3 qui respecte Retry-After, mais plafonné."""
+
+    def get_retry_after(self, response):
+        delai = super().get_retry_after(response)
+        if delai is None:
+            return None
+        return min(delai, RETRY_AFTER_MAX)
+
+
+def _creer_session_http():
+    """Session requests avec pool keep-alive et retries (429 / 5xx)."""
+    retry = _RetrySpotify(
+        total=3,
+        connect=2,
+        read=2,
+        status=3,
+        status_forcelist=(429, 502, 503, 504),
+        # Pas de POST : un add_to_queue / playlist_add_items rejoué ajouterait le titre deux fois
+        allowed_methods=frozenset(["GET", "PUT", "DELETE"]),
+        backoff_factor=0.3,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=8, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    return session
+
+
+# ------------------------------------------------------------------------------
+# SESSION
+# ------------------------------------------------------------------------------
+
+
+class SessionSpotify:
+    """
+    Client Spotify longue durée.
+    Les méthodes spotipy sont accessibles directement (session.devices(), ...)
+    et chaque appel est chronométré par endpoint.
+    """
+
+    def __init__(self):
+        self._http = _creer_session_http()
+        self._cache = _CacheTokenMemoire(SPOTIFY_CACHE_PATH)
+        self._verrou_token = threading.Lock()
+        self._verrou_stats = threading.Lock()
+        self._stats = {}
+
+        self.auth = SpotifyOAuth(
+            client_id=SPOTIPY_CLIENT_ID,
+            client_secret=SPOTIPY_CLIENT_SECRET,
+            redirect_uri=SPOTIPY_REDIRECT_URI,
+            scope=SCOPES_SPOTIFY,
+            cache_handler=self._cache,
+            open_browser=False,
+            requests_session=self._http,
+            requests_timeout=TIMEOUT_REQUETES,
+        )
+        self.sp = spotipy.Spotify(
+            auth_manager=self.auth,
+            requests_session=self._http,
+            requests_timeout=TIMEOUT_REQUETES,
+        )
+
+    # --- Token ---
+
+    def rafraichir_token(self, marge=MARGE_REFRESH):
+        """
+        Rafraîchit le token s'il expire dans moins de `marge` secondes.
+        Retourne True si un token valide est disponible.
+        """
+        token = self._cache.get_cached_token()
+        if not token:
+            return False
+
+        if token.get("expires_at", 0) - time.time() > marge:
+            return True
+
+        with self._verrou_token:
+            # Un autre thread a peut-être déjà fait le travail
+            token = self._cache.get_cached_token()
+            if token.get("expires_at", 0) - time.time() > marge:
+                return True
+            try:
+                self.auth.refresh_access_token(token["refresh_token"])
+                print("🔑 Token Spotify rafraîchi.")
+                return True
+            except Exception as e:
+                print(f"⚠️ Refresh token Spotify impossible : {e}")
+                return False
+
+    # --- Appels instrumentés ---
+
+    def appeler(self, endpoint, *args, **kwargs):
+        """Appelle une méthode spotipy en mesurant sa latence."""
+        self.rafraichir_token()
+
+        methode = getattr(self.sp, endpoint)
+        debut = time.perf_counter()
+        erreur = False
+        try:
+            return methode(*args, **kwargs)
+        except Exception:
+            erreur = True
+            raise
+        finally:
+            self._enregistrer(endpoint, (time.perf_counter() - debut) * 1000, erreur)
+
+    def _enregistrer(self, endpoint, duree_ms, erreur):
+        with self._verrou_stats:
+            s = self._stats.setdefault(
+                endpoint, {"appels": 0, "erreurs": 0, "total_ms": 0.0, "max_ms": 0.0}
+            )
+            s["appels"] += 1
+            s["erreurs"] += int(erreur)
+            s["total_ms"] += duree_ms
+            s["max_ms"] = max(s["max_ms"], duree_ms)
+
+    def stats(self):
+        """Latences par endpoint : {endpoint: {appels, erreurs, moyenne_ms, max_ms}}."""
+        with self._verrou_stats:
+            return {
+                endpoint: {
+                    "appels": s["appels"],
+                    "erreurs": s["erreurs"],
+                    "moyenne_ms": round(s["total_ms"] / s["appels"], 1),
+                    "max_ms": round(s["max_ms"], 1),
+                }
+                for endpoint, s in self._stats.items()
+            }
+
+    def __getattr__(self, nom):
+        # Tout ce qui n'est pas défini ici est délégué (et chronométré) à spotipy
+        if nom.startswith("_") or nom == "sp":
+            raise AttributeError(nom)
+        attr = getattr(self.sp, nom)
+        if not callable(attr):
+            return attr
+        return lambda *args, **kwargs: self.appeler(nom, *args, **kwargs)
+
+
+_session = None
+_verrou_session = threading.Lock()
+
+
+def get_spotify_client():
+    """
+    Retourne la session Spotify du processus (créée au premier appel).
+    None si Spotify n'est pas configuré.
+    """
+    global _session
+
+    if not SPOTIPY_CLIENT_ID:
+        # On évite le spam de logs si pas configuré
+        return None
+
+    if _session is None:
+        with _verrou_session:
+            if _session is None:
+                try:
+                    _session = SessionSpotify()
+                except Exception as e:
+                    print(f"⚠️ Création session Spotify impossible : {e}")
+                    return None
+
+    return _session
+
+
+def obtenir_stats_spotify():
+    """Statistiques de latence par endpoint (vide si pas de session)."""
+    if _session is None:
+        return {}
+    return _session.stats()
@@ -0,0 +1,64 @@
+"""
+================================================================================
+@fichier      : src/tools/stockage.py
+@description  : Petits utilitaires de persistance JSON partagés par les tools.
+                Écriture atomique (fichier temporaire + rename) pour ne jamais
+                laisser un fichier à moitié écrit en cas de coupure.
+                Verrou de fichier pour les lecture-modification-écriture
+                partagées entre le bot et l'API (deux process).
+================================================================================
+"""
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou inter-process (un seul process en dev)
+    fcntl = None
+
+
+def charger_json(chemin, defaut=None):
+    """Charge un JSON, retourne `defaut` si absent, vide ou illisible."""
+    if not os.path.exists(chemin):
+        return defaut
+    try:
+        with open(chemin, "r", encoding="utf-8") as f:
+            content = f.read().strip()
+            return json.loads(content) if content else defaut
+    except Exception as e:
+        print(f"⚠️ Erreur lecture JSON {chemin} : {e}")
+        return defaut
+
+
+def sauver_json_atomique(chemin, data, indent=None):
+    """Écrit le JSON dans un fichier temporaire puis le renomme (atomique)."""
+    try:
+        dossier = os.path.dirname(chemin)
+        os.makedirs(dossier, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=dossier, prefix=".tmp_", suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=indent, ensure_ascii=False)
+            os.replace(temp_path, chemin)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    except Exception as e:
+        print(f"⚠️ Erreur sauvegarde JSON {chemin} : {e}")
+
+
+@contextmanager
+def verrou_fichier(chemin):
+    """Verrou exclusif inter-process sur `chemin` (via un fichier `chemin`.lock)."""
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    with open(chemin + ".lock", "a") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -100,6 +100,20 @@ def creer_alarme_reel(heure_str: str, playlist: str = "Titres Likés", jours_str
     else:
         return f"⏰ Alarme unique réglée pour demain (ou aujourd'hui) à {heure_str}."
 
+def _sonne_a(alarme, heure, jour):
+    """L'alarme sonne-t-elle à cette heure ("HH:MM") ce jour-là ?"""
+    if not alarme["active"] or alarme["heure"] != heure:
+        return False
+    return alarme["jours"] is None or jour in alarme["jours"]
+
+def _choisir_playlist(alarmes, heure, jour):
+    """Plusieurs alarmes à la même minute : c'est la dernière de la liste qui est lancée."""
+    playlist = None
+    for alarme in alarmes:
+        if _sonne_a(alarme, heure, jour):
+            playlist = alarme.get("playlist", "Titres Likés")
+    return playlist
+
 def check_alarmes_actives():
     """Vérifie et nettoie les alarmes One-Shot passées."""
     now = datetime.datetime.now()
@@ -107,32 +121,13 @@ def check_alarmes_actives():
     jour_now = now.weekday() # 0 = Lundi
     
     alarmes = _charger_alarmes()
-    alarmes_a_garder = []
-    playlist_a_lancer = None
-    
-    for alarme in alarmes:
-        declenche = False
-        
-        if alarme["active"] and alarme["heure"] == heure_now:
-            # Cas 1 : Récurrent
-            if alarme["jours"] is not None:
-                if jour_now in alarme["jours"]:
-                    declenche = True
-                    # On garde l'alarme
-                    alarmes_a_garder.append(alarme)
-                else:
-                    # Pas le bon jour, on garde quand même
-                    alarmes_a_garder.append(alarme)
-            
-            # Cas 2 : One-Shot (Une seule fois)
-            else:
-                declenche = True
-                # On NE l'ajoute PAS à alarmes_a_garder -> Elle sera supprimée
-        else:
-            alarmes_a_garder.append(alarme)
-            
-        if declenche:
-            playlist_a_lancer = alarme.get("playlist", "Titres Likés")
+    playlist_a_lancer = _choisir_playlist(alarmes, heure_now, jour_now)
+
+    # Les One-Shot de cette minute sont supprimées, les récurrentes gardées
+    alarmes_a_garder = [
+        alarme for alarme in alarmes
+        if not (alarme["active"] and alarme["heure"] == heure_now and alarme["jours"] is None)
+    ]
 
     # Si on a supprimé des alarmes one-shot, on sauvegarde
     if len(alarmes) != len(alarmes_a_garder):
@@ -140,6 +135,13 @@ def check_alarmes_actives():
         
     return playlist_a_lancer
 
+def alarme_prevue_a(moment: datetime.datetime):
+    """
+    Playlist de l'alarme qui sonnera à `moment` (lecture seule, rien n'est nettoyé),
+    choisie comme le fera check_alarmes_actives(). Sert au pré-chauffage une minute avant.
+    """
+    return _choisir_playlist(_charger_alarmes(), moment.strftime("%H:%M"), moment.weekday())
+
 def get_recap_alarmes():
     """Retourne un texte joli avec les alarmes programmées."""
     alarmes = _charger_alarmes()
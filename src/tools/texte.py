@@ -0,0 +1,18 @@
+"""
+================================================================================
+@fichier      : src/tools/texte.py
+@description  : Normalisation des noms saisis par l'utilisateur / l'IA
+                (casse, accents, espaces) pour les index de recherche locaux.
+================================================================================
+"""
+import re
+import unicodedata
+
+
+def normaliser_nom(nom: str) -> str:
+    """'  Salle à  Manger ' -> 'salle a manger'"""
+    if not nom:
+        return ""
+    decompose = unicodedata.normalize("NFKD", nom)
+    sans_accents = "".join(c for c in decompose if not unicodedata.combining(c))
+    return re.sub(r"\s+", " ", sans_accents).strip().lower()
@@ -1,86 +1,479 @@
 """
 ================================================================================
 @fichier      : src/tools/wiz.py
-@description  : Contrôle WiZ via UDP avec Retry (Tentatives multiples).
+@description  : Contrôle WiZ via UDP (asyncio).
+                Une seule socket partagée sur une boucle asyncio dédiée :
+                les réponses sont associées aux requêtes, les renvois suivent
+                un backoff exponentiel sans bloquer de thread, et plusieurs
+                appareils peuvent être commandés en parallèle.
+                Découverte par broadcast et registre persistant (par MAC)
+                des prises et ampoules, commandées par leur nom.
 ================================================================================
 """
-import socket
+import asyncio
+import difflib
 import json
+import os
+import threading
 import time
-from config import WIZ_PLUG_IP
+from contextlib import contextmanager
 
-def envoyer_commande_udp(payload, ip, port=38899, tentatives=3):
+from config import ASSETS_DIR, WIZ_PLUG_IP, WIZ_BROADCAST
+from .stockage import charger_json, sauver_json_atomique, verrou_fichier
+from .texte import normaliser_nom
+
+PORT_WIZ = 38899
+
+REGISTRE_WIZ_FILE = os.path.join(ASSETS_DIR, "wiz_devices.json")
+DUREE_DECOUVERTE = 2.0   # secondes d'écoute après le broadcast
+TTL_ETAT = 30            # un état getPilot plus récent est réutilisé tel quel
+CHAMPS_PERSISTES = ("nom", "ip", "module")   # etat / etat_a / vu restent en mémoire
+
+# Attente de réponse avant chaque renvoi (backoff exponentiel) : ~2 s au pire
+DELAIS_TENTATIVES = (0.25, 0.5, 1.0)
+
+
+# ------------------------------------------------------------------------------
+# TRANSPORT UDP
+# ------------------------------------------------------------------------------
+
+
+class _ProtocoleWiz(asyncio.DatagramProtocol):
+    """
+    Reçoit toutes les réponses sur la socket partagée et réveille la requête
+    correspondante, identifiée par (ip, port, méthode).
+    """
+
+    def __init__(self):
+        self.transport = None
+        self.attentes = {}      # (ip, port, méthode) -> [futures]
+        self.ecouteurs = []     # callback(ip, reponse) pour chaque datagramme reçu
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            reponse = json.loads(data.decode("utf-8"))
+        except Exception:
+            return
+
+        ip, port = addr[0], addr[1]
+        for futur in self.attentes.pop((ip, port, reponse.get("method")), []):
+            if not futur.done():
+                futur.set_result(reponse)
+
+        for ecouteur in list(self.ecouteurs):
+            try:
+                ecouteur(ip, reponse)
+            except Exception as e:
+                print(f"⚠️ Erreur écouteur WiZ : {e}")
+
+    def error_received(self, exc):
+        print(f"⚠️ Erreur socket WiZ : {exc}")
+
+
+class TransportWiz:
+    """Boucle asyncio dans un thread dédié + socket UDP unique (broadcast autorisé)."""
+
+    def __init__(self):
+        self.loop = None
+        self.protocole = None
+        self._pret = threading.Event()
+        self._verrou = threading.Lock()
+
+    def demarrer(self):
+        with self._verrou:
+            if self.loop is not None:
+                return
+            self.loop = asyncio.new_event_loop()
+            threading.Thread(target=self._executer, name="wiz-udp", daemon=True).start()
+        self._pret.wait(timeout=5)
+
+    def _executer(self):
+        asyncio.set_event_loop(self.loop)
+        _, self.protocole = self.loop.run_until_complete(
+            self.loop.create_datagram_endpoint(
+                _ProtocoleWiz, local_addr=("0.0.0.0", 0), allow_broadcast=True
+            )
+        )
+        self._pret.set()
+        self.loop.run_forever()
+
+    async def envoyer_async(self, payload, ip, port=PORT_WIZ, delais=DELAIS_TENTATIVES):
+        """
+        Envoie un payload et attend la réponse assortie.
+        Renvoie le datagramme à chaque délai expiré ; None si tout échoue.
+        """
+        futur = self.loop.create_future()
+        cle = (ip, port, payload.get("method"))
+        self.protocole.attentes.setdefault(cle, []).append(futur)
+        message = json.dumps(payload).encode("utf-8")
+
+        try:
+            for delai in delais:
+                self.protocole.transport.sendto(message, (ip, port))
+                try:
+                    return await asyncio.wait_for(asyncio.shield(futur), delai)
+                except asyncio.TimeoutError:
+                    continue
+            return None
+        finally:
+            attentes = self.protocole.attentes.get(cle)
+            if attentes and futur in attentes:
+                attentes.remove(futur)
+                if not attentes:
+                    del self.protocole.attentes[cle]
+
+    def executer(self, coroutine, timeout=None):
+        """Exécute une coroutine sur la boucle WiZ depuis un thread quelconque."""
+        self.demarrer()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def envoyer(self, payload, ip, port=PORT_WIZ):
+        return self.executer(self.envoyer_async(payload, ip, port))
+
+    def envoyer_plusieurs(self, commandes):
+        """
+        Commandes simultanées vers plusieurs appareils.
+        commandes: [(payload, ip) ou (payload, ip, port), ...]
+        -> [reponse ou None, ...] (même ordre)
+        """
+        async def _tout():
+            return await asyncio.gather(*(self.envoyer_async(*c) for c in commandes))
+
+        return self.executer(_tout())
+
+
+_transport = TransportWiz()
+
+
+def get_transport_wiz():
+    _transport.demarrer()
+    return _transport
+
+
+def envoyer_commande_udp(payload, ip, port=PORT_WIZ, tentatives=3):
     """
     Envoie un payload JSON en UDP avec plusieurs tentatives.
     Retourne la réponse JSON ou None si échec après N essais.
     """
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.settimeout(2.0) # 2 secondes d'attente max par essai
-    
-    message = json.dumps(payload).encode('utf-8')
-    
-    for i in range(tentatives):
+    delais = tuple(DELAIS_TENTATIVES[0] * (2 ** i) for i in range(tentatives))
+    transport = get_transport_wiz()
+    try:
+        return transport.executer(transport.envoyer_async(payload, ip, port, delais))
+    except Exception as e:
+        print(f"⚠️ Erreur WiZ : {e}")
+        return None
+
+
+# ------------------------------------------------------------------------------
+# REGISTRE DES APPAREILS (découverte)
+# ------------------------------------------------------------------------------
+
+
+def _nom_par_defaut(mac, module):
+    genre = "prise" if "SOCKET" in (module or "").upper() else "ampoule"
+    return f"{genre}-{mac[-4:]}"
+
+
+class RegistreWiz:
+    """
+    Appareils WiZ connus, indexés par MAC (stable), avec nom convivial,
+    dernière IP vue et dernier état getPilot.
+    appareils: {mac: {"nom", "ip", "module", "etat", "etat_a", "vu"}}
+    Le bot et l'API ont chacun leur registre : toute modification relit le
+    fichier sous verrou (_transaction) pour ne pas écraser celles de l'autre.
+    """
+
+    def __init__(self, transport, chemin=REGISTRE_WIZ_FILE):
+        self.transport = transport
+        self.chemin = chemin
+        self._verrou = threading.Lock()
+        self.appareils = {}
+        self._relire()
+
+    # --- Persistance ---
+
+    def _relire(self):
+        """
+        Fichier -> self.appareils, en place (les dicts déjà référencés restent
+        valides) ; l'état volatil en mémoire est conservé. Appelé sous le verrou.
+        """
+        if not os.path.exists(self.chemin):
+            return
+        disque = (charger_json(self.chemin, {}) or {}).get("appareils", {})
+        for cle in [c for c in self.appareils if c not in disque]:
+            del self.appareils[cle]
+        for cle, a in disque.items():
+            appareil = self.appareils.setdefault(cle, {"etat": None, "etat_a": 0, "vu": 0})
+            appareil.update({c: a.get(c) for c in CHAMPS_PERSISTES})
+
+    @contextmanager
+    def _transaction(self):
+        """Relit le fichier, laisse modifier self.appareils, puis réécrit (verrou inter-process)."""
+        with verrou_fichier(self.chemin):
+            with self._verrou:
+                self._relire()
+                yield self.appareils
+                data = {
+                    "appareils": {
+                        k: {c: a.get(c) for c in CHAMPS_PERSISTES} for k, a in self.appareils.items()
+                    }
+                }
+            sauver_json_atomique(self.chemin, data, indent=4)
+
+    # --- Découverte ---
+
+    async def _decouvrir_async(self, duree, adresse, port):
+        trouves = {}
+
+        def _ecouteur(ip, reponse):
+            resultat = reponse.get("result") or {}
+            if reponse.get("method") == "getSystemConfig" and resultat.get("mac"):
+                trouves[resultat["mac"]] = (ip, resultat.get("moduleName"))
+
+        message = json.dumps({"method": "getSystemConfig", "params": {}}).encode("utf-8")
+        self.transport.protocole.ecouteurs.append(_ecouteur)
         try:
-            # print(f"🔌 WiZ: Envoi essai {i+1}/{tentatives}...")
-            sock.sendto(message, (ip, port))
-            
-            # Attente réponse
-            data, _ = sock.recvfrom(1024)
-            reponse = json.loads(data.decode('utf-8'))
-            sock.close()
-            return reponse
-
-        except socket.timeout:
-            # Si timeout, on attend un tout petit peu et on recommence
-            time.sleep(0.5)
-        except Exception as e:
-            print(f"⚠️ Erreur WiZ (Essai {i+1}): {e}")
-            break
-            
-    sock.close()
-    return None
-
-def commander_prise_reel(action: str) -> str:
+            # Trois broadcasts espacés : l'UDP peut perdre des paquets
+            for _ in range(3):
+                self.transport.protocole.transport.sendto(message, (adresse, port))
+                await asyncio.sleep(duree / 3)
+        finally:
+            self.transport.protocole.ecouteurs.remove(_ecouteur)
+        return trouves
+
+    def decouvrir(self, duree=DUREE_DECOUVERTE, adresse=WIZ_BROADCAST, port=PORT_WIZ):
+        """Broadcast getSystemConfig ; met à jour IPs / modules. Retourne le nb d'appareils vus."""
+        trouves = self.transport.executer(self._decouvrir_async(duree, adresse, port))
+        maintenant = time.time()
+
+        with self._transaction():
+            for mac, (ip, module) in trouves.items():
+                appareil = self.appareils.get(mac)
+                if appareil is None:
+                    # Ancienne entrée provisoire (IP du .env, MAC encore inconnue) ?
+                    provisoire = self._provisoire_pour(ip)
+                    if provisoire:
+                        appareil = self.appareils.pop(provisoire)
+                    else:
+                        appareil = {"nom": _nom_par_defaut(mac, module), "etat": None, "etat_a": 0}
+                        print(f"🔎 Nouvel appareil WiZ : {appareil['nom']} ({ip})")
+                    self.appareils[mac] = appareil
+                elif appareil.get("ip") != ip:
+                    print(f"🔀 {appareil['nom']} a changé d'IP : {appareil.get('ip')} -> {ip}")
+
+                appareil.update({"ip": ip, "module": module, "vu": maintenant})
+
+        return len(trouves)
+
+    def _provisoire_pour(self, ip):
+        """
+        Clé "ip:..." (MAC jamais apprise) à cette IP. Appelé sous le verrou.
+        Une entrée dont la MAC est connue est déjà indexée par MAC (_associer_mac).
+        """
+        return next((k for k, a in self.appareils.items() if k.startswith("ip:") and a.get("ip") == ip), None)
+
+    def _associer_mac(self, cle, reponse):
+        """
+        Entrée provisoire qui répond avec sa MAC (getPilot / getSystemConfig) :
+        elle est ré-indexée par MAC, ce qui la suit ensuite si son IP change.
+        Retourne la clé à utiliser désormais.
+        """
+        mac = ((reponse or {}).get("result") or {}).get("mac")
+        if not cle.startswith("ip:") or not mac:
+            return cle
+        with self._transaction():
+            appareil = self.appareils.pop(cle, None)
+            if appareil is None:
+                return mac if mac in self.appareils else cle
+            if mac in self.appareils:
+                # Déjà découverte sous sa MAC : on garde le nom donné par l'utilisateur
+                self.appareils[mac]["nom"] = appareil["nom"]
+            else:
+                self.appareils[mac] = appareil
+        return mac
+
+    def migrer_ip_config(self, ip):
+        """La prise historique du .env devient l'appareil 'PC'."""
+        with self._verrou:
+            if any(a.get("ip") == ip for a in self.appareils.values()):
+                return
+
+        reponse = self.transport.envoyer({"method": "getSystemConfig", "params": {}}, ip)
+        resultat = (reponse or {}).get("result") or {}
+        cle = resultat.get("mac") or f"ip:{ip}"
+
+        with self._transaction():
+            if any(a.get("ip") == ip for a in self.appareils.values()):
+                return  # Reprise faite entre-temps par l'autre process
+            self.appareils[cle] = {
+                "nom": "PC", "ip": ip, "module": resultat.get("moduleName"),
+                "etat": None, "etat_a": 0, "vu": time.time() if reponse else 0,
+            }
+
+    # --- Résolution ---
+
+    def trouver(self, nom):
+        """MAC de l'appareil le plus proche du nom donné, ou None."""
+        cible = normaliser_nom(nom)
+        with self._verrou:
+            self._relire()  # Renommages faits par l'autre process
+            noms = {normaliser_nom(a["nom"]): mac for mac, a in self.appareils.items()}
+
+        if cible in noms:
+            return noms[cible]
+        for n, mac in noms.items():
+            if cible and cible in n:
+                return mac
+        matches = difflib.get_close_matches(cible, list(noms.keys()), n=1, cutoff=0.6)
+        return noms[matches[0]] if matches else None
+
+    def renommer(self, mac, nouveau_nom):
+        """False si le nom est déjà porté par un autre appareil."""
+        cible = normaliser_nom(nouveau_nom)
+        with self._transaction():
+            if mac not in self.appareils:
+                return False
+            if any(normaliser_nom(a["nom"]) == cible for k, a in self.appareils.items() if k != mac):
+                return False
+            self.appareils[mac]["nom"] = nouveau_nom
+        return True
+
+    # --- Commandes ---
+
+    def envoyer(self, mac, payload):
+        """
+        Envoie à la dernière IP connue ; si pas de réponse, redécouvre le réseau
+        (DHCP a pu déplacer l'appareil) et réessaie sur la nouvelle IP.
+        """
+        appareil = self.appareils[mac]
+        ip_avant = appareil.get("ip")
+        reponse = self.transport.envoyer(payload, ip_avant) if ip_avant else None
+
+        if reponse is None:
+            self.decouvrir()
+            appareil = self.appareils.get(mac, appareil)
+            if appareil.get("ip") and appareil.get("ip") != ip_avant:
+                reponse = self.transport.envoyer(payload, appareil["ip"])
+
+        if reponse is not None:
+            self._memoriser_etat(appareil, payload, reponse)
+            self._associer_mac(mac, reponse)
+        return reponse
+
+    def etat_en_cache(self, mac, age_max=TTL_ETAT):
+        appareil = self.appareils.get(mac) or {}
+        if appareil.get("etat") is not None and time.time() - appareil.get("etat_a", 0) < age_max:
+            return appareil["etat"]
+        return None
+
+    def _memoriser_etat(self, appareil, payload, reponse):
+        resultat = reponse.get("result") or {}
+        with self._verrou:
+            if payload.get("method") == "getPilot" and "state" in resultat:
+                appareil["etat"] = resultat
+            elif payload.get("method") == "setPilot":
+                etat = dict(appareil.get("etat") or {})
+                etat.update(payload.get("params", {}))
+                appareil["etat"] = etat
+            else:
+                return
+            appareil["etat_a"] = time.time()
+            appareil["vu"] = time.time()
+
+
+_registre = None
+_verrou_registre = threading.Lock()
+
+
+def get_registre_wiz():
+    """Registre du processus ; au premier appel, reprend la prise du .env si besoin."""
+    global _registre
+    if _registre is None:
+        with _verrou_registre:
+            if _registre is None:
+                registre = RegistreWiz(get_transport_wiz())
+                if WIZ_PLUG_IP:
+                    registre.migrer_ip_config(WIZ_PLUG_IP)
+                _registre = registre
+    return _registre
+
+
+# ------------------------------------------------------------------------------
+# FONCTIONS MÉTIER
+# ------------------------------------------------------------------------------
+
+
+def commander_prise_reel(action: str, appareil: str = "PC", nouveau_nom: str = None) -> str:
     """
-    Envoie un ordre à la prise WiZ ou demande son état.
-    Action: "allumer", "eteindre", "statut".
+    Envoie un ordre à un appareil WiZ (prise ou ampoule) ou demande son état.
+    Action: "allumer", "eteindre", "statut", "lister", "decouvrir", "renommer".
     """
-    if not WIZ_PLUG_IP:
-        return "IP de la prise WiZ non configurée dans le .env."
+    registre = get_registre_wiz()
 
     try:
+        # --- Gestion du registre ---
+        if action == "decouvrir":
+            nb = registre.decouvrir()
+            return f"{nb} appareil(s) WiZ trouvé(s) sur le réseau."
+
+        if action == "lister":
+            if not registre.appareils:
+                return "Aucun appareil WiZ connu (essaie 'decouvrir')."
+            lignes = []
+            for a in registre.appareils.values():
+                etat = a.get("etat") or {}
+                icone = "🟢" if etat.get("state") else ("🔴" if etat else "⚪")
+                lignes.append(f"• {icone} {a['nom']} ({a.get('ip')})")
+            return "\n".join(lignes)
+
+        mac = registre.trouver(appareil or "PC")
+        if not mac:
+            return f"Appareil WiZ '{appareil}' inconnu."
+        nom = registre.appareils[mac]["nom"]
+
+        if action == "renommer":
+            if not nouveau_nom:
+                return "Quel nouveau nom ?"
+            if not registre.renommer(mac, nouveau_nom):
+                return f"Le nom '{nouveau_nom}' est déjà pris par un autre appareil WiZ."
+            return f"'{nom}' s'appelle maintenant '{nouveau_nom}'."
+
         # --- CAS 1 : Lecture d'état (Statut) ---
         if action == "statut":
-            payload = {"method": "getPilot", "params": {}}
-            reponse = envoyer_commande_udp(payload, WIZ_PLUG_IP)
-            
-            if reponse and "result" in reponse and "state" in reponse["result"]:
-                etat_bool = reponse["result"]["state"]
-                etat_str = "Allumée 🟢" if etat_bool else "Éteinte 🔴"
-                return f"La prise 'PC' est actuellement : {etat_str}"
+            etat = registre.etat_en_cache(mac)
+            if etat is None:
+                reponse = registre.envoyer(mac, {"method": "getPilot", "params": {}})
+                etat = registre.etat_en_cache(mac) if reponse else None
+
+            if etat is not None and "state" in etat:
+                etat_str = "Allumée 🟢" if etat["state"] else "Éteinte 🔴"
+                return f"'{nom}' est actuellement : {etat_str}"
             else:
-                return "Je n'arrive pas à joindre la prise (après 3 tentatives)."
+                return f"Je n'arrive pas à joindre '{nom}'."
 
         # --- CAS 2 : Action (Allumer/Eteindre) ---
         elif action in ["allumer", "eteindre"]:
             etat = True if action == "allumer" else False
             payload = {"method": "setPilot", "params": {"state": etat}}
-            
-            reponse = envoyer_commande_udp(payload, WIZ_PLUG_IP)
-            
+
+            reponse = registre.envoyer(mac, payload)
+
             if reponse and "result" in reponse and "success" in reponse["result"]:
                  if reponse["result"]["success"]:
-                     return f"Prise {action}e avec succès."
-            
+                     return f"'{nom}' {action}e avec succès."
+
             # Parfois WiZ répond juste { "method": "setPilot", "env": "pro" ... } sans success explicit
             # Si on a une réponse, c'est que l'ordre est passé
             if reponse:
-                return f"Ordre envoyé (Prise {action}e)."
-            
-            return "La prise ne répond pas. Vérifie qu'elle est bien branchée."
-        
+                return f"Ordre envoyé ('{nom}' {action}e)."
+
+            return f"'{nom}' ne répond pas. Vérifie qu'il est bien branché."
+
         else:
             return f"Action inconnue : {action}"
 
     except Exception as e:
-        return f"Erreur technique WiZ : {e}"
\ No newline at end of file
+        return f"Erreur technique WiZ : {e}"